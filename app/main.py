@@ -5,8 +5,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 from src.core.rag_pipeline import RAGPipeline
+from src.core.index_jobs import IndexJobQueue
+from src.telemetry import tracing
+from src.vector_db.sharding import shard_scope
+from src.telemetry.exporters import configure_logging, init_telemetry
 from config.settings import settings
 
+configure_logging()
+init_telemetry()
 
 st.set_page_config(layout="wide", page_title="Multimodal Research Assistant")
 
@@ -14,10 +20,31 @@ st.set_page_config(layout="wide", page_title="Multimodal Research Assistant")
 @st.cache_resource
 def get_rag_pipeline():
     pipeline = RAGPipeline()
+    if settings.WARM_UP_ON_START:
+        pipeline.warm_up(background=True)
     return pipeline
 
 rag_pipeline = get_rag_pipeline()
 
+
+# Indexing runs on a background worker so the chat stays usable; jobs survive restarts
+@st.cache_resource
+def get_index_jobs(_pipeline):
+    return IndexJobQueue(_pipeline).start()
+
+index_jobs = get_index_jobs(rag_pipeline)
+
+
+def render_timings(rows):
+    """Shows a query's span tree as an indented table of milliseconds and share of the total."""
+    with st.expander("⏱️ Timing breakdown"):
+        st.table([
+            {"stage": "\u00a0\u00a0" * row["depth"] + row["name"],
+             "ms": f"{row['ms']:.1f}",
+             "share": f"{row['share']:.0%}"}
+            for row in rows
+        ])
+
 # Streamlit UI
 st.title("📚 Intelligent Research Assistant with Multimodal RAG")
 
@@ -31,25 +58,59 @@ uploaded_files = st.sidebar.file_uploader(
 
 if uploaded_files:
     if st.sidebar.button("Index Uploaded Documents"):
-        with st.spinner("Processing and indexing documents... This may take a while for images."):
-            # Save uploaded files to the data/raw directory
-            for uploaded_file in uploaded_files:
-                file_path = os.path.join(settings.DATA_DIR, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                st.sidebar.success(f"Saved: {uploaded_file.name}")
-            
-            rag_pipeline.index_documents(settings.DATA_DIR)
-            st.sidebar.success("Documents indexed successfully!")
+        # Save uploaded files to the data/raw directory
+        for uploaded_file in uploaded_files:
+            file_path = os.path.join(settings.DATA_DIR, uploaded_file.name)
+            with open(file_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+            st.sidebar.success(f"Saved: {uploaded_file.name}")
+
+        job_id = index_jobs.submit(settings.DATA_DIR)
+        st.sidebar.info(f"Indexing job {job_id} queued. You can keep asking questions meanwhile.")
+
+
+@st.fragment(run_every=settings.INDEX_JOB_POLL_SECONDS)
+def render_index_status():
+    """Progress of the current (or most recent) indexing job, refreshed in place."""
+    job = index_jobs.active_job() or next(iter(index_jobs.list_jobs(limit=1)), None)
+    if job is None:
+        return
+    st.markdown(f"**Indexing job {job['id']}**: {job['status']}")
+    if job["files_total"]:
+        finished = job["files_done"] + job["files_failed"]
+        st.progress(min(1.0, finished / job["files_total"]),
+                    text=f"{finished}/{job['files_total']} files, {job['chunks_indexed']} chunks")
+    if job["last_file"]:
+        st.caption(f"Last finished: {os.path.basename(job['last_file'])}")
+    if job["files_failed"]:
+        st.warning(f"{job['files_failed']} file(s) produced no chunks; they will be retried on the next run.")
+    if job["status"] == "failed":
+        st.error(job["error"])
+    if job["status"] in ("queued", "running") and st.button("Cancel indexing", key=f"cancel_{job['id']}"):
+        index_jobs.cancel(job["id"])
+
+with st.sidebar:
+    render_index_status()
 
 if st.sidebar.button("Reset Knowledge Base"):
-    if os.path.exists(settings.VECTOR_DB_PATH):
-        import shutil
-        shutil.rmtree(settings.VECTOR_DB_PATH)
-        st.sidebar.info("Old vector database removed.")
-    rag_pipeline.reset()
-    st.sidebar.success("Knowledge base reset!")
-
+    if index_jobs.active_job() is not None:
+        st.sidebar.warning("An indexing job is in progress; cancel it or wait for it to finish before resetting.")
+    else:
+        if os.path.exists(settings.VECTOR_DB_PATH):
+            import shutil
+            shutil.rmtree(settings.VECTOR_DB_PATH)
+            st.sidebar.info("Old vector database removed.")
+        rag_pipeline.reset()
+        st.sidebar.success("Knowledge base reset!")
+
+
+search_shards = None
+if settings.VECTOR_DB_SHARDING != "none":
+    search_shards = st.sidebar.multiselect(
+        "Search in",
+        rag_pipeline.vector_store_manager.shard_names(),
+        help="Leave empty to search every shard."
+    )
 
 st.sidebar.markdown("---")
 st.sidebar.info("Upload documents to the 'data/raw' folder and click 'Index Uploaded Documents'. Then, ask your questions in the main chat.")
@@ -64,6 +125,8 @@ if "messages" not in st.session_state:
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("timings"):
+            render_timings(message["timings"])
 
 if prompt := st.chat_input("What do you want to know?"):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -71,7 +134,9 @@ if prompt := st.chat_input("What do you want to know?"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Searching and generating answer..."):
-            response = rag_pipeline.query(prompt)
-            st.markdown(response)
-            st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+        # Render tokens as they arrive; write_stream returns the full text once the stream ends
+        with tracing.trace("chat_query") as query_trace, shard_scope(search_shards):
+            response = st.write_stream(rag_pipeline.query_stream(prompt))
+        timings = query_trace.breakdown()
+        render_timings(timings)
+        st.session_state.messages.append({"role": "assistant", "content": response, "timings": timings})
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Deterministic, offline stand-in for the parts of `google.generativeai` the pipeline uses:
+`embed_content` (single and batched), and `GenerativeModel.generate_content` for text,
+vision and streaming calls, plus their `_async` variants. Latency and rate limits are configurable so benchmarks can
+model a real API without the network.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    from google.api_core.exceptions import ResourceExhausted as RateLimitError
+except ImportError:  # pragma: no cover - google-api-core ships with google-generativeai
+    class RateLimitError(Exception):
+        pass
+
+
+class _RateLimiter:
+    """Fixed one-second window request counter; raises RateLimitError once the window is full."""
+
+    def __init__(self, requests_per_second: Optional[float]):
+        self.requests_per_second = requests_per_second
+        self._window_start = time.monotonic()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        if not self.requests_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._count = now, 0
+            self._count += 1
+            if self._count > self.requests_per_second:
+                raise RateLimitError("429 Resource has been exhausted (fake rate limit)")
+
+
+class FakeGemini:
+    """
+    Fake Gemini API.
+
+    Each call sleeps `base_latency + per_item_latency * items` seconds (items = texts in an
+    embedding batch, or output tokens for generation) and counts against a per-kind rate limit.
+    """
+
+    def __init__(self,
+                 embedding_dim: int = 768,
+                 embed_latency: float = 0.05,
+                 embed_per_item_latency: float = 0.002,
+                 generate_latency: float = 0.4,
+                 generate_per_token_latency: float = 0.005,
+                 vision_latency: float = 1.0,
+                 embed_rps: Optional[float] = None,
+                 generate_rps: Optional[float] = None,
+                 answer_tokens: int = 120,
+                 seed: int = 0):
+        self.embedding_dim = embedding_dim
+        self.embed_latency = embed_latency
+        self.embed_per_item_latency = embed_per_item_latency
+        self.generate_latency = generate_latency
+        self.generate_per_token_latency = generate_per_token_latency
+        self.vision_latency = vision_latency
+        self.answer_tokens = answer_tokens
+        self.seed = seed
+        self._embed_limiter = _RateLimiter(embed_rps)
+        self._generate_limiter = _RateLimiter(generate_rps)
+        self.calls = {"embed": 0, "embed_items": 0, "generate": 0, "vision": 0}
+        self._calls_lock = threading.Lock()
+
+    def _count(self, kind: str, items: int = 1):
+        with self._calls_lock:
+            self.calls[kind] += 1
+            if kind == "embed":
+                self.calls["embed_items"] += items
+
+    # ---- embeddings ------------------------------------------------------------------
+
+    def embedding_for(self, text: str) -> List[float]:
+        """Deterministic pseudo-embedding: bag of hashed words plus a small text-specific component."""
+        vector = np.zeros(self.embedding_dim, dtype=np.float32)
+        for word in text.lower().split():
+            bucket = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[bucket % self.embedding_dim] += 1.0
+        digest = hashlib.sha256(f"{self.seed}:{text}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        vector += 0.05 * rng.standard_normal(self.embedding_dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_content(self, model: str, content, **kwargs):
+        texts = content if isinstance(content, list) else [content]
+        self._embed_limiter.check()
+        self._count("embed", len(texts))
+        time.sleep(self.embed_latency + self.embed_per_item_latency * len(texts))
+        embeddings = [self.embedding_for(text) for text in texts]
+        return {"embedding": embeddings if isinstance(content, list) else embeddings[0]}
+
+    async def embed_content_async(self, model: str, content, **kwargs):
+        texts = content if isinstance(content, list) else [content]
+        self._embed_limiter.check()
+        self._count("embed", len(texts))
+        await asyncio.sleep(self.embed_latency + self.embed_per_item_latency * len(texts))
+        embeddings = [self.embedding_for(text) for text in texts]
+        return {"embedding": embeddings if isinstance(content, list) else embeddings[0]}
+
+    # ---- generation ------------------------------------------------------------------
+
+    def _answer(self, prompt) -> str:
+        parts = prompt if isinstance(prompt, list) else [prompt]
+        text = " ".join(part for part in parts if isinstance(part, str))
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        words = [f"token{int(digest[i % 64], 16)}" for i in range(self.answer_tokens)]
+        return " ".join(words)
+
+    def GenerativeModel(self, model_name: str, **kwargs):
+        return _FakeModel(self, model_name)
+
+    def configure(self, **kwargs):
+        pass
+
+
+class _FakeModel:
+    def __init__(self, fake: FakeGemini, model_name: str):
+        self.fake = fake
+        self.model_name = model_name
+
+    def _is_vision(self, contents) -> bool:
+        return isinstance(contents, list) and any(not isinstance(part, str) for part in contents)
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        fake = self.fake
+        fake._generate_limiter.check()
+        if self._is_vision(contents):
+            fake._count("vision")
+            time.sleep(fake.vision_latency)
+            return SimpleNamespace(text="A diagram with labelled parts and a caption describing the figure.")
+        fake._count("generate")
+        words = fake._answer(contents).split(" ")
+        if not stream:
+            time.sleep(fake.generate_latency + fake.generate_per_token_latency * len(words))
+            return SimpleNamespace(text=" ".join(words))
+
+        def chunks():
+            time.sleep(fake.generate_latency)
+            for start in range(0, len(words), 8):
+                time.sleep(fake.generate_per_token_latency * 8)
+                yield SimpleNamespace(text=" ".join(words[start:start + 8]) + " ")
+        return chunks()
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        """Like generate_content, but awaits instead of sleeping; streams are async iterables, as in the SDK."""
+        fake = self.fake
+        fake._generate_limiter.check()
+        if self._is_vision(contents):
+            fake._count("vision")
+            await asyncio.sleep(fake.vision_latency)
+            return SimpleNamespace(text="A diagram with labelled parts and a caption describing the figure.")
+        fake._count("generate")
+        words = fake._answer(contents).split(" ")
+        if not stream:
+            await asyncio.sleep(fake.generate_latency + fake.generate_per_token_latency * len(words))
+            return SimpleNamespace(text=" ".join(words))
+
+        async def chunks():
+            await asyncio.sleep(fake.generate_latency)
+            for start in range(0, len(words), 8):
+                await asyncio.sleep(fake.generate_per_token_latency * 8)
+                yield SimpleNamespace(text=" ".join(words[start:start + 8]) + " ")
+        return chunks()
+
+
+def install(fake: FakeGemini):
+    """
+    Routes the pipeline's Gemini calls to the fake by patching `google.generativeai`.
+    Must be called before the pipeline objects are constructed.
+    """
+    import google.generativeai as genai
+    genai.configure = fake.configure
+    genai.embed_content = fake.embed_content
+    genai.embed_content_async = fake.embed_content_async
+    genai.GenerativeModel = fake.GenerativeModel
+    return fake
@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the pipeline modules,
+to construct RAGPipeline, and to finish warm-up, plus which heavy third-party packages each
+step drags in. Every measurement runs in its own subprocess so nothing is cached between them.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeats 5 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Dict, Any
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = [
+    "src.core.rag_pipeline",
+    "src.retrieval.retriever",
+    "src.generation.generator",
+    "src.evaluation.eval_runner",
+    "src.evaluation.evaluator",
+]
+
+HEAVY_PACKAGES = ["google.generativeai", "chromadb", "langchain_core", "pypdf", "docx", "PIL", "ragas", "datasets", "pandas"]
+
+# Runs in the child interpreter; prints one JSON line
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+result = {{"import_seconds": imported - start}}
+if {construct}:
+    import tempfile, os
+    from config.settings import settings
+    scratch = tempfile.mkdtemp(prefix="rag_import_")
+    for name in dir(settings):
+        value = getattr(settings, name)
+        if name.endswith("_PATH") and isinstance(value, str) and value:
+            setattr(settings, name, os.path.join(scratch, os.path.basename(value)))
+    from src.core.rag_pipeline import RAGPipeline
+    constructed_start = time.perf_counter()
+    pipeline = RAGPipeline()
+    result["construct_seconds"] = time.perf_counter() - constructed_start
+    warm_start = time.perf_counter()
+    pipeline.warm_up(background=False)
+    result["warm_up_seconds"] = time.perf_counter() - warm_start
+result["heavy_modules_loaded"] = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps(result))
+"""
+
+
+def _run_probe(module: str, construct: bool = False) -> Dict[str, Any]:
+    code = _PROBE.format(root=REPO_ROOT, module=module, construct=construct, heavy=HEAVY_PACKAGES)
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=REPO_ROOT, text=True,
+                                     stderr=subprocess.DEVNULL)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int = 10) -> List[Dict[str, Any]]:
+    """Top cumulative import times for one module, from python -X importtime."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_ROOT, text=True, capture_output=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def measure(modules: List[str] = MODULES, repeats: int = 3) -> Dict[str, Any]:
+    """Median import time per module over `repeats` fresh interpreters, plus pipeline cold start."""
+    results: Dict[str, Any] = {}
+    for module in modules:
+        runs = [_run_probe(module) for _ in range(repeats)]
+        results[module] = {
+            "import_ms": sorted(run["import_seconds"] for run in runs)[len(runs) // 2] * 1000,
+            "heavy_modules_loaded": runs[0]["heavy_modules_loaded"],
+        }
+    runs = [_run_probe("src.core.rag_pipeline", construct=True) for _ in range(repeats)]
+    median = lambda key: sorted(run[key] for run in runs)[len(runs) // 2] * 1000
+    results["cold_start"] = {
+        "import_ms": median("import_seconds"),
+        "construct_ms": median("construct_seconds"),
+        "warm_up_ms": median("warm_up_seconds"),
+        "heavy_modules_loaded": runs[0]["heavy_modules_loaded"],
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and cold-start time of the pipeline modules.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports under src.core.rag_pipeline")
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+
+    results = measure(repeats=args.repeats)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module in MODULES:
+            row = results[module]
+            print(f"{module:<32} {row['import_ms']:>8.1f} ms   loads: {', '.join(row['heavy_modules_loaded']) or '-'}")
+        cold = results["cold_start"]
+        print(f"\nRAGPipeline cold start: import {cold['import_ms']:.0f} ms, construct {cold['construct_ms']:.0f} ms, "
+              f"warm-up {cold['warm_up_ms']:.0f} ms (loads: {', '.join(cold['heavy_modules_loaded'])})")
+    if args.top:
+        print(f"\nSlowest imports under src.core.rag_pipeline:")
+        for row in slowest_imports("src.core.rag_pipeline", args.top):
+            print(f"{row['module']:<60} {row['cumulative_ms']:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
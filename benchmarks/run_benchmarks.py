@@ -0,0 +1,249 @@
+"""
+Offline performance benchmarks for the RAG pipeline.
+
+Runs against a deterministic fake Gemini (see fake_gemini.py) in a throwaway directory, and
+writes the results as JSON so runs from different commits can be compared:
+
+    python -m benchmarks.run_benchmarks --output benchmarks/results/head.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/base.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import settings
+from benchmarks.fake_gemini import FakeGemini, install
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def isolate_settings(work_dir: str):
+    """Points every persistent path at the scratch directory so benchmarks never touch real data."""
+    settings.DATA_DIR = os.path.join(work_dir, "raw")
+    for name in dir(settings):
+        value = getattr(settings, name)
+        if name.endswith("_PATH") and isinstance(value, str) and value:
+            setattr(settings, name, os.path.join(work_dir, "store", os.path.basename(value)))
+    os.makedirs(settings.DATA_DIR, exist_ok=True)
+
+
+def build_corpus(directory: str, n_docs: int, words_per_doc: int, seed: int = 0) -> List[str]:
+    """Writes synthetic text documents built from the sample book's vocabulary; returns query strings."""
+    with open(os.path.join(REPO_ROOT, "data", "raw", "Book.txt"), "r", encoding="utf-8") as f:
+        vocabulary = f.read().split()
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n_docs):
+        start = rng.randrange(0, max(1, len(vocabulary) - words_per_doc))
+        words = vocabulary[start:start + words_per_doc]
+        with open(os.path.join(directory, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+        queries.append(" ".join(words[:12]))
+    return queries
+
+
+def bench_index(pipeline, n_docs: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    pipeline.index_documents(settings.DATA_DIR)
+    elapsed = time.perf_counter() - start
+    chunks = pipeline.vector_store_manager.count()
+    return {
+        "docs": n_docs,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "docs_per_sec": n_docs / elapsed,
+        "chunks_per_sec": chunks / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_query(pipeline, queries: List[str]) -> Dict[str, Any]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        pipeline.query(query)
+        latencies.append(time.perf_counter() - start)
+    return {"queries": len(queries), **percentiles(latencies), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_search(backend_name: str, sizes: List[int], dim: int, work_dir: str, repeats: int = 50) -> Dict[str, Any]:
+    """Times VectorStoreManager search alone, on random unit vectors, at several corpus sizes."""
+    from src.vector_db.vector_store_manager import VectorStoreManager, create_backend
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in sizes:
+        settings.VECTOR_DB_PATH = os.path.join(work_dir, f"search_{size}", "chroma")
+        settings.NUMPY_INDEX_PATH = os.path.join(work_dir, f"search_{size}", "numpy")
+        settings.BM25_INDEX_PATH = os.path.join(work_dir, f"search_{size}", "bm25.pkl")
+        manager = VectorStoreManager(backend=create_backend(backend_name, collection_name=f"bench_{size}"))
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        build_start = time.perf_counter()
+        for start in range(0, size, 5000):
+            end = min(size, start + 5000)
+            manager.add_documents([
+                {"content": f"chunk {i}", "embedding": vectors[i].tolist(),
+                 "metadata": {"chunk_id": f"c{i}", "source": f"s{i % 100}"}}
+                for i in range(start, end)
+            ])
+        manager.flush()
+        build_seconds = time.perf_counter() - build_start
+
+        queries = rng.standard_normal((repeats, dim)).astype(np.float32)
+        single = []
+        for query in queries:
+            start = time.perf_counter()
+            manager.query_documents(query.tolist(), top_k=settings.TOP_K_RETRIEVAL)
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        manager.query_documents_batch(queries.tolist(), top_k=settings.TOP_K_RETRIEVAL)
+        batch_seconds = time.perf_counter() - start
+        results[str(size)] = {
+            "build_seconds": build_seconds,
+            **percentiles(single),
+            "batched_ms_per_query": batch_seconds * 1000 / repeats,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        logger.info("search[%s] n=%d: p50 %.2f ms", backend_name, size, results[str(size)]["p50_ms"])
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(prefix: str, value, out: Dict[str, float]):
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, inner, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare(baseline_path: str, current: Dict[str, Any]):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old, new = {}, {}
+    flatten("", baseline["results"], old)
+    flatten("", current["results"], new)
+    print(f"\nComparison: {baseline.get('commit')} -> {current.get('commit')}")
+    print(f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(set(old) & set(new)):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:<48} {old[key]:>12.3f} {new[key]:>12.3f} {change:>+7.1f}%")
+
+
+def print_report(results: Dict[str, Any], output: str):
+    if "index" in results:
+        print(f"index: {results['index']['docs_per_sec']:.1f} docs/s, {results['index']['chunks_per_sec']:.1f} chunks/s")
+    if "query" in results:
+        print(f"query: p50 {results['query']['p50_ms']:.1f} ms, p99 {results['query']['p99_ms']:.1f} ms")
+    for size, search in results.get("search", {}).items():
+        print(f"search n={size}: p50 {search['p50_ms']:.2f} ms, batched {search['batched_ms_per_query']:.2f} ms/query")
+    print(f"Wrote {output}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmarks with a fake Gemini.")
+    parser.add_argument("--docs", type=int, default=200, help="Synthetic documents to index")
+    parser.add_argument("--words-per-doc", type=int, default=1500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--search-sizes", default="1000,10000,50000", help="Comma-separated corpus sizes for the search benchmark")
+    parser.add_argument("--backend", default=settings.VECTOR_DB_BACKEND, choices=["chroma", "numpy"])
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Fake embedding call latency (s)")
+    parser.add_argument("--generate-latency", type=float, default=0.4, help="Fake generation latency before the first token (s)")
+    parser.add_argument("--embed-rps", type=float, default=None, help="Fake embedding rate limit (requests/s)")
+    parser.add_argument("--generate-rps", type=float, default=None, help="Fake generation rate limit (requests/s)")
+    parser.add_argument("--skip", default="", help="Comma-separated phases to skip: index,query,search")
+    parser.add_argument("--output", default=None, help="Results JSON path (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+    skip = set(filter(None, args.skip.split(",")))
+
+    from src.telemetry.exporters import configure_logging
+    configure_logging()
+
+    fake = install(FakeGemini(embed_latency=args.embed_latency, generate_latency=args.generate_latency,
+                              embed_rps=args.embed_rps, generate_rps=args.generate_rps))
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    isolate_settings(work_dir)
+    settings.VECTOR_DB_BACKEND = args.backend
+    # Measure the uncached path; cache effectiveness is a separate question
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.EMBEDDING_CACHE_ENABLED = False
+
+    results: Dict[str, Any] = {}
+    try:
+        if not {"index", "query"} <= skip:
+            from src.core.rag_pipeline import RAGPipeline
+            queries = build_corpus(settings.DATA_DIR, args.docs, args.words_per_doc)
+            pipeline = RAGPipeline()
+            if "index" not in skip:
+                results["index"] = bench_index(pipeline, args.docs)
+                logger.info("index: %.1f docs/s, %.1f chunks/s", results["index"]["docs_per_sec"],
+                            results["index"]["chunks_per_sec"])
+            if "query" not in skip:
+                results["query"] = bench_query(pipeline, queries[:args.queries])
+                logger.info("query: p50 %.1f ms, p99 %.1f ms", results["query"]["p50_ms"], results["query"]["p99_ms"])
+        if "search" not in skip:
+            sizes = [int(size) for size in args.search_sizes.split(",") if size]
+            results["search"] = bench_search(args.backend, sizes, fake.embedding_dim, work_dir)
+        results["peak_rss_mb"] = peak_rss_mb()
+        results["fake_api_calls"] = dict(fake.calls)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(results, output)
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
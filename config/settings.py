@@ -10,21 +10,123 @@ class Settings:
     GEMINI_TEXT_MODEL: str = "gemini-2.5-flash" # For text generation and potentially text-based multimodal understanding
     GEMINI_VISION_MODEL: str = "gemini-2.5-flash" # For image analysis (gemini-2.5-flash supports vision)
     GEMINI_EMBEDDING_MODEL: str = "models/embedding-001" # This remains the dedicated embedding model
+    # Client-side flow control, shared by every caller of a model (see src/clients/resilience.py)
+    GEMINI_REQUESTS_PER_MINUTE: dict = {} # Per-model quota, e.g. {"gemini-2.5-flash": 1000}; unlisted models use the default
+    GEMINI_DEFAULT_REQUESTS_PER_MINUTE: float = 0 # 0 = no client-side rate limit
+    GEMINI_INITIAL_CONCURRENCY: int = 8 # Starting point of the adaptive per-model concurrency limit
+    GEMINI_MIN_CONCURRENCY: int = 1
+    GEMINI_MAX_CONCURRENCY: int = 32
+    GEMINI_MAX_RETRIES: int = 5 # Retries after throttling (429) or server errors; bad requests are not retried
+    GEMINI_RETRY_BASE_DELAY: float = 0.5 # Seconds; backoff doubles per retry, with full jitter
+    GEMINI_RETRY_MAX_DELAY: float = 20.0
+    GEMINI_CALL_DEADLINE_SECONDS: float = 120.0 # Budget for one call including retries and waiting for capacity
+    GEMINI_BREAKER_FAILURES: int = 5 # Consecutive server errors that open a model's circuit breaker
+    GEMINI_BREAKER_RESET_SECONDS: float = 30.0 # How long an open breaker rejects calls before probing again
 
     # Data Ingestion settings
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNK_LENGTH_UNIT: str = "characters" # "characters" (CHUNK_SIZE/CHUNK_OVERLAP) or "tokens" (estimated, CHUNK_SIZE_TOKENS/CHUNK_OVERLAP_TOKENS)
+    CHUNK_SIZE_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 50
+    CHUNK_PARALLEL: bool = True # Chunk large batches of records on a process pool
+    CHUNK_MAX_WORKERS: int = 0 # 0 means os.cpu_count()
+    CHUNK_PARALLEL_MIN_CHARS: int = 2_000_000 # Smaller batches are chunked inline
     DATA_DIR: str = "data/raw"
     PROCESSED_DATA_DIR: str = "data/processed"
+    LOADER_PARALLEL: bool = True # Parse files on a process pool
+    LOADER_MAX_WORKERS: int = 0 # 0 means os.cpu_count()
+    LOADER_PER_PAGE: bool = True # Emit one record per PDF page, with its page number in metadata
+    CAPTION_MAX_CONCURRENCY: int = 4 # Vision requests in flight at once
+    CAPTION_MAX_RESOLUTION: int = 1024 # Longest image side sent to the vision model
+    CAPTION_JPEG_QUALITY: int = 85
+    CAPTION_NEAR_DUPLICATE_DISTANCE: int = 4 # Max perceptual-hash bit difference treated as a duplicate (0 disables)
+    CAPTION_CACHE_PATH: str = "vector_db/caption_cache.sqlite" # Captions keyed by image hash
+    INGEST_MICRO_BATCH_SIZE: int = 256 # Chunks embedded and upserted together while streaming
+    INGEST_QUEUE_SIZE: int = 1024 # Max chunks buffered between chunking and embedding
+    DEDUP_ENABLED: bool = True # Store near-duplicate chunks once, recording every file they appear in
+    DEDUP_THRESHOLD: float = 0.85 # Estimated Jaccard similarity of word shingles at which chunks count as duplicates
+    DEDUP_SHINGLE_SIZE: int = 5 # Words per shingle
+    DEDUP_NUM_PERM: int = 128 # MinHash signature length
+    DEDUP_LSH_BANDS: int = 16 # LSH bands (NUM_PERM must be a multiple); more bands catch less similar pairs
+    DEDUP_INDEX_PATH: str = "vector_db/dedup_index.sqlite" # MinHash signatures and LSH buckets of stored chunks
+
+    # Embedding settings
+    EMBEDDING_BATCH_SIZE: int = 100 # Texts per embed_content request (Gemini accepts up to 100)
+    EMBEDDING_MAX_CONCURRENCY: int = 4 # Batch requests kept in flight at once
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "vector_db/embedding_cache.sqlite" # Kept outside VECTOR_DB_PATH so it survives resets
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000 # Least recently used entries are evicted past this size
 
     # Vector Database settings
+    VECTOR_DB_BACKEND: str = "chroma" # "chroma" or "numpy" (memory-mapped local matrix)
     VECTOR_DB_PATH: str = "vector_db/chroma_db" # Path for ChromaDB persistence
+    NUMPY_INDEX_PATH: str = "vector_db/numpy_index" # Path for the NumPy backend
+    NUMPY_VECTOR_DTYPE: str = "float32" # "float32" or "float16" (halves memory)
+    NUMPY_IVF_LISTS: int = 0 # Coarse-quantizer lists for large corpora (0 = exact brute force)
+    NUMPY_IVF_NPROBE: int = 8 # Lists scanned per query when IVF is enabled
+    NUMPY_QUANTIZATION: str = "none" # "none", "int8" (scalar) or "pq" (product quantization); see src/vector_db/quantization.py for a recall report
+    NUMPY_PQ_SUBVECTORS: int = 96 # PQ code bytes per vector
+    NUMPY_RERANK_FACTOR: int = 4 # Candidates re-ranked with full-precision vectors = top_k * factor
+    INDEX_JOBS_PATH: str = "vector_db/index_jobs.sqlite" # Background indexing jobs and their per-file progress
+    INDEX_JOB_POLL_SECONDS: float = 2.0 # How often the job worker checks for new jobs (and the app refreshes progress)
+    INGEST_MANIFEST_PATH: str = "vector_db/ingest_manifest.json" # Tracks indexed files for incremental re-indexing
+    BM25_INDEX_PATH: str = "vector_db/bm25_index.pkl" # Lexical index kept alongside the collection
+    VECTOR_DB_SHARDING: str = "none" # "none", "tenant" (top-level folder under DATA_DIR), "directory" (each file's folder) or "hash" (of the source path)
+    VECTOR_DB_NUM_SHARDS: int = 4 # Shard count for "hash" sharding
+    SHARD_MANIFEST_PATH: str = "vector_db/shards.json" # Known shards and the routing they were built with
+    SHARD_FANOUT_WORKERS: int = 4 # Threads used to search several shards in parallel
+    SNAPSHOT_PATH: str = "vector_db/snapshot" # Default location for exported snapshots (src/vector_db/snapshot.py)
 
     # Retrieval settings
     TOP_K_RETRIEVAL: int = 5
+    RETRIEVAL_MODE: str = "dense" # "dense" (vector only), "hybrid" (BM25 + vector, fused with RRF) or "mmr" (vector, re-ranked for diversity)
+    HYBRID_CANDIDATES: int = 20 # Candidates taken from each ranking before fusion
+    RRF_K: int = 60 # Reciprocal rank fusion constant
+    MMR_CANDIDATES: int = 25 # Nearest neighbours fetched (with embeddings) before MMR re-ranking
+    MMR_LAMBDA: float = 0.6 # 1.0 ranks purely by relevance; lower values favour diversity
+    MMR_MAX_PER_SOURCE: int = 2 # Most chunks MMR keeps from any one source file; 0 for no cap
+    QUERY_BATCH_CONCURRENCY: int = 8 # Concurrent generations in RAGPipeline.query_batch
+
+    # Generation settings
+    CONTEXT_PACKING_ENABLED: bool = True # Merge overlapping chunks and fit the context to a token budget (src/generation/context_packer.py)
+    CONTEXT_TOKEN_BUDGET: int = 4000 # Estimated tokens of retrieved context per prompt
+
+    # Response cache settings
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600 # 0 disables expiry
+    RESPONSE_CACHE_SEMANTIC_DISTANCE: float = 0.05 # Max cosine distance for reusing an answer (0 disables the semantic tier)
+
+    # HTTP API settings (python -m src.api.server)
+    API_HOST: str = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT: int = int(os.getenv("API_PORT", "8000"))
+    API_MAX_CONCURRENT_QUERIES: int = 16 # Queries running at once; more wait in line
+    API_MAX_QUEUED_QUERIES: int = 64 # Waiting queries beyond this are rejected with 503
+    API_QUEUE_TIMEOUT_SECONDS: float = 10.0 # A query that waits this long for a slot is rejected with 503
+    API_MAX_BODY_BYTES: int = 1_000_000
+
+    # Startup settings
+    WARM_UP_ON_START: bool = True # Open the vector store and Gemini clients in the background when the app starts
+
+    # Telemetry settings
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    TELEMETRY_ENABLED: bool = True # Timing spans and metrics (see src/telemetry)
+    TELEMETRY_PROMETHEUS_PORT: int = int(os.getenv("TELEMETRY_PROMETHEUS_PORT", "0")) # Serve /metrics on this port (0 disables)
+    TELEMETRY_MAX_SPAN_CHILDREN: int = 100 # Child spans kept per span; later ones only add to per-name counts and durations
+    TELEMETRY_JSON_LOG_PATH: str = os.getenv("TELEMETRY_JSON_LOG_PATH", "") # Append finished traces here as JSON lines ("" disables)
+    TELEMETRY_OTEL_ENABLED: bool = os.getenv("TELEMETRY_OTEL_ENABLED", "").lower() in ("1", "true") # Mirror spans to OpenTelemetry (OTLP, configured via OTEL_EXPORTER_OTLP_* env vars)
 
     # Evaluation settings 
     RAGAS_EVAL_LLM: str = "gemini-2.5-flash" # Ragas can also use gemini-2.5-flash
     # Or 'gemini-1.5-pro' if you prefer a more capable model for evaluation which might be more robust for complex reasoning needed for Ragas metrics, though 2.5-flash should work.
+    EVAL_BATCH_SIZE: int = 64 # Questions sent through RAGPipeline.query_batch at a time
+    EVAL_JUDGE_CACHE_ENABLED: bool = True # Reuse judge-LLM scores for unchanged (metric, question, contexts, answer) samples
+    EVAL_JUDGE_CACHE_PATH: str = "vector_db/eval_judge_cache.sqlite"
+    EVAL_SAMPLE_SIZE: int = 0 # Score a random subset of this many questions (0 = all)
+    EVAL_SEED: int = 0 # Seed for sampling and question order
+    EVAL_EARLY_STOP_TOLERANCE: float = 0.0 # Stop once every metric's 95% confidence half-width is below this (0 = off)
+    EVAL_MIN_SAMPLES: int = 20 # Questions scored before early stopping may kick in
+    EVAL_RETRIEVAL_KS: list = [1, 3, 5, 10] # Cutoffs for the LLM-free retrieval metrics
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+from typing import Dict, Any, Awaitable, Callable, Hashable
+from config.settings import settings
+from src.telemetry.metrics import COALESCED_REQUESTS
+
+
+class Overloaded(Exception):
+    """Raised when a request is turned away by admission control."""
+
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the work in flight: at most `max_concurrent` requests run, at most `max_queued`
+    wait for a slot, and a request that waits longer than `queue_timeout` gives up.
+    Rejecting early keeps latency bounded under overload instead of letting every request
+    slow down together.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = settings.API_MAX_CONCURRENT_QUERIES,
+                 max_queued: int = settings.API_MAX_QUEUED_QUERIES,
+                 queue_timeout: float = settings.API_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        if self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded("too many queued requests")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a free slot", retry_after=self.queue_timeout)
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": self.active, "waiting": self.waiting, "rejected": self.rejected,
+                "max_concurrent": self.max_concurrent, "max_queued": self.max_queued}
+
+
+class RequestCoalescer:
+    """
+    Runs identical concurrent requests once: the first caller for a key starts the work and
+    later callers with the same key await the same task. The task is shielded, so one caller
+    disconnecting doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            COALESCED_REQUESTS.inc()
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,250 @@
+"""
+Minimal HTTP API over RAGPipeline, as a plain ASGI application (served by uvicorn):
+
+    POST /v1/query          {"question": "...", "shards": ["team_a"]}  ->  {"question": ..., "answer": ...}
+    POST /v1/query/stream   same body; answer streamed as server-sent events
+    POST /v1/index          {"directory": "data/raw/team_a"}  (optional; must be inside DATA_DIR)
+    GET  /health            liveness, admission-control counters and per-model Gemini client state
+    GET  /metrics           Prometheus text format
+
+Identical in-flight queries are answered by one pipeline run, and queries beyond the
+configured concurrency wait in a bounded line or are rejected with 503 and Retry-After.
+
+    python -m src.api.server
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import settings
+from src.api.concurrency import AdmissionController, Overloaded, RequestCoalescer
+from src.clients import gemini
+from src.core.rag_pipeline import RAGPipeline
+from src.core.response_cache import normalize_query
+from src.telemetry.metrics import REGISTRY, HTTP_REQUESTS, HTTP_SECONDS
+from src.vector_db.sharding import shard_scope
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: List[Tuple[bytes, bytes]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+
+async def _read_json(receive, max_bytes: int = settings.API_MAX_BODY_BYTES) -> Dict[str, Any]:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(499, "client disconnected")
+        body.extend(message.get("body", b""))
+        if len(body) > max_bytes:
+            raise HTTPError(413, "request body too large")
+        if not message.get("more_body"):
+            break
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "request body must be a JSON object")
+    return payload
+
+
+async def _send(send, status: int, body: bytes, content_type: bytes, headers: List[Tuple[bytes, bytes]] = ()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] + list(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status: int, payload: Any, headers: List[Tuple[bytes, bytes]] = ()):
+    await _send(send, status, json.dumps(payload).encode("utf-8"), b"application/json", headers)
+
+
+def _sse(data: Dict[str, Any], event: str = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class RAGService:
+    """ASGI application; one pipeline shared by every request."""
+
+    def __init__(self, pipeline: RAGPipeline = None,
+                 admission: AdmissionController = None,
+                 warm_up: bool = settings.WARM_UP_ON_START):
+        self.pipeline = pipeline or RAGPipeline()
+        # Created on first use so they bind to the server's event loop
+        self._admission = admission
+        self.coalescer = RequestCoalescer()
+        self.warm_up = warm_up
+        self.routes = {
+            ("POST", "/v1/query"): self.handle_query,
+            ("POST", "/v1/query/stream"): self.handle_query_stream,
+            ("POST", "/v1/index"): self.handle_index,
+            ("GET", "/health"): self.handle_health,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+    @property
+    def admission(self) -> AdmissionController:
+        if self._admission is None:
+            self._admission = AdmissionController()
+        return self._admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        handler = self.routes.get(route)
+        start = time.perf_counter()
+        status = 500
+        response_started = False
+
+        async def tracked_send(message):
+            nonlocal response_started
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            if handler is None:
+                known_path = any(path == route[1] for _, path in self.routes)
+                raise HTTPError(405 if known_path else 404, "method not allowed" if known_path else "not found")
+            status = await handler(scope, receive, tracked_send)
+        except HTTPError as e:
+            status = e.status
+            if status != 499 and not response_started:
+                await _send_json(send, status, {"error": e.message}, e.headers)
+        except Exception as e:
+            logger.exception("Unhandled error serving %s %s", *route)
+            if not response_started:
+                await _send_json(send, 500, {"error": f"internal error: {e}"})
+        finally:
+            HTTP_REQUESTS.inc(route=route[1] if handler else "unknown", status=status)
+            HTTP_SECONDS.observe(time.perf_counter() - start, route=route[1] if handler else "unknown")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.warm_up:
+                    # Loads the vector store and Gemini clients before the first request arrives
+                    await asyncio.to_thread(self.pipeline.warm_up, False)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    def _query_params(payload: Dict[str, Any]) -> Tuple[str, Optional[List[str]]]:
+        question = payload.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "'question' must be a non-empty string")
+        shards = payload.get("shards")
+        if shards is not None and (not isinstance(shards, list) or not all(isinstance(s, str) for s in shards)):
+            raise HTTPError(400, "'shards' must be a list of shard names")
+        return question, shards or None
+
+    async def _admitted_query(self, question: str) -> str:
+        async with self.admission.admit():
+            return await self.pipeline.aquery(question)
+
+    async def handle_query(self, scope, receive, send) -> int:
+        question, shards = self._query_params(await _read_json(receive))
+        key = (normalize_query(question), tuple(sorted(shards)) if shards else None)
+        try:
+            # The scope is set before the shared task is created, so the task inherits it
+            with shard_scope(shards):
+                answer = await self.coalescer.run(key, lambda: self._admitted_query(question))
+        except Overloaded as e:
+            raise HTTPError(503, str(e), [(b"retry-after", str(int(e.retry_after + 0.5)).encode())])
+        await _send_json(send, 200, {"question": question, "answer": answer})
+        return 200
+
+    async def handle_query_stream(self, scope, receive, send) -> int:
+        """Streams {"text": ...} events, then an empty "done" event. Streams are not coalesced."""
+        question, shards = self._query_params(await _read_json(receive))
+        try:
+            async with self.admission.admit():
+                await send({"type": "http.response.start", "status": 200, "headers": [
+                    (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no")]})
+                disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+                try:
+                    with shard_scope(shards):
+                        async with contextlib.aclosing(self.pipeline.aquery_stream(question)) as pieces:
+                            async for piece in pieces:
+                                if disconnected.done():
+                                    logger.info("Client disconnected mid-stream; stopping generation.")
+                                    return 499
+                                await send({"type": "http.response.body", "body": _sse({"text": piece}), "more_body": True})
+                    await send({"type": "http.response.body", "body": _sse({}, event="done")})
+                except Exception as e:
+                    # Headers are already out, so the failure is reported in-band
+                    logger.exception("Error while streaming an answer")
+                    await send({"type": "http.response.body", "body": _sse({"error": str(e)}, event="error")})
+                    return 500
+                finally:
+                    disconnected.cancel()
+        except Overloaded as e:
+            raise HTTPError(503, str(e), [(b"retry-after", str(int(e.retry_after + 0.5)).encode())])
+        return 200
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def handle_index(self, scope, receive, send) -> int:
+        payload = await _read_json(receive)
+        data_dir = os.path.abspath(settings.DATA_DIR)
+        directory = os.path.abspath(payload.get("directory") or data_dir)
+        if os.path.commonpath([directory, data_dir]) != data_dir:
+            raise HTTPError(400, "'directory' must be inside DATA_DIR")
+        if not os.path.isdir(directory):
+            raise HTTPError(404, "directory not found")
+        start = time.perf_counter()
+        await self.pipeline.aindex(directory)
+        await _send_json(send, 200, {"status": "indexed", "directory": directory,
+                                     "chunks": self.pipeline.vector_store_manager.count(),
+                                     "seconds": round(time.perf_counter() - start, 3)})
+        return 200
+
+    async def handle_health(self, scope, receive, send) -> int:
+        await _send_json(send, 200, {"status": "ok", "admission": self.admission.stats(),
+                                     "coalescing": len(self.coalescer), "gemini": gemini.client_stats()})
+        return 200
+
+    async def handle_metrics(self, scope, receive, send) -> int:
+        await _send(send, 200, REGISTRY.prometheus_text().encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8")
+        return 200
+
+
+def main():
+    import argparse
+    import uvicorn
+    from src.telemetry.exporters import configure_logging, init_telemetry
+
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP.")
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    args = parser.parse_args()
+
+    configure_logging()
+    init_telemetry()
+    uvicorn.run(RAGService(), host=args.host, port=args.port, log_level=settings.LOG_LEVEL.lower())
+
+
+if __name__ == "__main__":
+    main()
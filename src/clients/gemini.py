@@ -0,0 +1,106 @@
+"""
+Single, lazily initialized entry point to the Gemini SDK.
+
+Importing google.generativeai takes most of a second, so nothing imports it at module
+level; the SDK is imported and configured once, on the first call that needs it.
+
+Every request goes through its model's ModelLane, so the embedding, vision and generation
+paths share one rate limit, one adaptive concurrency limit and one circuit breaker per
+model, and throttled or failed calls are retried with backoff instead of being dropped.
+"""
+import threading
+from typing import Dict, Any
+from config.settings import settings
+from src.clients.resilience import CircuitOpenError, ModelLane, classify
+
+_lock = threading.Lock()
+_genai = None
+_models: Dict[str, Any] = {}
+_lanes: Dict[str, ModelLane] = {}
+
+
+def get_genai():
+    """Returns the configured google.generativeai module, importing it on first use."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+
+def get_model(model_name: str):
+    """Returns a shared GenerativeModel for model_name."""
+    model = _models.get(model_name)
+    if model is None:
+        genai = get_genai()
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+def get_lane(model_name: str) -> ModelLane:
+    """Returns the shared flow-control lane for model_name."""
+    lane = _lanes.get(model_name)
+    if lane is None:
+        with _lock:
+            lane = _lanes.get(model_name)
+            if lane is None:
+                rpm = settings.GEMINI_REQUESTS_PER_MINUTE.get(model_name, settings.GEMINI_DEFAULT_REQUESTS_PER_MINUTE)
+                lane = _lanes[model_name] = ModelLane(model_name, requests_per_minute=rpm)
+    return lane
+
+
+def is_content_error(error: BaseException) -> bool:
+    """Whether a failed call was rejected for its input (and so may succeed with different input)."""
+    return classify(error) == "fatal" and not isinstance(error, CircuitOpenError)
+
+
+def embed_content(model: str, content, **kwargs):
+    return get_lane(model).call("embed", lambda: get_genai().embed_content(model=model, content=content, **kwargs))
+
+
+async def embed_content_async(model: str, content, **kwargs):
+    """Async embed_content; the SDK's async calls share one pooled gRPC channel per event loop."""
+    return await get_lane(model).acall(
+        "embed", lambda: get_genai().embed_content_async(model=model, content=content, **kwargs))
+
+
+def generate_content(model_name: str, contents, kind: str = "generate", **kwargs):
+    """
+    GenerativeModel.generate_content through the model's lane. With stream=True only opening
+    the stream (which fails fast on throttling) is retried and holds a concurrency slot.
+    """
+    model = get_model(model_name)
+    return get_lane(model_name).call(kind, lambda: model.generate_content(contents, **kwargs))
+
+
+async def generate_content_async(model_name: str, contents, kind: str = "generate", **kwargs):
+    model = get_model(model_name)
+    return await get_lane(model_name).acall(kind, lambda: model.generate_content_async(contents, **kwargs))
+
+
+def client_stats() -> Dict[str, Dict[str, Any]]:
+    """Current flow-control state per model, e.g. for a health endpoint."""
+    return {name: lane.stats() for name, lane in list(_lanes.items())}
+
+
+def permissive_safety_settings() -> Dict[Any, Any]:
+    """Safety settings that block nothing; research documents routinely trip the default filters."""
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    return {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+
+
+def warm_up():
+    """Imports the SDK and builds the text and vision model clients ahead of the first request."""
+    get_model(settings.GEMINI_TEXT_MODEL)
+    get_model(settings.GEMINI_VISION_MODEL)
@@ -0,0 +1,341 @@
+"""
+Flow control for remote model calls: a token bucket per model, AIMD adaptive concurrency,
+a circuit breaker, and retries with full jitter under an overall deadline.
+
+Errors are classified as "throttle" (429: slow down), "transient" (5xx, timeouts, dropped
+connections: try again) or "fatal" (bad request, auth: retrying won't help).
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config.settings import settings
+from src.telemetry.metrics import API_RETRIES, API_THROTTLED
+
+_THROTTLE_NAMES = {"ResourceExhausted", "TooManyRequests"}
+_TRANSIENT_NAMES = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+                    "BadGateway", "RetryError", "Aborted", "Unknown"}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while a model's circuit breaker is open."""
+
+
+class CallDeadlineExceeded(TimeoutError):
+    """Raised when a call (including its retries and waits for capacity) runs out of time."""
+
+
+def classify(error: BaseException) -> str:
+    """Returns "throttle", "transient" or "fatal" for an exception raised by an API call."""
+    name = type(error).__name__
+    code = getattr(error, "code", None)
+    code = code if isinstance(code, int) else getattr(getattr(error, "response", None), "status_code", None)
+    if name in _THROTTLE_NAMES or code == 429:
+        return "throttle"
+    if name in _TRANSIENT_NAMES or code in (500, 502, 503, 504) or isinstance(error, (ConnectionError, TimeoutError)):
+        return "transient"
+    return "fatal"
+
+
+class TokenBucket:
+    """Requests-per-second limiter with bursts up to `capacity`; a rate of 0 disables it."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Takes a token and returns how long to wait before using it, or None (taking nothing)
+        if that would be longer than max_wait. Reservations queue up fairly in call order.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (1.0 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1.0
+            return wait
+
+    def refund(self):
+        """Gives back a reserved token that was not spent on a call."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + 1.0)
+
+    def drain(self):
+        """Drops any saved-up burst, e.g. after the server said to slow down."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            if self.rate > 0:
+                self._refill()
+            return self._tokens
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit: grows by about one slot per `limit` successful calls
+    (additive increase) and halves on throttling (multiplicative decrease). Calls that
+    started before a decrease don't trigger another one, so a burst of 429s from
+    requests that were already in flight only halves the limit once.
+    """
+
+    def __init__(self, initial: int = settings.GEMINI_INITIAL_CONCURRENCY,
+                 minimum: int = settings.GEMINI_MIN_CONCURRENCY,
+                 maximum: int = settings.GEMINI_MAX_CONCURRENCY,
+                 backoff: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.backoff = backoff
+        self.in_flight = 0
+        self._epoch = 0
+        self._cond = threading.Condition()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> Optional[int]:
+        with self._cond:
+            if not self._has_room():
+                return None
+            self.in_flight += 1
+            return self._epoch
+
+    def acquire(self, timeout: float) -> Optional[int]:
+        """Waits for a slot; returns a ticket for release(), or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(self._has_room, timeout=max(0.0, timeout)):
+                return None
+            self.in_flight += 1
+            return self._epoch
+
+    async def acquire_async(self, timeout: float) -> Optional[int]:
+        """acquire() for coroutines: polls with short sleeps so it never blocks the event loop."""
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            ticket = self.try_acquire()
+            if ticket is not None:
+                return ticket
+            if time.monotonic() + delay > deadline:
+                return None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, ticket: int, outcome: str):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "throttle" and ticket == self._epoch:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._epoch += 1
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a model looks down: after `failure_threshold` consecutive transient
+    failures the circuit opens and calls are rejected for `reset_timeout` seconds, then a
+    single probe call is let through; its success closes the circuit again. Throttling and
+    bad requests show the service is up, so they don't count as failures.
+    """
+
+    def __init__(self, failure_threshold: int = settings.GEMINI_BREAKER_FAILURES,
+                 reset_timeout: float = settings.GEMINI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    def is_open(self) -> bool:
+        with self._cond:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        with self._cond:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def wait_for_probe(self, timeout: float) -> bool:
+        """Blocks until no probe call is in flight; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._probing, timeout=max(0.0, timeout))
+
+    async def wait_for_probe_async(self, timeout: float) -> bool:
+        """wait_for_probe() for coroutines: polls with short sleeps so it never blocks the event loop."""
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            with self._cond:
+                if not self._probing:
+                    return True
+            if time.monotonic() + delay > deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def record(self, outcome: str):
+        with self._cond:
+            self._probing = False
+            self._cond.notify_all()
+            if outcome != "transient":
+                self.state, self.failures = "closed", 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class ModelLane:
+    """Everything that governs calls to one model: rate, concurrency, breaker and retry policy."""
+
+    def __init__(self, model: str,
+                 requests_per_minute: float = 0,
+                 max_attempts: int = settings.GEMINI_MAX_RETRIES + 1,
+                 base_delay: float = settings.GEMINI_RETRY_BASE_DELAY,
+                 max_delay: float = settings.GEMINI_RETRY_MAX_DELAY,
+                 deadline: float = settings.GEMINI_CALL_DEADLINE_SECONDS):
+        self.model = model
+        self.bucket = TokenBucket(requests_per_minute / 60.0)
+        self.limiter = AIMDLimiter()
+        self.breaker = CircuitBreaker()
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def _retry_delay(self, attempt: int, outcome: str) -> float:
+        """Full jitter; throttling backs off from a longer base since the quota needs time to refill."""
+        base = self.base_delay * (4 if outcome == "throttle" else 1)
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+    def _check_breaker(self):
+        if self.breaker.is_open():
+            raise CircuitOpenError(f"{self.model} is failing; not calling it for up to {self.breaker.reset_timeout:.0f}s")
+
+    def _after_failure(self, kind: str, error: Exception, attempt: int, deadline_at: float) -> float:
+        """Returns the delay before the next attempt, or re-raises if the error shouldn't be retried."""
+        outcome = classify(error)
+        if outcome == "fatal" or attempt + 1 >= self.max_attempts:
+            raise error
+        if outcome == "throttle":
+            API_THROTTLED.inc(model=self.model)
+            self.bucket.drain()
+        delay = self._retry_delay(attempt, outcome)
+        if time.monotonic() + delay >= deadline_at:
+            raise error
+        API_RETRIES.inc(kind=kind, reason=outcome)
+        return delay
+
+    def call(self, kind: str, fn: Callable[[], Any], deadline: float = None) -> Any:
+        """Runs fn() under this lane's limits, retrying throttled and transient failures."""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            self._check_breaker()
+            wait = self.bucket.reserve(deadline_at - time.monotonic())
+            if wait is None:
+                raise CallDeadlineExceeded(f"no {self.model} rate budget before the deadline")
+            time.sleep(wait)
+            ticket = self.limiter.acquire(deadline_at - time.monotonic())
+            if ticket is None:
+                self.bucket.refund()
+                raise CallDeadlineExceeded(f"no free {self.model} concurrency slot before the deadline")
+            if not self.breaker.allow():
+                # Another thread is probing: give back the slot and the token, and wait for its verdict
+                self.limiter.release(ticket, "skipped")
+                self.bucket.refund()
+                self._check_breaker()
+                if not self.breaker.wait_for_probe(deadline_at - time.monotonic()):
+                    raise CallDeadlineExceeded(f"{self.model} circuit probe did not finish before the deadline")
+                continue
+            try:
+                result = fn()
+            except Exception as e:
+                outcome = classify(e)
+                self.limiter.release(ticket, outcome)
+                self.breaker.record(outcome)
+                time.sleep(self._after_failure(kind, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self.limiter.release(ticket, "ok")
+            self.breaker.record("ok")
+            return result
+
+    async def acall(self, kind: str, fn: Callable[[], Awaitable[Any]], deadline: float = None) -> Any:
+        """Async call(): fn returns a fresh awaitable per attempt."""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            self._check_breaker()
+            wait = self.bucket.reserve(deadline_at - time.monotonic())
+            if wait is None:
+                raise CallDeadlineExceeded(f"no {self.model} rate budget before the deadline")
+            await asyncio.sleep(wait)
+            ticket = await self.limiter.acquire_async(deadline_at - time.monotonic())
+            if ticket is None:
+                self.bucket.refund()
+                raise CallDeadlineExceeded(f"no free {self.model} concurrency slot before the deadline")
+            if not self.breaker.allow():
+                self.limiter.release(ticket, "skipped")
+                self.bucket.refund()
+                self._check_breaker()
+                if not await self.breaker.wait_for_probe_async(deadline_at - time.monotonic()):
+                    raise CallDeadlineExceeded(f"{self.model} circuit probe did not finish before the deadline")
+                continue
+            try:
+                result = await fn()
+            except Exception as e:
+                outcome = classify(e)
+                self.limiter.release(ticket, outcome)
+                self.breaker.record(outcome)
+                await asyncio.sleep(self._after_failure(kind, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self.limiter.release(ticket, "ok")
+            self.breaker.record("ok")
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "rate_per_second": self.bucket.rate,
+            "tokens": round(self.bucket.tokens, 2),
+            "circuit": self.breaker.state,
+        }
@@ -0,0 +1,279 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+from config.settings import settings
+from src.core.streaming_ingest import IngestProgress
+
+logger = logging.getLogger(__name__)
+
+# Owners of the queues running in this process
+_live_owners = set()
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """
+    Whether the queue that claimed a job ("host:pid:token") still exists. Queues in this
+    process are checked directly, other local processes by pid; other hosts are assumed alive.
+    """
+    if not owner:
+        return False
+    try:
+        host, pid, _ = owner.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        return owner in _live_owners
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _JobProgress(IngestProgress):
+    def __init__(self, jobs: "IndexJobQueue", job_id: int):
+        self.jobs = jobs
+        self.job_id = job_id
+
+    def planned(self, file_paths: List[str]):
+        self.jobs._plan(self.job_id, file_paths)
+
+    def file_done(self, file_path: str, chunks: int):
+        self.jobs._file_done(self.job_id, file_path, chunks)
+
+    def cancelled(self) -> bool:
+        return self.jobs._is_cancel_requested(self.job_id)
+
+
+class IndexJobQueue:
+    """
+    Persistent queue of indexing jobs, run one at a time by a background worker thread.
+
+    Jobs and their per-file progress live in SQLite, so any session (or process) can poll
+    them. Files are checkpointed in the ingest manifest as they finish, so a job whose
+    worker died (e.g. the app was restarted) is re-queued on the next start() and resumes
+    with the files it had not finished. Queries keep using the existing index meanwhile;
+    new chunks become searchable as each micro-batch is upserted.
+    """
+
+    def __init__(self, pipeline, path: str = settings.INDEX_JOBS_PATH,
+                 poll_seconds: float = settings.INDEX_JOB_POLL_SECONDS):
+        self.pipeline = pipeline
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        _live_owners.add(self.owner)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " directory TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " owner TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " files_total INTEGER NOT NULL DEFAULT 0,"
+            " files_done INTEGER NOT NULL DEFAULT 0,"
+            " files_failed INTEGER NOT NULL DEFAULT 0,"
+            " chunks_indexed INTEGER NOT NULL DEFAULT 0,"
+            " last_file TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " updated_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id INTEGER NOT NULL,"
+            " path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " chunks INTEGER NOT NULL DEFAULT 0,"
+            " finished_at REAL,"
+            " PRIMARY KEY (job_id, path))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+    # --- Submitting and inspecting ----------------------------------------------------
+
+    def submit(self, directory: str = settings.DATA_DIR) -> int:
+        """Queues a job for `directory` and returns its id; an identical job that hasn't started is reused."""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM jobs WHERE status = 'queued' AND directory = ? ORDER BY id LIMIT 1",
+                                     (directory,)).fetchone()
+            if row is not None:
+                return row["id"]
+            cursor = self._conn.execute("INSERT INTO jobs (directory, status, created_at) VALUES (?, 'queued', ?)",
+                                        (directory, time.time()))
+            self._conn.commit()
+            job_id = cursor.lastrowid
+        logger.info("Queued indexing job %d for %s.", job_id, directory)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def active_job(self) -> Optional[Dict[str, Any]]:
+        """The running job, else the oldest queued one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY status = 'running' DESC, id LIMIT 1"
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def files(self, job_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path, status, chunks, finished_at FROM job_files WHERE job_id = ? ORDER BY path",
+                                      (job_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a queued job, or asks a running one to stop after its current file."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id))
+            if not cursor.rowcount:
+                cursor = self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                                            (job_id,))
+            self._conn.commit()
+            return bool(cursor.rowcount)
+
+    # --- Progress callbacks (worker thread) -----------------------------------------------
+
+    def _plan(self, job_id: int, file_paths: List[str]):
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO job_files (job_id, path, status) VALUES (?, ?, 'pending')",
+                                   [(job_id, path) for path in file_paths])
+            # Files finished by an earlier attempt keep their rows, so totals span every attempt
+            self._conn.execute(
+                "UPDATE jobs SET files_total = (SELECT COUNT(*) FROM job_files WHERE job_id = ?), updated_at = ? WHERE id = ?",
+                (job_id, time.time(), job_id))
+            self._conn.commit()
+
+    def _file_done(self, job_id: int, file_path: str, chunks: int):
+        status = "done" if chunks else "failed"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_files (job_id, path, status, chunks, finished_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (job_id, path) DO UPDATE SET status = excluded.status, chunks = excluded.chunks,"
+                " finished_at = excluded.finished_at",
+                (job_id, file_path, status, chunks, now))
+            self._conn.execute(
+                "UPDATE jobs SET"
+                " files_done = (SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status = 'done'),"
+                " files_failed = (SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status = 'failed'),"
+                " chunks_indexed = (SELECT COALESCE(SUM(chunks), 0) FROM job_files WHERE job_id = ?),"
+                " last_file = ?, updated_at = ? WHERE id = ?",
+                (job_id, job_id, job_id, file_path, now, job_id))
+            self._conn.commit()
+
+    def _is_cancel_requested(self, job_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    # --- Worker ---------------------------------------------------------------------------
+
+    def _recover_interrupted(self):
+        """Re-queues running jobs whose worker process is gone."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall()
+            stale = [row["id"] for row in rows if not _owner_alive(row["owner"])]
+            for job_id in stale:
+                self._conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+            self._conn.commit()
+        for job_id in stale:
+            logger.info("Resuming interrupted indexing job %d.", job_id)
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            # The status check makes the claim atomic if several processes share the table
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1,"
+                " started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ? AND status = 'queued'",
+                (self.owner, time.time(), time.time(), row["id"]))
+            self._conn.commit()
+            if not cursor.rowcount:
+                return None
+        return self.get(row["id"])
+
+    def _finish(self, job_id: int, status: str, error: str = None):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                               (status, error, time.time(), time.time(), job_id))
+            self._conn.commit()
+
+    def run_job(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        logger.info("Running indexing job %d (attempt %d) for %s.", job_id, job["attempts"], job["directory"])
+        if not os.path.isdir(job["directory"]):
+            self._finish(job_id, "failed", f"Directory not found: {job['directory']}")
+            return
+        progress = _JobProgress(self, job_id)
+        try:
+            self.pipeline.index_documents(job["directory"], progress=progress)
+        except Exception as e:
+            logger.exception("Indexing job %d failed", job_id)
+            self._finish(job_id, "failed", str(e))
+            return
+        self._finish(job_id, "cancelled" if progress.cancelled() else "completed")
+
+    def _work(self):
+        self._recover_interrupted()
+        while not self._stop.is_set():
+            job = self._claim_next()
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self.run_job(job)
+
+    def start(self) -> "IndexJobQueue":
+        """Starts the worker thread (once); interrupted jobs are resumed first."""
+        if self._worker is None or not self._worker.is_alive():
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._work, name="index-jobs", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """Stops the worker once it is idle or its current job finishes."""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
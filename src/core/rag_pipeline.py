@@ -1,80 +1,421 @@
-from src.data_ingestion.data_loader import load_documents
-from src.data_ingestion.text_chunker import chunk_text
-from src.data_ingestion.multimodal_parser import process_multimodal_documents, analyze_image_with_gemini
-from src.embeddings.embedding_generator import generate_embeddings_for_chunks, get_gemini_embedding
-from src.vector_db.vector_store_manager import VectorStoreManager
+from src.data_ingestion.data_loader import list_supported_files
+from src.data_ingestion.ingest_manifest import IngestManifest
+from src.data_ingestion.dedup import DedupIndex, duplicate_sources_of, refresh_duplicate_metadata
+from src.core.streaming_ingest import StreamingIngestor, IngestProgress
+from src.vector_db.vector_store_manager import VectorStoreManager, create_vector_store_manager
 from src.retrieval.retriever import Retriever
-from src.generation.generator import Generator
+from src.generation.generator import Generator, GENERATION_ERROR_MESSAGE
+from src.embeddings.embedding_generator import get_gemini_embedding, aget_gemini_embedding
+from src.embeddings.embedding_engine import get_embedding_engine
+from src.core.response_cache import ResponseCache
+from src.telemetry import tracing
+from src.telemetry.metrics import ITEMS
 from config.settings import settings
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, AsyncIterator
+
+logger = logging.getLogger(__name__)
 
 class RAGPipeline:
     def __init__(self):
-        self.vector_store_manager = VectorStoreManager()
-        self.retriever = Retriever(self.vector_store_manager)
-        self.generator = Generator()
+        # The vector store, retriever and generator are built on first use (or by warm_up),
+        # so constructing the pipeline does not wait for the database or the Gemini SDK
+        self._vector_store_manager = None
+        self._retriever = None
+        self._generator = None
+        self._init_lock = threading.RLock()
+        self._index_lock = threading.Lock() # One indexing run at a time, whichever entry point starts it
+        self.manifest = IngestManifest()
+        self.dedup_index = DedupIndex() if settings.DEDUP_ENABLED else None
+        self.response_cache = ResponseCache() if settings.RESPONSE_CACHE_ENABLED else None
+
+    @property
+    def vector_store_manager(self) -> VectorStoreManager:
+        if self._vector_store_manager is None:
+            with self._init_lock:
+                if self._vector_store_manager is None:
+                    self._vector_store_manager = create_vector_store_manager()
+        return self._vector_store_manager
+
+    @property
+    def retriever(self) -> Retriever:
+        if self._retriever is None:
+            with self._init_lock:
+                if self._retriever is None:
+                    self._retriever = Retriever(self.vector_store_manager)
+        return self._retriever
+
+    @property
+    def generator(self) -> Generator:
+        if self._generator is None:
+            with self._init_lock:
+                if self._generator is None:
+                    self._generator = Generator()
+        return self._generator
+
+    def warm_up(self, background: bool = True):
+        """
+        Opens the vector store, the lexical index and the Gemini clients ahead of the first query,
+        and runs one search so the backend loads its index. With background=True this happens on
+        a daemon thread, which is returned; a query arriving meanwhile waits for what it needs.
+        """
+        if background:
+            thread = threading.Thread(target=self._warm_up, name="rag-warm-up", daemon=True)
+            thread.start()
+            return thread
+        self._warm_up()
 
-    def index_documents(self, data_directory: str = settings.DATA_DIR):
+    def _warm_up(self):
+        from src.clients import gemini
+        start = time.perf_counter()
+        try:
+            with tracing.span("warm_up"):
+                self.generator
+                self.retriever
+                gemini.warm_up()
+                get_embedding_engine()
+                embedding = self.vector_store_manager.sample_embedding()
+                if embedding is not None:
+                    self.vector_store_manager.query_documents(embedding, top_k=1)
+            logger.info("Pipeline warmed up in %.2fs.", time.perf_counter() - start)
+        except Exception as e:
+            logger.warning("Warm-up failed; components will load on first use: %s", e)
+
+    def index_documents(self, data_directory: str = settings.DATA_DIR, progress: IngestProgress = None):
         """
         Ingests, processes, embeds, and indexes documents into the vector store.
+        Only new or changed files are processed; chunks of changed and deleted files are purged first.
+        Files are streamed through the pipeline and checkpointed one by one, so memory stays flat
+        and an interrupted run resumes with the files it had not finished.
+        Concurrent calls run one after the other. `progress` receives per-file updates.
         """
-        print(f"Starting document indexing from {data_directory}...")
-        # 1. Load documents
-        raw_documents = load_documents(data_directory)
-        print(f"Loaded {len(raw_documents)} raw documents.")
-
-        # 2. Process multimodal content (e.g., image descriptions)
-        multimodal_processed_documents = process_multimodal_documents(raw_documents)
-        print(f"Processed {len(multimodal_processed_documents)} documents for multimodal content.")
-
-        all_chunks_to_embed = []
-        for doc in multimodal_processed_documents:
-            if doc["type"] == "text" or doc["type"] == "image_description":
-                chunks = chunk_text(doc["content"], doc["metadata"])
-                all_chunks_to_embed.extend(chunks)
-            else:
-                # If you have raw image paths, you might want to index them directly
-                # For now, we only embed the generated descriptions.
-                print(f"Skipping direct embedding for type: {doc['type']} (handled by description).")
-
-        # 3. Generate embeddings for all text chunks and image descriptions
-        documents_with_embeddings = generate_embeddings_for_chunks(all_chunks_to_embed)
-        print(f"Generated embeddings for {len(documents_with_embeddings)} chunks/descriptions.")
-
-        # 4. Add to vector store
-        self.vector_store_manager.add_documents(documents_with_embeddings)
-        print("Documents indexed successfully.")
+        with self._index_lock:
+            self._index_documents(data_directory, progress or IngestProgress())
+
+    def _index_documents(self, data_directory: str, progress: IngestProgress):
+        try:
+            self._index_changed_files(data_directory, progress)
+        finally:
+            # The BM25 index is only saved once per run, including runs that fail or are cancelled
+            self.vector_store_manager.flush()
+
+    def _index_changed_files(self, data_directory: str, progress: IngestProgress):
+        logger.info("Starting document indexing from %s...", data_directory)
+        with tracing.span("index", directory=data_directory) as index_span:
+            # 0. Work out what changed since the last run
+            with tracing.span("index.diff"):
+                changes = self.manifest.diff(list_supported_files(data_directory))
+            logger.info("Files: %d new, %d changed, %d unchanged, %d deleted.", len(changes['new']),
+                        len(changes['changed']), len(changes['unchanged']), len(changes['deleted']))
+
+            purged = changes["changed"] + changes["deleted"]
+            if self.dedup_index is not None and purged:
+                # Files whose duplicate chunks were folded into chunks of a purged file would
+                # lose that content, so they are re-indexed to get their own copies
+                dependents = sorted(self.dedup_index.dependent_sources(purged))
+                for file_path in dependents:
+                    if file_path in changes["unchanged"]:
+                        changes["unchanged"].remove(file_path)
+                    changes["changed"].append(file_path)
+                if dependents:
+                    logger.info("Re-indexing %d files that shared chunks with changed or deleted files.", len(dependents))
+                purged = changes["changed"] + changes["deleted"]
+
+            with tracing.span("index.purge", files=len(purged)):
+                for file_path in purged:
+                    self.vector_store_manager.delete_documents_by_source(self.manifest.indexed_path(file_path),
+                                                                         self.manifest.chunk_ids_for(file_path))
+                    self.manifest.remove(file_path)
+                self.manifest.save()
+                if self.dedup_index is not None and purged:
+                    refresh_duplicate_metadata(self.vector_store_manager, self.dedup_index,
+                                               self.dedup_index.remove_sources(purged))
+
+            files_to_index = changes["new"] + changes["changed"]
+            progress.planned(files_to_index)
+            if not files_to_index:
+                logger.info("Index is up to date.")
+                return
+
+            # 1-4. Load, caption, chunk, embed and upsert, streaming in micro-batches
+            stats = StreamingIngestor(self.vector_store_manager, self.manifest, progress=progress,
+                                      dedup_index=self.dedup_index).run(files_to_index)
+            index_span.set(**stats)
+        logger.info("Indexed %d chunks from %d files (%d near-duplicate chunks stored once; %d chunks and %d files failed).",
+                    stats['chunks_indexed'], stats['files_indexed'], stats['chunks_deduplicated'],
+                    stats['chunks_failed'], stats['files_failed'])
+        logger.info("Documents indexed successfully.")
+
+    def _lookup_cache(self, user_query: str):
+        """
+        Checks the response cache. Returns (cached_response, query_embedding, version); the embedding
+        is computed on an exact-tier miss so the caller can reuse it for retrieval, and the store
+        version read before retrieval is what a fresh answer must be cached under.
+        """
+        version, scope = self.vector_store_manager.version, self.vector_store_manager.cache_scope
+        with tracing.span("query.cache_lookup") as lookup_span:
+            cached = self.response_cache.get_exact(user_query, version, scope)
+            if cached is not None:
+                logger.info("Response cache hit (exact).")
+                lookup_span.set(result="exact_hit")
+                return cached, None, version
+            with tracing.span("query.embed"):
+                query_embedding = get_gemini_embedding(user_query)
+            if query_embedding:
+                cached = self.response_cache.get_semantic(query_embedding, version, scope)
+                if cached is not None:
+                    logger.info("Response cache hit (semantic).")
+            lookup_span.set(result="semantic_hit" if cached is not None else "miss")
+        return cached, query_embedding, version
 
     def query(self, user_query: str) -> str:
         """
         Executes the RAG pipeline for a given user query.
         """
-        print(f"\nProcessing query: '{user_query}'")
-        # 1. Retrieve relevant documents
-        retrieved_docs = self.retriever.retrieve_relevant_documents(user_query)
-        if not retrieved_docs:
-            return "I couldn't find any relevant information for your query."
+        logger.info("Processing query: '%s'", user_query)
+        ITEMS.inc(stage="queries")
+        with tracing.span("query"):
+            query_embedding = version = None
+            if self.response_cache is not None:
+                cached, query_embedding, version = self._lookup_cache(user_query)
+                if cached is not None:
+                    return cached
 
-        print(f"Retrieved {len(retrieved_docs)} relevant documents/chunks.")
+            # 1. Retrieve relevant documents
+            retrieved_docs = self.retriever.retrieve_relevant_documents(user_query, query_embedding=query_embedding)
+            if not retrieved_docs:
+                return "I couldn't find any relevant information for your query."
 
-        # 2. Generate answer
-        answer = self.generator.generate_answer(user_query, retrieved_docs)
+            logger.info("Retrieved %d relevant documents/chunks.", len(retrieved_docs))
+
+            # 2. Generate answer
+            answer = self.generator.generate_answer(user_query, retrieved_docs)
 
         # 3. Add sources (optional, but good for research assistant)
+        response = answer + self._format_sources(retrieved_docs)
+        if self.response_cache is not None and query_embedding and answer != GENERATION_ERROR_MESSAGE:
+            self.response_cache.put(user_query, query_embedding, response, version,
+                                    self.vector_store_manager.cache_scope)
+        return response
+
+    def query_stream(self, user_query: str) -> Iterator[str]:
+        """
+        Streaming variant of query: yields answer text as it is generated, then the sources block.
+        """
+        logger.info("Processing query (streaming): '%s'", user_query)
+        ITEMS.inc(stage="queries")
+        query_embedding = version = None
+        if self.response_cache is not None:
+            cached, query_embedding, version = self._lookup_cache(user_query)
+            if cached is not None:
+                yield cached
+                return
+
+        retrieved_docs = self.retriever.retrieve_relevant_documents(user_query, query_embedding=query_embedding)
+        if not retrieved_docs:
+            yield "I couldn't find any relevant information for your query."
+            return
+
+        logger.info("Retrieved %d relevant documents/chunks.", len(retrieved_docs))
+        pieces = []
+        for piece in self.generator.generate_answer_stream(user_query, retrieved_docs):
+            pieces.append(piece)
+            yield piece
+        sources = self._format_sources(retrieved_docs)
+        yield sources
+
+        answer = "".join(pieces)
+        # A stream can fail after partial output, so check the tail for the error message
+        if self.response_cache is not None and query_embedding and not answer.endswith(GENERATION_ERROR_MESSAGE):
+            self.response_cache.put(user_query, query_embedding, answer + sources, version,
+                                    self.vector_store_manager.cache_scope)
+
+    async def _alookup_cache(self, user_query: str):
+        """Async _lookup_cache; the embedding call is awaited instead of blocking."""
+        version, scope = self.vector_store_manager.version, self.vector_store_manager.cache_scope
+        with tracing.span("query.cache_lookup") as lookup_span:
+            cached = self.response_cache.get_exact(user_query, version, scope)
+            if cached is not None:
+                logger.info("Response cache hit (exact).")
+                lookup_span.set(result="exact_hit")
+                return cached, None, version
+            with tracing.span("query.embed"):
+                query_embedding = await aget_gemini_embedding(user_query)
+            if query_embedding:
+                cached = self.response_cache.get_semantic(query_embedding, version, scope)
+                if cached is not None:
+                    logger.info("Response cache hit (semantic).")
+            lookup_span.set(result="semantic_hit" if cached is not None else "miss")
+        return cached, query_embedding, version
+
+    async def _aretrieve(self, user_query: str, query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """Embeds the query asynchronously, then searches on a worker thread (the search itself is local CPU work)."""
+        if query_embedding is None:
+            with tracing.span("query.embed"):
+                query_embedding = await aget_gemini_embedding(user_query)
+        # to_thread copies the context, so spans and the shard scope carry over
+        return await asyncio.to_thread(self.retriever.retrieve_relevant_documents, user_query,
+                                       query_embedding=query_embedding)
+
+    async def aquery(self, user_query: str) -> str:
+        """
+        Async query: Gemini calls are awaited and vector search runs off the event loop,
+        so one process can serve many queries concurrently.
+        """
+        logger.info("Processing query (async): '%s'", user_query)
+        ITEMS.inc(stage="queries")
+        with tracing.span("query", mode="async"):
+            query_embedding = version = None
+            if self.response_cache is not None:
+                cached, query_embedding, version = await self._alookup_cache(user_query)
+                if cached is not None:
+                    return cached
+
+            retrieved_docs = await self._aretrieve(user_query, query_embedding)
+            if not retrieved_docs:
+                return "I couldn't find any relevant information for your query."
+
+            logger.info("Retrieved %d relevant documents/chunks.", len(retrieved_docs))
+            answer = await self.generator.agenerate_answer(user_query, retrieved_docs)
+
+        response = answer + self._format_sources(retrieved_docs)
+        if self.response_cache is not None and query_embedding and answer != GENERATION_ERROR_MESSAGE:
+            self.response_cache.put(user_query, query_embedding, response, version,
+                                    self.vector_store_manager.cache_scope)
+        return response
+
+    async def aquery_stream(self, user_query: str) -> AsyncIterator[str]:
+        """Async query_stream: yields answer text as it is generated, then the sources block."""
+        logger.info("Processing query (async streaming): '%s'", user_query)
+        ITEMS.inc(stage="queries")
+        query_embedding = version = None
+        if self.response_cache is not None:
+            cached, query_embedding, version = await self._alookup_cache(user_query)
+            if cached is not None:
+                yield cached
+                return
+
+        retrieved_docs = await self._aretrieve(user_query, query_embedding)
+        if not retrieved_docs:
+            yield "I couldn't find any relevant information for your query."
+            return
+
+        logger.info("Retrieved %d relevant documents/chunks.", len(retrieved_docs))
+        pieces = []
+        async for piece in self.generator.agenerate_answer_stream(user_query, retrieved_docs):
+            pieces.append(piece)
+            yield piece
+        sources = self._format_sources(retrieved_docs)
+        yield sources
+
+        answer = "".join(pieces)
+        if self.response_cache is not None and query_embedding and not answer.endswith(GENERATION_ERROR_MESSAGE):
+            self.response_cache.put(user_query, query_embedding, answer + sources, version,
+                                    self.vector_store_manager.cache_scope)
+
+    async def aindex(self, data_directory: str = settings.DATA_DIR):
+        """
+        Async index_documents. Ingestion already overlaps loading, embedding and upserts on its
+        own threads, so the whole run is moved off the event loop rather than rewritten.
+        """
+        await asyncio.to_thread(self.index_documents, data_directory)
+
+    def query_batch(self, questions: List[str], top_k: int = settings.TOP_K_RETRIEVAL) -> List[Dict[str, Any]]:
+        """
+        Answers many questions at once and returns structured results instead of formatted strings.
+
+        All questions are embedded in one batched call and searched in one vectorized call;
+        generations then run concurrently. Each result holds 'question', 'answer', 'contexts'
+        (retrieved chunk texts), 'sources', 'distances', 'retrieved' (the raw chunks), 'error'
+        and 'timings' in seconds. Embedding and retrieval happen once for the whole batch, so
+        their timings are the batch totals; 'generate' is per question.
+        """
+        if not questions:
+            return []
+        logger.info("Processing batch of %d queries...", len(questions))
+        ITEMS.inc(len(questions), stage="queries")
+
+        with tracing.span("query_batch", questions=len(questions)):
+            with tracing.span("query_batch.embed") as embed_span:
+                embedded = get_embedding_engine().embed_texts(questions)
+            embed_seconds = embed_span.duration
+
+            with tracing.span("query_batch.retrieve") as retrieve_span:
+                retrieved = self.retriever.retrieve_batch(questions, embedded.embeddings, top_k)
+            retrieve_seconds = retrieve_span.duration
+
+            def generate(i: int) -> Dict[str, Any]:
+                docs = retrieved[i]
+                result = {
+                    "question": questions[i],
+                    "answer": "I couldn't find any relevant information for your query.",
+                    "contexts": [doc["content"] for doc in docs],
+                    "sources": list(dict.fromkeys(source for doc in docs for source in
+                                                  [doc["metadata"].get("source", "Unknown Source")] + duplicate_sources_of(doc["metadata"]))),
+                    "distances": [doc.get("distance") for doc in docs],
+                    "retrieved": docs,
+                    "error": embedded.failures.get(i),
+                    "timings": {"embed": embed_seconds, "retrieve": retrieve_seconds, "generate": 0.0},
+                }
+                if docs:
+                    generation_start = time.perf_counter()
+                    result["answer"] = self.generator.generate_answer(questions[i], docs)
+                    result["timings"]["generate"] = time.perf_counter() - generation_start
+                    if result["answer"] == GENERATION_ERROR_MESSAGE:
+                        result["error"] = "generation failed"
+                return result
+
+            with ThreadPoolExecutor(max_workers=max(1, settings.QUERY_BATCH_CONCURRENCY)) as executor:
+                results = list(executor.map(tracing.bind(generate), range(len(questions))))
+        logger.info("Batch done: embed %.2fs, retrieve %.2fs, generate %.2fs (summed over questions).",
+                    embed_seconds, retrieve_seconds, sum(r['timings']['generate'] for r in results))
+        return results
+
+    def _format_sources(self, retrieved_docs: List[Dict[str, Any]]) -> str:
         sources = "\nSources:\n"
         unique_sources = set()
         for doc in retrieved_docs:
             source_info = doc["metadata"].get("source", "Unknown Source")
-            if source_info not in unique_sources:
-                sources += f"- {source_info}\n"
-                unique_sources.add(source_info)
+            # Files whose copy of this chunk was deduplicated away are sources too
+            for source in [source_info] + duplicate_sources_of(doc["metadata"]):
+                if source not in unique_sources:
+                    sources += f"- {source}\n"
+                    unique_sources.add(source)
             if doc["metadata"].get("original_type") == "image":
                  sources += f" (Image description from {doc['metadata'].get('file_name', 'N/A')})\n"
+        return sources
 
+    def export_snapshot(self, path: str = settings.SNAPSHOT_PATH) -> Dict[str, Any]:
+        """Writes the knowledge base, and the record of indexed files, to a snapshot (see src/vector_db/snapshot.py)."""
+        from src.vector_db.snapshot import export_snapshot
+        with self._index_lock:
+            return export_snapshot(self.vector_store_manager, path, ingest_manifest=self.manifest)
 
-        return answer + sources
+    def restore_snapshot(self, path: str = settings.SNAPSHOT_PATH, verify: bool = True) -> Dict[str, Any]:
+        """
+        Replaces the knowledge base with a snapshot, without any API calls. The dedup index
+        describes the replaced chunks, so it is cleared; files indexed later are only
+        deduplicated against each other.
+        """
+        from src.vector_db.snapshot import restore_snapshot
+        with self._index_lock:
+            manifest = restore_snapshot(self.vector_store_manager, path, ingest_manifest=self.manifest, verify=verify)
+            if self.dedup_index is not None:
+                self.dedup_index.clear()
+            if self.response_cache is not None:
+                self.response_cache.clear()
+        return manifest
 
     def reset(self):
-        """Resets the vector database."""
-        self.vector_store_manager.reset_collection()
\ No newline at end of file
+        """Resets the vector database and forgets which files were indexed."""
+        self.vector_store_manager.reset_collection()
+        self.manifest.clear()
+        if self.dedup_index is not None:
+            self.dedup_index.clear()
+        if self.response_cache is not None:
+            self.response_cache.clear()
@@ -0,0 +1,144 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from src.telemetry.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial variants share a key."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache in front of RAGPipeline.query.
+
+    The exact tier matches the normalized query text. The semantic tier reuses an answer
+    whose query embedding is within `max_distance` cosine distance of the new one.
+    Entries expire after `ttl_seconds`, the least recently used ones are evicted past
+    `max_entries`, and everything is dropped when the vector store's version changes.
+    Answers are keyed by the search scope as well (e.g. the shards a tenant may see), so
+    one scope's answer is never served to another, and switching scopes keeps both cached.
+    """
+
+    def __init__(self,
+                 max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = settings.RESPONSE_CACHE_TTL_SECONDS,
+                 max_distance: float = settings.RESPONSE_CACHE_SEMANTIC_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[Any, str], Dict[str, Any]]" = OrderedDict() # (scope, normalized query) -> entry
+        self._matrix: Optional[np.ndarray] = None # Stacked unit query embeddings, rebuilt lazily
+        self._matrix_keys: List[Tuple[Any, str]] = []
+        self._version = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                logger.info("Vector store changed; clearing response cache.")
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds
+
+    def get_exact(self, query: str, version, scope=None) -> Optional[str]:
+        key = (scope, normalize_query(query))
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry):
+                CACHE_LOOKUPS.inc(cache="response_exact", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            CACHE_LOOKUPS.inc(cache="response_exact", result="hit")
+            return entry["response"]
+
+    def get_semantic(self, query_embedding: List[float], version, scope=None) -> Optional[str]:
+        with self._lock:
+            if self.max_distance <= 0:
+                self.misses += 1
+                return None
+            self._check_version(version)
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = (np.stack([self._entries[k]["embedding"] for k in self._matrix_keys])
+                                if self._matrix_keys else None)
+            if self._matrix is None:
+                self.misses += 1
+                return None
+            query_vector = self._unit(query_embedding)
+            distances = 1.0 - self._matrix @ query_vector
+            for i in np.argsort(distances):
+                if distances[i] > self.max_distance:
+                    break
+                key = self._matrix_keys[i]
+                if key[0] != scope:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and not self._is_expired(entry):
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    CACHE_LOOKUPS.inc(cache="response_semantic", result="hit")
+                    return entry["response"]
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="response_semantic", result="miss")
+            return None
+
+    def put(self, query: str, query_embedding: List[float], response: str, version, scope=None):
+        """
+        Stores an answer built from the store at `version`, which the caller read before retrieving.
+        If the store changed while the answer was generated it may be stale, so it is not stored.
+        """
+        key = (scope, normalize_query(query))
+        with self._lock:
+            if version != self._version:
+                logger.debug("Vector store changed while answering; not caching the response.")
+                return
+            self._entries[key] = {
+                "response": response,
+                "embedding": self._unit(query_embedding),
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,236 @@
+import logging
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Iterator
+from src.data_ingestion.data_loader import iter_documents
+from src.data_ingestion.dedup import DedupIndex, refresh_duplicate_metadata
+from src.data_ingestion.ingest_manifest import IngestManifest
+from src.data_ingestion.text_chunker import get_chunking_engine
+from src.data_ingestion.multimodal_parser import process_multimodal_documents
+from src.embeddings.embedding_generator import generate_embeddings_for_chunks
+from src.vector_db.vector_store_manager import VectorStoreManager
+from src.telemetry import tracing
+from src.telemetry.metrics import ITEMS
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Markers passed through the chunk queue alongside chunk dicts
+_FILE_DONE = "file_done"
+_END = "end"
+_ERROR = "error"
+
+
+class IngestProgress:
+    """Receives per-file progress from an indexing run; the defaults do nothing."""
+
+    def planned(self, file_paths: List[str]):
+        """Called once with the files the run is about to index (unchanged files are not included)."""
+
+    def file_done(self, file_path: str, chunks: int):
+        """Called when a file is checkpointed; chunks == 0 means it produced nothing and will be retried."""
+
+    def cancelled(self) -> bool:
+        """Polled between files; returning True stops the run after the current file."""
+        return False
+
+
+class StreamingIngestor:
+    """
+    Bounded-memory ingest: load -> caption -> chunk -> dedup -> embed -> upsert.
+
+    A producer thread loads, captions and chunks files and feeds a bounded queue, so it
+    blocks whenever embedding falls behind. The consumer embeds and upserts chunks in
+    fixed-size micro-batches and records each file in the manifest as soon as all of its
+    chunks are stored, so an interrupted run only redoes the files it had not finished.
+    With a DedupIndex, near-duplicates of stored chunks are dropped before embedding and
+    recorded on the chunk they duplicate.
+    """
+
+    def __init__(self,
+                 vector_store_manager: VectorStoreManager,
+                 manifest: IngestManifest,
+                 micro_batch_size: int = settings.INGEST_MICRO_BATCH_SIZE,
+                 queue_size: int = settings.INGEST_QUEUE_SIZE,
+                 progress: IngestProgress = None,
+                 dedup_index: DedupIndex = None):
+        self.vector_store_manager = vector_store_manager
+        self.manifest = manifest
+        self.dedup_index = dedup_index
+        self.progress = progress or IngestProgress()
+        self.micro_batch_size = max(1, micro_batch_size)
+        self.queue_size = max(1, queue_size)
+
+    def _produce_chunks(self, file_paths: List[str]) -> Iterator[Any]:
+        """Yields chunk dicts, with a file-done marker after the last chunk of every file."""
+        # Documents are processed in small windows so the images in a window are captioned concurrently
+        window_size = settings.CAPTION_MAX_CONCURRENCY * 2
+        window: List[Dict[str, Any]] = []
+        closed_sources: List[str] = []
+
+        def drain():
+            with tracing.span("ingest.caption", documents=len(window)):
+                processed_documents = process_multimodal_documents(window)
+            chunkable = []
+            for processed in processed_documents:
+                if processed["type"] == "text" or processed["type"] == "image_description":
+                    chunkable.append(processed)
+                else:
+                    logger.info("Skipping direct embedding for type: %s (handled by description).", processed['type'])
+            with tracing.span("ingest.chunk", records=len(chunkable)):
+                chunks = get_chunking_engine().chunk_documents(chunkable)
+            yield from chunks
+            window.clear()
+            for source in closed_sources:
+                yield (_FILE_DONE, source)
+            closed_sources.clear()
+
+        current_source = None
+        seen_sources = set()
+        load_start = time.perf_counter()
+        for doc in iter_documents(file_paths):
+            # Time spent waiting on the loader pool, per document
+            tracing.record("ingest.load", load_start)
+            source = doc["metadata"]["source"]
+            if source != current_source:
+                if current_source is not None:
+                    closed_sources.append(current_source)
+                current_source = source
+                seen_sources.add(source)
+            window.append(doc)
+            if len(window) >= window_size:
+                yield from drain()
+            load_start = time.perf_counter()
+        if current_source is not None:
+            closed_sources.append(current_source)
+        yield from drain()
+        # Files that failed to load produced no documents; close them out too
+        for file_path in file_paths:
+            if file_path not in seen_sources:
+                yield (_FILE_DONE, file_path)
+
+    def _producer(self, file_paths: List[str], chunk_queue: queue.Queue, stop: threading.Event):
+        try:
+            for item in self._produce_chunks(file_paths):
+                while not stop.is_set():
+                    try:
+                        chunk_queue.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            chunk_queue.put((_END, None))
+        except Exception as e:
+            chunk_queue.put((_ERROR, e))
+
+    def run(self, file_paths: List[str]) -> Dict[str, int]:
+        """Ingests the given files and returns run statistics."""
+        stats = {"files_indexed": 0, "files_failed": 0, "chunks_indexed": 0, "chunks_failed": 0, "chunks_deduplicated": 0}
+        chunk_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=tracing.bind(self._producer), args=(file_paths, chunk_queue, stop),
+                                    name="ingest-producer", daemon=True)
+        producer.start()
+
+        batch: List[Dict[str, Any]] = []
+        finished_files: List[str] = []
+        chunk_ids_by_source: Dict[str, List[str]] = {}
+        deduplicated_by_source: Dict[str, int] = {}
+        failed_by_source: Dict[str, int] = {}
+
+        def flush():
+            if batch:
+                plan = None
+                if self.dedup_index is not None:
+                    with tracing.span("ingest.dedup", chunks=len(batch)) as dedup_span:
+                        plan = self.dedup_index.plan(batch, self.vector_store_manager.partition_for)
+                        dedup_span.set(duplicates=len(plan.duplicates))
+                embedded = generate_embeddings_for_chunks(plan.unique if plan else batch)
+                with tracing.span("ingest.upsert", chunks=len(embedded)):
+                    self.vector_store_manager.add_documents(embedded)
+                stored_ids = set()
+                for chunk in embedded:
+                    if chunk.get("embedding"):
+                        stored_ids.add(chunk["metadata"]["chunk_id"])
+                        chunk_ids_by_source.setdefault(chunk["metadata"]["source"], []).append(chunk["metadata"]["chunk_id"])
+                        stats["chunks_indexed"] += 1
+                    else:
+                        stats["chunks_failed"] += 1
+                        source = chunk["metadata"]["source"]
+                        failed_by_source[source] = failed_by_source.get(source, 0) + 1
+                if plan is not None:
+                    accepted = self.dedup_index.commit(plan, stored_ids)
+                    # Duplicates of chunks that failed to store are lost with them
+                    stats["chunks_failed"] += len(plan.duplicates) - len(accepted)
+                    accepted_ids = {id(chunk) for chunk, _ in accepted}
+                    for chunk, _ in plan.duplicates:
+                        if id(chunk) not in accepted_ids:
+                            source = chunk["metadata"]["source"]
+                            failed_by_source[source] = failed_by_source.get(source, 0) + 1
+                    for chunk, _ in accepted:
+                        source = chunk["metadata"]["source"]
+                        deduplicated_by_source[source] = deduplicated_by_source.get(source, 0) + 1
+                    stats["chunks_deduplicated"] += len(accepted)
+                    ITEMS.inc(len(accepted), stage="chunks_deduplicated")
+                    refresh_duplicate_metadata(self.vector_store_manager, self.dedup_index,
+                                               sorted({canonical_id for _, canonical_id in accepted}))
+                batch.clear()
+            # Every chunk of these files has now been through the store, so they can be checkpointed
+            chunk_counts = {}
+            for file_path in finished_files:
+                chunk_ids = chunk_ids_by_source.pop(file_path, [])
+                chunk_counts[file_path] = len(chunk_ids) + deduplicated_by_source.pop(file_path, 0)
+                failed = failed_by_source.pop(file_path, 0)
+                if failed:
+                    # A partly stored file stays out of the manifest so the next run retries all of it;
+                    # its stored chunks are replaced then, as they keep the same ids
+                    logger.warning("%d chunks of %s could not be indexed; it will be retried on the next run.",
+                                   failed, file_path)
+                    stats["files_failed"] += 1
+                    ITEMS.inc(stage="files_failed")
+                elif chunk_counts[file_path]:
+                    self.manifest.record(file_path, chunk_ids)
+                    stats["files_indexed"] += 1
+                    ITEMS.inc(stage="files_indexed")
+                    ITEMS.inc(len(chunk_ids), stage="chunks_indexed")
+                else:
+                    # Leave files that produced nothing out of the manifest so the next run retries them
+                    logger.warning("No chunks indexed for %s; it will be retried on the next run.", file_path)
+                    stats["files_failed"] += 1
+                    ITEMS.inc(stage="files_failed")
+            if finished_files:
+                self.manifest.save()
+                for file_path in finished_files:
+                    self.progress.file_done(file_path, chunk_counts[file_path])
+                finished_files.clear()
+
+        try:
+            while True:
+                item = chunk_queue.get()
+                if isinstance(item, tuple):
+                    marker, payload = item
+                    if marker == _FILE_DONE:
+                        finished_files.append(payload)
+                        if not batch:
+                            flush()
+                        if self.progress.cancelled():
+                            # Store what is buffered so finished files are checkpointed with all their
+                            # chunks; unfinished files stay out of the manifest and are picked up next run
+                            logger.info("Indexing cancelled; stopping after the last finished file.")
+                            flush()
+                            break
+                        continue
+                    if marker == _ERROR:
+                        raise payload
+                    break
+                batch.append(item)
+                if len(batch) >= self.micro_batch_size:
+                    flush()
+            flush()
+        finally:
+            stop.set()
+            producer.join(timeout=5)
+
+        return stats
@@ -1,19 +1,25 @@
+import logging
 import os
-from typing import List, Dict, Any
-from pypdf import PdfReader
-from docx import Document as DocxDocument
-from PIL import Image
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def load_pages_from_pdf(file_path: str) -> List[str]:
+    """Loads the text of each page of a PDF file."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [page.extract_text() or "" for page in reader.pages]
 
 def load_text_from_pdf(file_path: str) -> str:
     """Loads text from a PDF file."""
-    reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return "".join(load_pages_from_pdf(file_path))
 
 def load_text_from_docx(file_path: str) -> str:
     """Loads text from a DOCX file."""
+    from docx import Document as DocxDocument
     doc = DocxDocument(file_path)
     text = []
     for paragraph in doc.paragraphs:
@@ -25,37 +31,96 @@ def load_text_from_txt(file_path: str) -> str:
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def load_image(file_path: str) -> Image.Image:
+def load_image(file_path: str) -> "Image.Image":
     """Loads an image file."""
+    from PIL import Image
     return Image.open(file_path).convert("RGB")
 
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".gif"]
+SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".txt"] + IMAGE_EXTENSIONS
+
+def list_supported_files(directory: str) -> List[str]:
+    """Returns the paths of all supported files under a directory, in a stable order."""
+    file_paths = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            if os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS:
+                file_paths.append(file_path)
+            else:
+                logger.info("Skipping unsupported file: %s", file_path)
+    return sorted(file_paths)
+
+def load_document(file_path: str, per_page: bool = False) -> List[Dict[str, Any]]:
+    """
+    Loads a single supported file.
+    With per_page=True, PDFs yield one record per non-empty page with a 1-based 'page' in metadata.
+    Returns a list of dictionaries with 'content', 'type', and 'metadata' (empty on failure).
+    """
+    file_name = os.path.basename(file_path)
+    file_extension = os.path.splitext(file_name)[1].lower()
+    metadata = {"source": file_path, "file_name": file_name}
+
+    try:
+        if file_extension == ".pdf" and per_page:
+            return [
+                {"content": page_text, "type": "text", "metadata": {**metadata, "page": page_number}}
+                for page_number, page_text in enumerate(load_pages_from_pdf(file_path), start=1)
+                if page_text.strip()
+            ]
+        elif file_extension == ".pdf":
+            text_content = load_text_from_pdf(file_path)
+            return [{"content": text_content, "type": "text", "metadata": metadata}]
+        elif file_extension == ".docx":
+            text_content = load_text_from_docx(file_path)
+            return [{"content": text_content, "type": "text", "metadata": metadata}]
+        elif file_extension == ".txt":
+            text_content = load_text_from_txt(file_path)
+            return [{"content": text_content, "type": "text", "metadata": metadata}]
+        elif file_extension in IMAGE_EXTENSIONS:
+            # For now, we just store the image path. Multimodal processing will happen later.
+            return [{"content": file_path, "type": "image", "metadata": metadata}]
+        else:
+            logger.info("Skipping unsupported file: %s", file_path)
+    except Exception as e:
+        logger.error("Error loading %s: %s", file_path, e)
+    return []
+
 def load_documents(directory: str) -> List[Dict[str, Any]]:
     """
     Loads all supported documents (PDF, DOCX, TXT, images) from a directory.
     Returns a list of dictionaries with 'content', 'type', and 'metadata'.
     """
     documents = []
-    for root, _, files in os.walk(directory):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            file_extension = os.path.splitext(file_name)[1].lower()
-            metadata = {"source": file_path, "file_name": file_name}
-
-            try:
-                if file_extension == ".pdf":
-                    text_content = load_text_from_pdf(file_path)
-                    documents.append({"content": text_content, "type": "text", "metadata": metadata})
-                elif file_extension == ".docx":
-                    text_content = load_text_from_docx(file_path)
-                    documents.append({"content": text_content, "type": "text", "metadata": metadata})
-                elif file_extension == ".txt":
-                    text_content = load_text_from_txt(file_path)
-                    documents.append({"content": text_content, "type": "text", "metadata": metadata})
-                elif file_extension in [".png", ".jpg", ".jpeg", ".gif"]:
-                    # For now, we just store the image path. Multimodal processing will happen later.
-                    documents.append({"content": file_path, "type": "image", "metadata": metadata})
-                else:
-                    print(f"Skipping unsupported file: {file_path}")
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-    return documents
\ No newline at end of file
+    for file_path in list_supported_files(directory):
+        documents.extend(load_document(file_path))
+    return documents
+
+def iter_documents(file_paths: Iterable[str],
+                   parallel: bool = settings.LOADER_PARALLEL,
+                   max_workers: int = settings.LOADER_MAX_WORKERS,
+                   per_page: bool = settings.LOADER_PER_PAGE) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily loads documents from the given files, yielding them one at a time in file order.
+
+    In parallel mode files are parsed on a process pool, with at most a few files per worker
+    in flight, so memory stays bounded no matter how many files are passed in.
+    """
+    if not parallel:
+        for file_path in file_paths:
+            yield from load_document(file_path, per_page)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for file_path in file_paths:
+            pending.append(executor.submit(load_document, file_path, per_page))
+            if len(pending) >= max_workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def stream_documents(directory: str, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Generator counterpart of load_documents; see iter_documents for the options."""
+    return iter_documents(list_supported_files(directory), **kwargs)
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import List, Dict, Any, Callable, Iterable, Optional, Set, Tuple
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int = settings.DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """crc32 of every run of `size` consecutive words (lowercased); texts shorter than that are one shingle."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    count = max(1, len(words) - size + 1)
+    shingles = {" ".join(words[i:i + size]) for i in range(count)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def duplicate_sources_of(metadata: Dict[str, Any]) -> List[str]:
+    """The other files a stored chunk's content was also found in (its 'duplicate_sources' metadata)."""
+    raw = metadata.get("duplicate_sources")
+    return json.loads(raw) if raw else []
+
+
+class DedupPlan:
+    """Outcome of DedupIndex.plan for one batch: which chunks to embed and which to fold into others."""
+
+    def __init__(self):
+        self.unique: List[Dict[str, Any]] = []
+        self.duplicates: List[Tuple[Dict[str, Any], str]] = [] # (chunk, id of the chunk it duplicates)
+        self.pending: Dict[str, Tuple[np.ndarray, List[int], str, str]] = {} # chunk id -> (signature, band keys, source, partition)
+
+
+class DedupIndex:
+    """
+    Near-duplicate chunk detection with MinHash signatures and an LSH index, persisted in SQLite.
+
+    Each chunk's word shingles are reduced to a `num_perm`-value MinHash signature; the
+    fraction of equal values estimates the Jaccard similarity of two chunks' shingle sets.
+    Signatures are split into `bands` bands and hashed into buckets, so only chunks sharing
+    a bucket are compared. A chunk whose estimated similarity to a stored chunk reaches
+    `threshold` is not embedded or stored; the stored chunk records its source instead.
+
+    Chunks only match within the same partition (the shard they would be written to), so
+    one tenant's content is never served from another tenant's shard.
+    """
+
+    def __init__(self,
+                 path: str = settings.DEDUP_INDEX_PATH,
+                 threshold: float = settings.DEDUP_THRESHOLD,
+                 num_perm: int = settings.DEDUP_NUM_PERM,
+                 bands: int = settings.DEDUP_LSH_BANDS,
+                 shingle_size: int = settings.DEDUP_SHINGLE_SIZE,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) must be a multiple of DEDUP_LSH_BANDS ({bands})")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " source TEXT NOT NULL,"
+            " partition TEXT NOT NULL,"
+            " signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lsh (band_key INTEGER NOT NULL, chunk_id TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates ("
+            " chunk_id TEXT NOT NULL,"
+            " duplicate_id TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " PRIMARY KEY (chunk_id, source, duplicate_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_band_key ON lsh(band_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_chunk_id ON lsh(chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_source ON signatures(source)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_source ON duplicates(source)")
+        self._conn.commit()
+        stored = self._conn.execute("SELECT signature FROM signatures LIMIT 1").fetchone()
+        if stored is not None and len(stored[0]) != num_perm * 4:
+            raise ValueError(f"{path} was built with a different DEDUP_NUM_PERM; delete it or reset the index")
+
+    # --- Signatures -----------------------------------------------------------------------
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (num_perm uint32 values) of a text, or None if it has no words."""
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return values.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray, partition: str = "") -> List[int]:
+        """One signed 64-bit bucket key per band; the partition is hashed in so partitions never collide."""
+        prefix = partition.encode("utf-8") + b"\0"
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(prefix + band.to_bytes(2, "little") + rows, digest_size=8).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    def _similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.count_nonzero(a == b)) / self.num_perm
+
+    # --- Planning and committing a batch ---------------------------------------------------
+
+    def _stored_candidates(self, keys: Iterable[int]) -> Dict[int, List[str]]:
+        keys = list(set(keys))
+        buckets: Dict[int, List[str]] = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows = self._conn.execute(f"SELECT band_key, chunk_id FROM lsh WHERE band_key IN ({','.join('?' * len(part))})",
+                                      part).fetchall()
+            for key, chunk_id in rows:
+                buckets.setdefault(key, []).append(chunk_id)
+        return buckets
+
+    def _stored_signatures(self, chunk_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        chunk_ids = list(set(chunk_ids))
+        found = {}
+        for start in range(0, len(chunk_ids), 500):
+            part = chunk_ids[start:start + 500]
+            rows = self._conn.execute(f"SELECT chunk_id, signature FROM signatures WHERE chunk_id IN ({','.join('?' * len(part))})",
+                                      part).fetchall()
+            found.update((chunk_id, np.frombuffer(blob, dtype=np.uint32)) for chunk_id, blob in rows)
+        return found
+
+    def plan(self, chunks: List[Dict[str, Any]], partition_for: Callable[[Dict[str, Any]], str] = None) -> DedupPlan:
+        """
+        Splits a batch into chunks to embed and near-duplicates of stored (or earlier) chunks.
+        Nothing is persisted until commit(), so chunks that fail to embed are never matched against.
+        """
+        plan = DedupPlan()
+        prepared = []
+        for chunk in chunks:
+            signature = self.signature(chunk.get("content") or "")
+            partition = partition_for(chunk["metadata"]) if partition_for else ""
+            keys = self.band_keys(signature, partition) if signature is not None else []
+            prepared.append((chunk, signature, keys, partition))
+
+        with self._lock:
+            stored_buckets = self._stored_candidates(key for _, _, keys, _ in prepared for key in keys)
+            signatures = self._stored_signatures(chunk_id for ids in stored_buckets.values() for chunk_id in ids)
+        pending_buckets: Dict[int, List[str]] = {}
+        for chunk, signature, keys, partition in prepared:
+            if signature is None:
+                plan.unique.append(chunk)
+                continue
+            candidates = {chunk_id for key in keys
+                          for chunk_id in stored_buckets.get(key, []) + pending_buckets.get(key, [])}
+            chunk_id = chunk["metadata"]["chunk_id"]
+            candidates.discard(chunk_id)
+            best_id, best = None, 0.0
+            for candidate in candidates:
+                if candidate not in signatures:
+                    continue
+                similarity = self._similarity(signature, signatures[candidate])
+                if similarity > best:
+                    best_id, best = candidate, similarity
+            if best_id is not None and best >= self.threshold:
+                plan.duplicates.append((chunk, best_id))
+                continue
+            plan.unique.append(chunk)
+            plan.pending[chunk_id] = (signature, keys, chunk["metadata"]["source"], partition)
+            signatures[chunk_id] = signature
+            for key in keys:
+                pending_buckets.setdefault(key, []).append(chunk_id)
+        return plan
+
+    def commit(self, plan: DedupPlan, stored_ids: Set[str]) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Persists the signatures of the planned chunks that were stored, and the duplicates
+        folded into stored chunks. Returns the accepted (duplicate chunk, stored chunk id)
+        pairs; duplicates of a chunk that failed to store are dropped.
+        """
+        accepted = []
+        with self._lock:
+            for chunk_id, (signature, keys, source, partition) in plan.pending.items():
+                if chunk_id not in stored_ids:
+                    continue
+                self._conn.execute("DELETE FROM lsh WHERE chunk_id = ?", (chunk_id,))
+                self._conn.execute("INSERT OR REPLACE INTO signatures (chunk_id, source, partition, signature) VALUES (?, ?, ?, ?)",
+                                   (chunk_id, source, partition, signature.tobytes()))
+                self._conn.executemany("INSERT INTO lsh (band_key, chunk_id) VALUES (?, ?)", [(key, chunk_id) for key in keys])
+            rows = []
+            for chunk, canonical_id in plan.duplicates:
+                if canonical_id in plan.pending and canonical_id not in stored_ids:
+                    continue
+                accepted.append((chunk, canonical_id))
+                rows.append((canonical_id, chunk["metadata"]["chunk_id"], chunk["metadata"]["source"]))
+            self._conn.executemany("INSERT OR IGNORE INTO duplicates (chunk_id, duplicate_id, source) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+        return accepted
+
+    # --- Bookkeeping ---------------------------------------------------------------------
+
+    def duplicate_sources(self, chunk_ids: List[str]) -> Dict[str, Tuple[List[str], int]]:
+        """For each stored chunk: (other files its content was found in, number of duplicate chunks folded into it)."""
+        result: Dict[str, Tuple[List[str], int]] = {chunk_id: ([], 0) for chunk_id in chunk_ids}
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT d.chunk_id, d.source, s.source, COUNT(*) FROM duplicates d"
+                    " LEFT JOIN signatures s ON s.chunk_id = d.chunk_id"
+                    f" WHERE d.chunk_id IN ({','.join('?' * len(part))}) GROUP BY d.chunk_id, d.source", part
+                ).fetchall()
+                for chunk_id, source, own_source, count in rows:
+                    sources, total = result[chunk_id]
+                    if source != own_source:
+                        sources.append(source)
+                    result[chunk_id] = (sources, total + count)
+        return {chunk_id: (sorted(sources), total) for chunk_id, (sources, total) in result.items()}
+
+    def dependent_sources(self, sources: List[str]) -> Set[str]:
+        """Other files with duplicates folded into chunks of `sources`; they lose that content when `sources` are purged."""
+        found = set()
+        with self._lock:
+            for start in range(0, len(sources), 500):
+                part = sources[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    "SELECT DISTINCT d.source FROM duplicates d JOIN signatures s ON s.chunk_id = d.chunk_id"
+                    f" WHERE s.source IN ({marks})", part).fetchall()
+                found.update(row[0] for row in rows)
+        return found - set(sources)
+
+    def remove_sources(self, sources: List[str]) -> List[str]:
+        """
+        Forgets the chunks of `sources` and the duplicates they contributed. Returns the ids of
+        remaining stored chunks whose duplicate list changed, so their metadata can be refreshed.
+        """
+        changed = set()
+        with self._lock:
+            for start in range(0, len(sources), 500):
+                part = sources[start:start + 500]
+                marks = ",".join("?" * len(part))
+                owned = [row[0] for row in self._conn.execute(f"SELECT chunk_id FROM signatures WHERE source IN ({marks})", part)]
+                changed.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT chunk_id FROM duplicates WHERE source IN ({marks})", part))
+                self._conn.execute(f"DELETE FROM duplicates WHERE source IN ({marks})", part)
+                for owned_start in range(0, len(owned), 500):
+                    owned_part = owned[owned_start:owned_start + 500]
+                    owned_marks = ",".join("?" * len(owned_part))
+                    for table in ("lsh", "duplicates", "signatures"):
+                        self._conn.execute(f"DELETE FROM {table} WHERE chunk_id IN ({owned_marks})", owned_part)
+                changed.difference_update(owned)
+            self._conn.commit()
+        return sorted(changed)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            unique = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            duplicates = self._conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+        return {"unique_chunks": unique, "duplicate_chunks": duplicates}
+
+    def clear(self):
+        with self._lock:
+            for table in ("lsh", "duplicates", "signatures"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+
+
+def refresh_duplicate_metadata(vector_store_manager, dedup_index: DedupIndex, chunk_ids: List[str]):
+    """Writes each stored chunk's current duplicate sources into its metadata (as a JSON string, for Chroma)."""
+    if not chunk_ids:
+        return
+    duplicates = dedup_index.duplicate_sources(list(chunk_ids))
+    docs = vector_store_manager.get_documents(list(chunk_ids))
+    ids, metadatas = [], []
+    for doc in docs:
+        chunk_id = doc["metadata"]["chunk_id"]
+        sources, count = duplicates.get(chunk_id, ([], 0))
+        ids.append(chunk_id)
+        metadatas.append({**doc["metadata"], "duplicate_sources": json.dumps(sources), "duplicate_count": count})
+    if ids:
+        vector_store_manager.update_metadata(ids, metadatas)
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from config.settings import settings
+from src.clients import gemini
+from src.telemetry.metrics import API_CALLS, CACHE_LOOKUPS, ITEMS, record_usage
+
+logger = logging.getLogger(__name__)
+
+CAPTION_PROMPT = "Describe this image in detail, focusing on any text, charts, or relevant information present."
+
+
+def difference_hash(image: "Image.Image", hash_size: int = 8) -> int:
+    """64-bit perceptual difference hash: compares neighbouring pixels of a tiny grayscale thumbnail."""
+    from PIL import Image
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class CaptionStore:
+    """
+    Persistent SQLite store of captions keyed by the sha256 of the image bytes, with perceptual hashes.
+    Only captions written by `model` are served, so changing the vision model re-captions images.
+    """
+
+    def __init__(self, path: str = settings.CAPTION_CACHE_PATH, model: str = settings.GEMINI_VISION_MODEL):
+        self.model = model
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS captions ("
+            " sha256 TEXT PRIMARY KEY,"
+            " dhash TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " caption TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        # Perceptual hashes are scanned linearly, so keep them in memory
+        self._dhashes: Dict[int, str] = {
+            int(dhash, 16): caption
+            for dhash, caption in self._conn.execute("SELECT dhash, caption FROM captions WHERE model = ?", (model,))
+        }
+
+    def get_exact(self, sha256: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT caption FROM captions WHERE sha256 = ? AND model = ?",
+                                     (sha256, self.model)).fetchone()
+        return row[0] if row else None
+
+    def get_near(self, dhash: int, max_distance: int) -> Optional[str]:
+        if max_distance <= 0:
+            return None
+        with self._lock:
+            best = min(self._dhashes.items(), key=lambda item: hamming_distance(dhash, item[0]), default=None)
+        if best is not None and hamming_distance(dhash, best[0]) <= max_distance:
+            return best[1]
+        return None
+
+    def put(self, sha256: str, dhash: int, caption: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions (sha256, dhash, model, caption) VALUES (?, ?, ?, ?)",
+                (sha256, f"{dhash:016x}", self.model, caption)
+            )
+            self._conn.commit()
+            self._dhashes[dhash] = caption
+
+
+class ImageCaptioner:
+    """
+    Captions images with the Gemini vision model.
+
+    Images are downscaled and re-encoded as JPEG before upload, byte-identical and
+    perceptually near-duplicate images are captioned once, captions are persisted by
+    image hash so re-ingesting never re-captions, and vision requests run concurrently.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = settings.CAPTION_MAX_CONCURRENCY,
+                 max_resolution: int = settings.CAPTION_MAX_RESOLUTION,
+                 jpeg_quality: int = settings.CAPTION_JPEG_QUALITY,
+                 near_duplicate_distance: int = settings.CAPTION_NEAR_DUPLICATE_DISTANCE,
+                 store: Optional[CaptionStore] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_resolution = max_resolution
+        self.jpeg_quality = jpeg_quality
+        self.near_duplicate_distance = near_duplicate_distance
+        self.model_name = settings.GEMINI_VISION_MODEL
+        self.store = store or CaptionStore(model=self.model_name)
+        # Safety settings (optional but recommended)
+        self.safety_settings = gemini.permissive_safety_settings()
+
+    def _prepare(self, image_path: str) -> Tuple[str, int, bytes]:
+        """Returns (sha256 of the file, perceptual hash, downscaled JPEG bytes)."""
+        from PIL import Image
+        with open(image_path, "rb") as f:
+            raw = f.read()
+        image = Image.open(io.BytesIO(raw)).convert("RGB") # Ensure RGB for consistent processing
+        dhash = difference_hash(image)
+        image.thumbnail((self.max_resolution, self.max_resolution), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.jpeg_quality)
+        return hashlib.sha256(raw).hexdigest(), dhash, buffer.getvalue()
+
+    def _caption_bytes(self, jpeg_bytes: bytes) -> str:
+        response = gemini.generate_content(
+            self.model_name,
+            [CAPTION_PROMPT, {"mime_type": "image/jpeg", "data": jpeg_bytes}],
+            kind="vision",
+            safety_settings=self.safety_settings
+        )
+        record_usage(response, self.model_name)
+        return response.text
+
+    def caption_images(self, image_paths: List[str]) -> Dict[str, str]:
+        """
+        Captions a batch of images. Returns a dict of image path to caption;
+        images that could not be captioned map to an empty string.
+        """
+        captions: Dict[str, str] = {}
+        prepared: Dict[str, Tuple[str, int, bytes]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for image_path, result in zip(image_paths, executor.map(self._safe_prepare, image_paths)):
+                if result is None:
+                    captions[image_path] = ""
+                else:
+                    prepared[image_path] = result
+
+            # Resolve cached and duplicate images; only one representative per group hits the API
+            representatives: Dict[str, List[str]] = {}
+            representative_hashes: List[Tuple[int, str]] = []
+            sha_to_representative: Dict[str, str] = {}
+            for image_path, (sha256, dhash, _) in prepared.items():
+                cached = self.store.get_exact(sha256) or self.store.get_near(dhash, self.near_duplicate_distance)
+                CACHE_LOOKUPS.inc(cache="caption", result="hit" if cached else "miss")
+                if cached:
+                    captions[image_path] = cached
+                    continue
+                representative = sha_to_representative.get(sha256)
+                if representative is None and self.near_duplicate_distance > 0:
+                    representative = next((path for rep_hash, path in representative_hashes
+                                           if hamming_distance(dhash, rep_hash) <= self.near_duplicate_distance), None)
+                if representative is None:
+                    representative = image_path
+                    representatives[image_path] = []
+                    representative_hashes.append((dhash, image_path))
+                    sha_to_representative[sha256] = image_path
+                else:
+                    representatives[representative].append(image_path)
+
+            if representatives:
+                logger.info("Captioning %d images (%d served from cache or deduplicated).",
+                            len(representatives), len(prepared) - len(representatives))
+            paths = list(representatives)
+            results = executor.map(lambda path: self._safe_caption(path, prepared[path][2]), paths)
+            for image_path, caption in zip(paths, results):
+                for path in [image_path] + representatives[image_path]:
+                    captions[path] = caption
+                    if caption:
+                        sha256, dhash, _ = prepared[path]
+                        self.store.put(sha256, dhash, caption)
+        return captions
+
+    def caption_image(self, image_path: str) -> str:
+        return self.caption_images([image_path]).get(image_path, "")
+
+    def _safe_prepare(self, image_path: str) -> Optional[Tuple[str, int, bytes]]:
+        try:
+            return self._prepare(image_path)
+        except Exception as e:
+            logger.error("Error reading image %s: %s", image_path, e)
+            return None
+
+    def _safe_caption(self, image_path: str, jpeg_bytes: bytes) -> str:
+        try:
+            caption = self._caption_bytes(jpeg_bytes)
+            API_CALLS.inc(kind="vision", outcome="ok")
+            ITEMS.inc(stage="images_captioned")
+            return caption
+        except Exception as e:
+            API_CALLS.inc(kind="vision", outcome="error")
+            logger.error("Error analyzing image %s with Gemini: %s", image_path, e)
+            return ""
+
+
+_default_captioner: Optional[ImageCaptioner] = None
+_default_captioner_lock = threading.Lock()
+
+def get_image_captioner() -> ImageCaptioner:
+    """Returns the process-wide image captioner, creating it on first use."""
+    global _default_captioner
+    with _default_captioner_lock:
+        if _default_captioner is None:
+            _default_captioner = ImageCaptioner()
+    return _default_captioner
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+from typing import List, Dict, Any
+
+from config.settings import settings
+from src.data_ingestion.text_chunker import source_key
+
+logger = logging.getLogger(__name__)
+
+
+def compute_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Computes the sha256 of a file's content, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Persistent record of the files that have been indexed.
+
+    Each entry is keyed by the file's path under DATA_DIR (see text_chunker.source_key), so
+    the same tree indexed through an absolute or a relative DATA_DIR maps to the same
+    entries. It stores the path the file was indexed under, its size, mtime, content hash
+    and the chunk ids it produced, so re-indexing can skip unchanged files and purge
+    the chunks of changed or deleted ones.
+    """
+
+    def __init__(self, manifest_path: str = settings.INGEST_MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.load_entries(json.load(f).get("files", {}))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read ingest manifest %s, starting fresh: %s", self.manifest_path, e)
+            self.entries = {}
+
+    def load_entries(self, files: Dict[str, Dict[str, Any]]):
+        """Replaces the entries, re-keying ones written by older versions under raw file paths."""
+        self.entries = {}
+        for key, entry in files.items():
+            if "path" not in entry:
+                entry["path"] = key
+                key = source_key(key)
+            self.entries[key] = entry
+
+    def save(self):
+        """Writes the manifest atomically so a crash never leaves it half-written."""
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """
+        Returns True if the file matches its manifest entry.
+        Size and mtime are checked first; the content hash is only computed when they differ,
+        so touched-but-identical files are still recognised as unchanged.
+        """
+        entry = self.entries.get(source_key(file_path))
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return True
+        if stat.st_size != entry["size"]:
+            return False
+        if compute_file_hash(file_path) == entry["sha256"]:
+            entry["mtime"] = stat.st_mtime
+            return True
+        return False
+
+    def diff(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Compares the files currently on disk against the manifest.
+
+        Returns a dict with 'new', 'changed', 'unchanged' and 'deleted' file path lists.
+        Deleted files are reported under the path they were indexed with. Only files that
+        no longer exist count as deleted, so indexing one subdirectory leaves the files
+        indexed from elsewhere alone.
+        """
+        result = {"new": [], "changed": [], "unchanged": [], "deleted": []}
+        current = {source_key(file_path) for file_path in file_paths}
+        for file_path in file_paths:
+            if source_key(file_path) not in self.entries:
+                result["new"].append(file_path)
+            elif self.is_unchanged(file_path):
+                result["unchanged"].append(file_path)
+            else:
+                result["changed"].append(file_path)
+        data_dir = os.path.abspath(settings.DATA_DIR)
+        result["deleted"] = [entry["path"] for key, entry in self.entries.items()
+                             if key not in current and not os.path.exists(os.path.join(data_dir, key))]
+        return result
+
+    def record(self, file_path: str, chunk_ids: List[str]):
+        """Records a file as indexed together with the chunk ids it produced."""
+        stat = os.stat(file_path)
+        self.entries[source_key(file_path)] = {
+            "path": file_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": compute_file_hash(file_path),
+            "chunk_ids": chunk_ids,
+        }
+
+    def chunk_ids_for(self, file_path: str) -> List[str]:
+        entry = self.entries.get(source_key(file_path))
+        return list(entry.get("chunk_ids", [])) if entry else []
+
+    def indexed_path(self, file_path: str) -> str:
+        """Returns the path a file was indexed under, which is the 'source' its chunks carry."""
+        entry = self.entries.get(source_key(file_path))
+        return entry["path"] if entry else file_path
+
+    def remove(self, file_path: str):
+        self.entries.pop(source_key(file_path), None)
+
+    def clear(self):
+        """Forgets every indexed file and removes the manifest from disk."""
+        self.entries = {}
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
@@ -1,51 +1,31 @@
+import logging
 from typing import List, Dict, Any
-from PIL import Image
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
-from config.settings import settings
-from src.data_ingestion.data_loader import load_image
+from src.data_ingestion.image_captioner import get_image_captioner
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
 
 def analyze_image_with_gemini(image_path: str) -> str:
     """
     Uses Gemini Vision model to generate a descriptive caption for an image.
+    Captions are cached by image hash, so an image that was already described is not sent again.
     """
-    try:
-        model = genai.GenerativeModel(settings.GEMINI_VISION_MODEL)
-        image = Image.open(image_path).convert("RGB") # Ensure RGB for consistent processing
-
-        # Safety settings (optional but recommended)
-        safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        }
-
-        prompt = "Describe this image in detail, focusing on any text, charts, or relevant information present."
-        response = model.generate_content(
-            [prompt, image],
-            safety_settings=safety_settings
-        )
-        return response.text
-    except Exception as e:
-        print(f"Error analyzing image {image_path} with Gemini: {e}")
-        return ""
+    return get_image_captioner().caption_image(image_path)
 
 def process_multimodal_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Processes a list of documents, extracting text, and generating descriptions for images
-    using Gemini Vision.
+    using Gemini Vision. All images in the list are captioned concurrently.
     """
+    image_paths = [doc["content"] for doc in documents if doc["type"] == "image"]
+    captions = get_image_captioner().caption_images(image_paths) if image_paths else {}
+
     processed_documents = []
     for doc in documents:
         if doc["type"] == "text":
             processed_documents.append(doc) # Text documents are already loaded
         elif doc["type"] == "image":
             image_path = doc["content"]
-            image_description = analyze_image_with_gemini(image_path)
+            image_description = captions.get(image_path, "")
             if image_description:
                 # Add the image description as a new "text" document, linked to original image
                 processed_documents.append({
@@ -54,6 +34,6 @@ def process_multimodal_documents(documents: List[Dict[str, Any]]) -> List[Dict[s
                     "metadata": {**doc["metadata"], "original_type": "image"}
                 })
             else:
-                print(f"Could not generate description for image: {image_path}")
+                logger.warning("Could not generate description for image: %s", image_path)
         
     return processed_documents
\ No newline at end of file
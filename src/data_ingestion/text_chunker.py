@@ -1,21 +1,227 @@
-from typing import List, Dict, Any
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from config.settings import settings
 
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+CHARS_PER_TOKEN = 4 # Same estimate as src/generation/context_packer.estimate_tokens
+
+Span = Tuple[int, int]
+
+
+def source_key(source: str, data_dir: str = None) -> str:
+    """
+    Identifies a file in chunk ids: its path relative to DATA_DIR ('team_a/report.txt'),
+    or its absolute path when it lives elsewhere. Files with the same name in different
+    folders therefore never share chunk ids.
+    """
+    data_dir = os.path.abspath(data_dir or settings.DATA_DIR)
+    path = os.path.abspath(source)
+    try:
+        relative = os.path.relpath(path, data_dir)
+    except ValueError: # Different drive on Windows
+        relative = path
+    if relative.startswith(".."):
+        relative = path
+    return relative.replace("\\", "/")
+
+
+class ChunkingEngine:
+    """
+    Recursive character splitter that works on (start, end) offsets into the original text.
+
+    It splits on the first separator present in the text, recursing into pieces that are still
+    too long, and merges neighbouring pieces into chunks of up to `chunk_size` with `chunk_overlap`
+    of carried-over context, the same boundaries LangChain's RecursiveCharacterTextSplitter
+    produces (keep_separator=True, strip_whitespace=True). Because it never copies substrings
+    while splitting, every chunk knows exactly where it came from.
+
+    With unit="tokens", sizes are measured in estimated tokens instead of characters.
+    Build one engine and reuse it; it holds no per-document state.
+    """
+
+    def __init__(self,
+                 chunk_size: int = None,
+                 chunk_overlap: int = None,
+                 unit: str = settings.CHUNK_LENGTH_UNIT,
+                 separators: List[str] = None,
+                 parallel: bool = settings.CHUNK_PARALLEL,
+                 max_workers: int = settings.CHUNK_MAX_WORKERS,
+                 parallel_min_chars: int = settings.CHUNK_PARALLEL_MIN_CHARS):
+        if unit not in ("characters", "tokens"):
+            raise ValueError(f"Unknown chunk length unit: {unit!r} (expected 'characters' or 'tokens')")
+        if chunk_size is None:
+            chunk_size = settings.CHUNK_SIZE_TOKENS if unit == "tokens" else settings.CHUNK_SIZE
+        if chunk_overlap is None:
+            chunk_overlap = settings.CHUNK_OVERLAP_TOKENS if unit == "tokens" else settings.CHUNK_OVERLAP
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.separators = separators or DEFAULT_SEPARATORS
+        self._patterns = {separator: re.compile(re.escape(separator)) for separator in self.separators if separator}
+        self.parallel = parallel
+        self.max_workers = max_workers or None
+        self.parallel_min_chars = parallel_min_chars
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _boundaries(self, text: str, start: int, end: int, separator: str) -> List[int]:
+        """
+        Piece boundaries for text[start:end] split before each separator occurrence (the separator
+        stays with the piece after it). Piece k is text[bounds[k]:bounds[k + 1]].
+        """
+        if not separator:
+            return list(range(start, end + 1))
+        bounds = [start]
+        for match in self._patterns[separator].finditer(text, start, end):
+            if match.start() > bounds[-1]:
+                bounds.append(match.start())
+        if end > bounds[-1]:
+            bounds.append(end)
+        return bounds
+
+    def _lengths(self, bounds: List[int]) -> List[int]:
+        if self.unit == "tokens":
+            return [-(-(b - a) // CHARS_PER_TOKEN) for a, b in zip(bounds, bounds[1:])]
+        return [b - a for a, b in zip(bounds, bounds[1:])]
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], chunks: List[Span]):
+        separator, remaining = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if self._patterns[candidate].search(text, start, end):
+                separator, remaining = candidate, separators[i + 1:]
+                break
+
+        bounds = self._boundaries(text, start, end, separator)
+        lengths = self._lengths(bounds)
+        chunk_size = self.chunk_size
+        run_start = None # First piece of the current run of short pieces
+        for k, length in enumerate(lengths):
+            if length < chunk_size:
+                if run_start is None:
+                    run_start = k
+                continue
+            if run_start is not None:
+                self._merge(text, bounds, lengths, run_start, k, chunks)
+                run_start = None
+            if remaining:
+                self._split(text, bounds[k], bounds[k + 1], remaining, chunks)
+            else:
+                chunks.append((bounds[k], bounds[k + 1]))
+        if run_start is not None:
+            self._merge(text, bounds, lengths, run_start, len(lengths), chunks)
+
+    def _merge(self, text: str, bounds: List[int], lengths: List[int], first: int, last: int, chunks: List[Span]):
+        """
+        Greedily packs pieces first..last-1 into chunks, carrying trailing pieces over as overlap.
+        Pieces are contiguous, so the current window is just the index range [window_start, k).
+        """
+        chunk_size, chunk_overlap = self.chunk_size, self.chunk_overlap
+        window_start, total = first, 0
+        for k in range(first, last):
+            length = lengths[k]
+            if total + length > chunk_size and k > window_start:
+                self._append_stripped(text, bounds[window_start], bounds[k], chunks)
+                while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                    total -= lengths[window_start]
+                    window_start += 1
+            total += length
+        if last > window_start:
+            self._append_stripped(text, bounds[window_start], bounds[last], chunks)
+
+    @staticmethod
+    def _append_stripped(text: str, start: int, end: int, chunks: List[Span]):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            chunks.append((start, end))
+
+    def split_spans(self, text: str) -> List[Span]:
+        """Returns the (start, end) offsets of each chunk of text."""
+        chunks: List[Span] = []
+        if text:
+            self._split(text, 0, len(text), self.separators, chunks)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def chunk(self, text_content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Splits one record into chunk dicts. Each chunk's metadata gets 'chunk_id', 'chunk_index'
+        and the character offsets 'start_offset'/'end_offset' of the chunk within the record's text
+        (the page text for per-page PDF records, whose 'page' is carried over).
+        """
+        return self._build_chunks(text_content, metadata, self.split_spans(text_content))
+
+    @staticmethod
+    def _build_chunks(text_content: str, metadata: Dict[str, Any], spans: List[Span]) -> List[Dict[str, Any]]:
+        # Per-page records share a file, so the page number keeps their chunk ids unique
+        id_prefix = source_key(metadata.get("source", metadata["file_name"]))
+        if "page" in metadata:
+            id_prefix = f"{id_prefix}_p{metadata['page']}"
+        chunked_data = []
+        for i, (start, end) in enumerate(spans):
+            chunk_metadata = {**metadata, "chunk_id": f"{id_prefix}_chunk_{i}", "chunk_index": i,
+                              "start_offset": start, "end_offset": end}
+            chunked_data.append({"content": text_content[start:end], "type": "text_chunk", "metadata": chunk_metadata})
+        return chunked_data
+
+    def chunk_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Chunks many records, in input order. Large batches are spread over a process pool that
+        is created on first use and kept for the engine's lifetime; small ones run inline, where
+        pickling would cost more than it saves. Workers only send back offsets.
+        """
+        total_chars = sum(len(doc["content"]) for doc in documents)
+        if not self.parallel or len(documents) < 2 or total_chars < self.parallel_min_chars:
+            return [chunk for doc in documents for chunk in self.chunk(doc["content"], doc["metadata"])]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        config = (self.chunk_size, self.chunk_overlap, self.unit, tuple(self.separators))
+        spans = self._executor.map(_split_with_engine, [config] * len(documents),
+                                   [doc["content"] for doc in documents],
+                                   chunksize=max(1, len(documents) // (4 * (self.max_workers or os.cpu_count() or 1))))
+        return [chunk for doc, doc_spans in zip(documents, spans)
+                for chunk in self._build_chunks(doc["content"], doc["metadata"], doc_spans)]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_worker_engines: Dict[Tuple, ChunkingEngine] = {}
+
+def _split_with_engine(config: Tuple, text_content: str) -> List[Span]:
+    """Process-pool entry point; each worker builds its engine once per configuration."""
+    engine = _worker_engines.get(config)
+    if engine is None:
+        chunk_size, chunk_overlap, unit, separators = config
+        engine = _worker_engines[config] = ChunkingEngine(chunk_size, chunk_overlap, unit, list(separators), parallel=False)
+    return engine.split_spans(text_content)
+
+
+_default_engine: Optional[ChunkingEngine] = None
+
+def get_chunking_engine() -> ChunkingEngine:
+    """Returns the process-wide chunking engine, creating it on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ChunkingEngine()
+    return _default_engine
+
+
 def chunk_text(text_content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Splits long text content into smaller, overlapping chunks.
     Each chunk gets associated metadata.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    chunks = text_splitter.create_documents([text_content])
-    chunked_data = []
-    for i, chunk in enumerate(chunks):
-        chunk_metadata = {**metadata, "chunk_id": f"{metadata['file_name']}_chunk_{i}"}
-        chunked_data.append({"content": chunk.page_content, "type": "text_chunk", "metadata": chunk_metadata})
-    return chunked_data
\ No newline at end of file
+    return get_chunking_engine().chunk(text_content, metadata)
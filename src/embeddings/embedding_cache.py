@@ -0,0 +1,157 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import List, Dict, Optional
+from config.settings import settings
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent SQLite cache of embeddings keyed by (embedding model, sha256(text)).
+
+    Vectors are stored as packed float32 blobs. Each hit refreshes the entry's access
+    tick, and once the cache grows past `max_entries` the least recently used entries
+    are evicted. Hit/miss counters cover the lifetime of this instance.
+    """
+
+    def __init__(self,
+                 path: str = settings.EMBEDDING_CACHE_PATH,
+                 model: str = settings.GEMINI_EMBEDDING_MODEL,
+                 max_entries: int = settings.EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access INTEGER NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(MAX(last_access), 0), COUNT(*) FROM embeddings").fetchone()
+        self._tick = row[0]
+        # Kept up to date on insert and evict, so writes never have to count the table
+        self._count = row[1]
+
+    def _next_tick(self) -> int:
+        self._tick += 1
+        return self._tick
+
+    def get_many(self, texts: List[str]) -> Dict[int, List[float]]:
+        """Returns cached embeddings for the given texts, keyed by their position in `texts`."""
+        hashes = [hash_text(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique_hashes = list(set(hashes))
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                part = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model, *part]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+            if found:
+                tick = self._next_tick()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(tick, self.model, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+            results = {i: found[h] for i, h in enumerate(hashes) if h in found}
+            self.hits += len(results)
+            self.misses += len(texts) - len(results)
+        return results
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self.get_many([text]).get(0)
+
+    def put_many(self, texts: List[str], embeddings: List[List[float]]):
+        """Stores embeddings for the given texts, evicting least recently used entries if needed."""
+        if not texts:
+            return
+        vectors = {hash_text(text): embedding for text, embedding in zip(texts, embeddings)}
+        with self._lock:
+            existing = set()
+            hashes = list(vectors)
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [self.model, *part]
+                ).fetchall()
+                existing.update(text_hash for text_hash, in rows)
+            tick = self._next_tick()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [(self.model, text_hash, array("f", embedding).tobytes(), tick)
+                 for text_hash, embedding in vectors.items()]
+            )
+            self._count += len(vectors) - len(existing)
+            self._evict()
+            self._conn.commit()
+
+    def put(self, text: str, embedding: List[float]):
+        self.put_many([text], [embedding])
+
+    def _evict(self):
+        excess = self._count - self.max_entries
+        if excess > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+            self._count -= cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Returns the process-wide embedding cache, or None when caching is disabled."""
+    global _default_cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
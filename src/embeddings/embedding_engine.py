@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from config.settings import settings
+from src.clients import gemini
+from src.embeddings.embedding_cache import get_embedding_cache
+from src.telemetry import tracing
+from src.telemetry.metrics import API_CALLS, API_RETRIES, CACHE_LOOKUPS, ITEMS
+
+
+class GeminiEmbeddingClient:
+    """Embeds a batch of texts with a single multi-content Gemini request."""
+
+    def __init__(self, model: str = settings.GEMINI_EMBEDDING_MODEL):
+        self.model = model
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = gemini.embed_content(model=self.model, content=texts)
+        return response['embedding']
+
+
+class HTTPEmbeddingClient:
+    """
+    Embeds a batch of texts by POSTing to an HTTP endpoint.
+    The endpoint receives {"model": ..., "texts": [...]} and must answer {"embeddings": [[...], ...]}.
+    Mainly used to benchmark the engine against a local fake embedding server.
+    """
+
+    def __init__(self, url: str, model: str = settings.GEMINI_EMBEDDING_MODEL, timeout: float = 60.0):
+        import requests
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.session.post(self.url, json={"model": self.model, "texts": texts}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+
+class EmbeddingResult:
+    """Embeddings aligned with the input texts; failed positions are None and listed in `failures`."""
+
+    def __init__(self, embeddings: List[Optional[List[float]]], failures: Dict[int, str]):
+        self.embeddings = embeddings
+        self.failures = failures
+
+    @property
+    def succeeded(self) -> int:
+        return len(self.embeddings) - len(self.failures)
+
+
+class EmbeddingEngine:
+    """
+    Packs texts into multi-content batch requests and keeps several batches in flight
+    on a bounded thread pool. Output order always matches input order.
+    Texts found in the embedding cache are never sent to the client.
+    """
+
+    def __init__(self,
+                 client=None,
+                 batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+                 max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+                 cache=None):
+        self.client = client or GeminiEmbeddingClient()
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+
+    def _embed_one_batch(self, texts: List[str]) -> List[Any]:
+        """Returns one embedding or an Exception per text."""
+        try:
+            embeddings = self.client.embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            API_CALLS.inc(kind="embed", outcome="ok")
+            return embeddings
+        except Exception as batch_error:
+            API_CALLS.inc(kind="embed", outcome="error")
+            if len(texts) == 1 or not gemini.is_content_error(batch_error):
+                # Throttling and outages were already retried by the client; splitting won't help
+                return [batch_error] * len(texts)
+        # Isolate the failure so one bad text does not drop the whole batch
+        results = []
+        for text in texts:
+            API_RETRIES.inc(kind="embed", reason="isolate")
+            try:
+                results.append(self.client.embed_batch([text])[0])
+                API_CALLS.inc(kind="embed", outcome="ok")
+            except Exception as e:
+                API_CALLS.inc(kind="embed", outcome="error")
+                results.append(e)
+        return results
+
+    def embed_texts(self, texts: List[str]) -> EmbeddingResult:
+        """Embeds a list of texts, reporting per-text failures instead of dropping them."""
+        with tracing.span("embed", texts=len(texts)) as embed_span:
+            result = self._embed_texts(texts, embed_span)
+        ITEMS.inc(result.succeeded, stage="embedded_texts")
+        return result
+
+    def _embed_texts(self, texts: List[str], embed_span) -> EmbeddingResult:
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        failures: Dict[int, str] = {}
+
+        positions = []
+        for i, text in enumerate(texts):
+            if text and text.strip():
+                positions.append(i)
+            else:
+                failures[i] = "empty text"
+
+        if self.cache is not None and positions:
+            cached = self.cache.get_many([texts[i] for i in positions])
+            for j, embedding in cached.items():
+                embeddings[positions[j]] = embedding
+            CACHE_LOOKUPS.inc(len(cached), cache="embedding", result="hit")
+            CACHE_LOOKUPS.inc(len(positions) - len(cached), cache="embedding", result="miss")
+            embed_span.set(cache_hits=len(cached))
+            positions = [i for j, i in enumerate(positions) if j not in cached]
+
+        batches = [positions[i:i + self.batch_size] for i in range(0, len(positions), self.batch_size)]
+        if not batches:
+            return EmbeddingResult(embeddings, failures)
+
+        workers = min(self.max_concurrency, len(batches))
+        embed_span.set(requests=len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batch_results = executor.map(lambda batch: self._embed_one_batch([texts[i] for i in batch]), batches)
+            for batch, results in zip(batches, batch_results):
+                for i, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        failures[i] = str(result)
+                    elif not result:
+                        failures[i] = "empty embedding returned"
+                    else:
+                        embeddings[i] = list(result)
+
+        if self.cache is not None:
+            fresh = [i for i in positions if embeddings[i] is not None]
+            self.cache.put_many([texts[i] for i in fresh], [embeddings[i] for i in fresh])
+
+        return EmbeddingResult(embeddings, failures)
+
+
+_default_engine: Optional[EmbeddingEngine] = None
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """Returns the process-wide embedding engine, creating it on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = EmbeddingEngine(cache=get_embedding_cache())
+    return _default_engine
@@ -1,32 +1,77 @@
+import logging
 from typing import List, Dict, Any
-import google.generativeai as genai
 from config.settings import settings
+from src.clients import gemini
+from src.embeddings.embedding_engine import get_embedding_engine
+from src.embeddings.embedding_cache import get_embedding_cache
+from src.telemetry.metrics import API_CALLS, CACHE_LOOKUPS
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
 
 def get_gemini_embedding(text: str) -> List[float]:
-    """Generates an embedding for a given text using Gemini's embedding model."""
+    """
+    Generates an embedding for a given text using Gemini's embedding model.
+    Previously embedded texts are served from the local embedding cache.
+    """
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(text)
+        CACHE_LOOKUPS.inc(cache="embedding", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
     try:
         model = settings.GEMINI_EMBEDDING_MODEL
-        response = genai.embed_content(model=model, content=text)
-        return response['embedding']
+        response = gemini.embed_content(model=model, content=text)
+        API_CALLS.inc(kind="embed", outcome="ok")
+        embedding = response['embedding']
+        if cache is not None and embedding:
+            cache.put(text, embedding)
+        return embedding
     except Exception as e:
-        print(f"Error generating embedding: {e}")
+        API_CALLS.inc(kind="embed", outcome="error")
+        logger.error("Error generating embedding: %s", e)
+        return []
+
+async def aget_gemini_embedding(text: str) -> List[float]:
+    """Async get_gemini_embedding: same cache, but the API call doesn't block the event loop."""
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(text)
+        CACHE_LOOKUPS.inc(cache="embedding", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+    try:
+        model = settings.GEMINI_EMBEDDING_MODEL
+        response = await gemini.embed_content_async(model=model, content=text)
+        API_CALLS.inc(kind="embed", outcome="ok")
+        embedding = response['embedding']
+        if cache is not None and embedding:
+            cache.put(text, embedding)
+        return embedding
+    except Exception as e:
+        API_CALLS.inc(kind="embed", outcome="error")
+        logger.error("Error generating embedding: %s", e)
         return []
 
 def generate_embeddings_for_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Generates embeddings for a list of text chunks.
-    Adds 'embedding' key to each chunk dictionary.
+    Generates embeddings for a list of text chunks using batched, concurrent requests.
+    Adds 'embedding' key to each chunk dictionary, or 'embedding_error' if it could not be embedded.
     """
+    embeddable = []
     for chunk in chunks:
         if chunk["type"] in ["text_chunk", "image_description"]:
-            embedding = get_gemini_embedding(chunk["content"])
-            if embedding:
-                chunk["embedding"] = embedding
-            else:
-                print(f"Could not generate embedding for chunk: {chunk['metadata'].get('chunk_id', 'N/A')}")
+            embeddable.append(chunk)
+        else:
+            logger.info("Skipping embedding for unsupported chunk type: %s", chunk['type'])
+
+    result = get_embedding_engine().embed_texts([chunk["content"] for chunk in embeddable])
+    for i, chunk in enumerate(embeddable):
+        if i in result.failures:
+            chunk["embedding_error"] = result.failures[i]
+            logger.warning("Could not generate embedding for chunk: %s (%s)", chunk['metadata'].get('chunk_id', 'N/A'), result.failures[i])
         else:
-            print(f"Skipping embedding for unsupported chunk type: {chunk['type']}")
-    return chunks
\ No newline at end of file
+            chunk["embedding"] = result.embeddings[i]
+    if result.failures:
+        logger.warning("Embedding failed for %d of %d chunks.", len(result.failures), len(embeddable))
+    return chunks
@@ -0,0 +1,206 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import random
+import time
+from typing import List, Dict, Any, Tuple, Sequence
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def load_eval_records(path: str) -> List[Dict[str, Any]]:
+    """Reads a JSONL file with one JSON object per line."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_eval_set(path: str) -> Tuple[List[str], List[str]]:
+    """Reads a JSONL file with one {"question": ..., "ground_truth": ...} object per line."""
+    records = load_eval_records(path)
+    return [record["question"] for record in records], [record["ground_truth"] for record in records]
+
+
+def sample_order(n: int, sample_size: int = 0, seed: int = settings.EVAL_SEED, shuffle: bool = False) -> List[int]:
+    """Indices of the questions to evaluate: a seeded random subset when sample_size is set, else all of them."""
+    order = list(range(n))
+    if shuffle or 0 < sample_size < n:
+        random.Random(seed).shuffle(order)
+    return order[:sample_size] if sample_size > 0 else order
+
+
+def confidence_half_width(values: Sequence[float]) -> float:
+    """Half-width of the normal-approximation 95% confidence interval of the mean (NaNs ignored)."""
+    values = [v for v in values if v is not None and not math.isnan(v)]
+    if len(values) < 2:
+        return float("inf")
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    return 1.96 * math.sqrt(variance / len(values))
+
+
+def collect_results(questions: List[str], pipeline=None, batch_size: int = settings.EVAL_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Runs the questions through RAGPipeline.query_batch in batches and returns the structured results."""
+    if pipeline is None:
+        from src.core.rag_pipeline import RAGPipeline
+        pipeline = RAGPipeline()
+    results = []
+    for start in range(0, len(questions), batch_size):
+        results.extend(pipeline.query_batch(questions[start:start + batch_size]))
+        logger.info("Answered %d/%d questions.", len(results), len(questions))
+    return results
+
+
+def run_evaluation(questions: List[str],
+                   ground_truths: List[str],
+                   pipeline=None,
+                   evaluator=None,
+                   batch_size: int = settings.EVAL_BATCH_SIZE,
+                   sample_size: int = settings.EVAL_SAMPLE_SIZE,
+                   seed: int = settings.EVAL_SEED,
+                   early_stop_tolerance: float = settings.EVAL_EARLY_STOP_TOLERANCE,
+                   min_samples: int = settings.EVAL_MIN_SAMPLES):
+    """
+    Answers the questions with the pipeline and feeds the retrieved contexts and answers
+    straight into Evaluator. Returns the Ragas scores with per-question timings attached.
+
+    With sample_size, only a seeded random subset is answered and scored. With
+    early_stop_tolerance, questions are processed batch by batch in random order, and the
+    run stops once at least min_samples are scored and every metric's mean is known to
+    within +/- the tolerance (95% confidence).
+    """
+    import pandas as pd
+    if pipeline is None:
+        from src.core.rag_pipeline import RAGPipeline
+        pipeline = RAGPipeline()
+    if evaluator is None:
+        from src.evaluation.evaluator import Evaluator
+        evaluator = Evaluator()
+
+    order = sample_order(len(questions), sample_size, seed, shuffle=early_stop_tolerance > 0)
+    frames = []
+    start = time.perf_counter()
+    for offset in range(0, len(order), batch_size):
+        batch = order[offset:offset + batch_size]
+        results = collect_results([questions[i] for i in batch], pipeline, batch_size)
+        scores = evaluator.evaluate_rag_system(
+            questions=[questions[i] for i in batch],
+            ground_truths=[ground_truths[i] for i in batch],
+            retrieved_contexts=[result["contexts"] for result in results],
+            generated_answers=[result["answer"] for result in results],
+        )
+        metric_columns = list(scores.select_dtypes("number").columns)
+        for stage in ["embed", "retrieve", "generate"]:
+            scores[f"{stage}_seconds"] = [result["timings"][stage] for result in results]
+        scores["error"] = [result["error"] for result in results]
+        scores["question_index"] = batch
+        frames.append(scores)
+
+        scored = pd.concat(frames, ignore_index=True)
+        logger.info("Scored %d/%d questions in %.1fs.", len(scored), len(order), time.perf_counter() - start)
+        if early_stop_tolerance > 0 and len(scored) >= min_samples and len(scored) < len(order):
+            widths = {column: confidence_half_width(scored[column].tolist()) for column in metric_columns}
+            if all(width <= early_stop_tolerance for width in widths.values()):
+                logger.info("Stopping early after %d questions; 95%% half-widths: %s", len(scored),
+                            {column: round(width, 4) for column, width in widths.items()})
+                break
+    return pd.concat(frames, ignore_index=True)
+
+
+def collect_retrievals(questions: List[str], pipeline=None, top_k: int = settings.TOP_K_RETRIEVAL,
+                       batch_size: int = settings.EVAL_BATCH_SIZE) -> List[List[Dict[str, Any]]]:
+    """Retrieves (without generating) for every question, batch-embedded and batch-searched."""
+    from src.embeddings.embedding_engine import get_embedding_engine
+    if pipeline is None:
+        from src.core.rag_pipeline import RAGPipeline
+        pipeline = RAGPipeline()
+    retrieved = []
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+        embedded = get_embedding_engine().embed_texts(batch)
+        retrieved.extend(pipeline.retriever.retrieve_batch(batch, embedded.embeddings, top_k))
+    return retrieved
+
+
+def run_retrieval_evaluation(records: List[Dict[str, Any]],
+                             pipeline=None,
+                             ks: Sequence[int] = settings.EVAL_RETRIEVAL_KS,
+                             level: str = "source",
+                             batch_size: int = settings.EVAL_BATCH_SIZE,
+                             sample_size: int = settings.EVAL_SAMPLE_SIZE,
+                             seed: int = settings.EVAL_SEED) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    Scores retrieval alone against labeled ids, with no LLM calls beyond (cached) query
+    embeddings. Each record has a "question" and "relevant_sources" (file names) or
+    "relevant_chunks" (chunk ids), depending on `level`.
+
+    Retrieval runs once at the largest cutoff: rankings for smaller k are prefixes of it.
+    Returns (per-question rows, mean of each metric).
+    """
+    from src.evaluation.retrieval_metrics import LEVELS, doc_key, normalize_label, retrieval_metrics, summarize
+    if level not in LEVELS:
+        raise ValueError(f"level must be one of {LEVELS}, got {level!r}")
+    records = [records[i] for i in sample_order(len(records), sample_size, seed)]
+    questions = [record["question"] for record in records]
+    relevant = [[normalize_label(label, level) for label in record.get(f"relevant_{level}s", [])] for record in records]
+
+    start = time.perf_counter()
+    retrieved = collect_retrievals(questions, pipeline, top_k=max(ks), batch_size=batch_size)
+    retrieve_seconds = time.perf_counter() - start
+    ranked = [[doc_key(doc, level) for doc in docs] for docs in retrieved]
+    metrics = retrieval_metrics(ranked, relevant, ks)
+    summary = summarize(metrics)
+    logger.info("Retrieved for %d questions in %.2fs.", len(questions), retrieve_seconds)
+
+    rows = []
+    for i, question in enumerate(questions):
+        row = {"question": question, "retrieved": json.dumps(list(dict.fromkeys(ranked[i]))[:max(ks)])}
+        row.update({name: float(values[i]) for name, values in metrics.items()})
+        rows.append(row)
+    return rows, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RAG pipeline over an eval set and score it.")
+    parser.add_argument("dataset", help="JSONL file with 'question' plus 'ground_truth' (ragas mode) "
+                                        "or 'relevant_sources' / 'relevant_chunks' (retrieval mode)")
+    parser.add_argument("--mode", choices=["ragas", "retrieval"], default="ragas",
+                        help="'ragas' scores answers with the judge LLM; 'retrieval' computes recall/MRR/nDCG locally")
+    parser.add_argument("--output", default="eval_results.csv", help="Where to write the per-question scores")
+    parser.add_argument("--batch-size", type=int, default=settings.EVAL_BATCH_SIZE)
+    parser.add_argument("--sample", type=int, default=settings.EVAL_SAMPLE_SIZE, help="Evaluate a random subset of this many questions")
+    parser.add_argument("--seed", type=int, default=settings.EVAL_SEED)
+    parser.add_argument("--early-stop", type=float, default=settings.EVAL_EARLY_STOP_TOLERANCE,
+                        help="(ragas) stop once every metric's 95%% confidence half-width is below this")
+    parser.add_argument("--min-samples", type=int, default=settings.EVAL_MIN_SAMPLES)
+    parser.add_argument("--k", type=int, nargs="+", default=settings.EVAL_RETRIEVAL_KS, help="(retrieval) cutoffs")
+    parser.add_argument("--level", choices=["source", "chunk"], default="source", help="(retrieval) what the labels identify")
+    args = parser.parse_args()
+
+    from src.telemetry.exporters import configure_logging, init_telemetry
+    configure_logging()
+    init_telemetry()
+    if args.mode == "retrieval":
+        rows, summary = run_retrieval_evaluation(load_eval_records(args.dataset), ks=args.k, level=args.level,
+                                                 batch_size=args.batch_size, sample_size=args.sample, seed=args.seed)
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["question"])
+            writer.writeheader()
+            writer.writerows(rows)
+        for name, value in summary.items():
+            print(f"{name:<16}{value:.4f}")
+        print(f"Wrote {len(rows)} rows to {args.output}")
+        return
+
+    questions, ground_truths = load_eval_set(args.dataset)
+    scores = run_evaluation(questions, ground_truths, batch_size=args.batch_size, sample_size=args.sample,
+                            seed=args.seed, early_stop_tolerance=args.early_stop, min_samples=args.min_samples)
+    scores.to_csv(args.output, index=False)
+    print(scores.mean(numeric_only=True))
+    print(f"Wrote {len(scores)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
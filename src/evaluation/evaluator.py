@@ -1,14 +1,17 @@
-from typing import List, Dict, Any
-from datasets import Dataset
-from ragas import evaluate
-from ragas.metrics import faithfulness, answer_relevancy, context_recall, context_precision
-from ragas.llms import LangchainLLM
-from langchain_google_genai import ChatGoogleGenerativeAI
+import logging
+from typing import List, Dict, Any, Optional
 from config.settings import settings
-import pandas as pd
+from src.evaluation.judge_cache import JudgeCache
+
+logger = logging.getLogger(__name__)
 
 class Evaluator:
-    def __init__(self):
+    def __init__(self, cache: Optional[JudgeCache] = None, use_cache: bool = settings.EVAL_JUDGE_CACHE_ENABLED):
+        # Judge scores are cached per (metric, question, contexts, answer, ground truth)
+        self.cache = cache or (JudgeCache() if use_cache else None)
+        # Ragas, datasets and LangChain take seconds to import, so they load with the first Evaluator
+        from ragas.llms import LangchainLLM
+        from langchain_google_genai import ChatGoogleGenerativeAI
         # Ragas requires an LLM for evaluation itself
         self.eval_llm = ChatGoogleGenerativeAI(
             model=settings.RAGAS_EVAL_LLM,
@@ -21,10 +24,13 @@ class Evaluator:
                             questions: List[str],
                             ground_truths: List[str],
                             retrieved_contexts: List[List[str]],
-                            generated_answers: List[str]) -> pd.DataFrame:
+                            generated_answers: List[str]) -> "pd.DataFrame":
         """
         Evaluates the RAG system using Ragas metrics.
 
+        Scores found in the judge cache are reused; only the remaining samples are sent to
+        Ragas, once per group of metrics that miss on the same samples.
+
         Args:
             questions: List of user questions.
             ground_truths: List of ground truth answers for each question.
@@ -34,14 +40,18 @@ class Evaluator:
         Returns:
             A pandas DataFrame with evaluation results.
         """
-        # Create a Ragas Dataset
+        import pandas as pd
+        from datasets import Dataset
+        from ragas import evaluate
+        from ragas.metrics import faithfulness, answer_relevancy, context_recall, context_precision
+
         data = {
             "question": questions,
             "answer": generated_answers,
             "contexts": retrieved_contexts,
             "ground_truth": ground_truths
         }
-        dataset = Dataset.from_dict(data)
+        samples = [dict(zip(data, values)) for values in zip(*data.values())]
 
         # Define metrics to evaluate
         metrics = [
@@ -57,9 +67,32 @@ class Evaluator:
             metric.__setattr__("llm", self.ragas_llm)
             metric.__setattr__("embeddings", self.eval_llm) # For metrics that use embeddings
 
-        print("Starting Ragas evaluation... This might take some time.")
-        score = evaluate(dataset, metrics=metrics)
-        return score.to_pandas()
+        scores: Dict[str, List[float]] = {}
+        pending: Dict[tuple, list] = {}
+        for metric in metrics:
+            cached = self.cache.get_many(metric.name, samples) if self.cache is not None else {}
+            scores[metric.name] = [cached.get(i, float("nan")) for i in range(len(samples))]
+            missing = tuple(i for i in range(len(samples)) if i not in cached)
+            if missing:
+                pending.setdefault(missing, []).append(metric)
+
+        total = len(samples) * len(metrics)
+        to_score = sum(len(missing) * len(group) for missing, group in pending.items())
+        logger.info("Judge scores: %d of %d cached; scoring the other %d with Ragas.", total - to_score, total, to_score)
+        for missing, group in pending.items():
+            subset = Dataset.from_dict({column: [values[i] for i in missing] for column, values in data.items()})
+            result = evaluate(subset, metrics=group).to_pandas()
+            for metric in group:
+                fresh = result[metric.name].tolist()
+                for i, score in zip(missing, fresh):
+                    scores[metric.name][i] = score
+                if self.cache is not None:
+                    self.cache.put_many(metric.name, [samples[i] for i in missing], fresh)
+
+        frame = pd.DataFrame(data)
+        for name, values in scores.items():
+            frame[name] = values
+        return frame
 
 # Example usage (can be called from a separate script or notebook)
 # if __name__ == "__main__":
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any
+from config.settings import settings
+
+
+def sample_key(judge_model: str, metric: str, sample: Dict[str, Any]) -> str:
+    """Hash of everything a judge score depends on: judge model, metric, question, contexts, answer and ground truth."""
+    payload = [judge_model, metric, sample.get("question"), list(sample.get("contexts") or []),
+               sample.get("answer"), sample.get("ground_truth")]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """
+    Persistent SQLite cache of judge-LLM metric scores.
+
+    A sample is only re-scored when something it was scored on changes, so re-running an
+    eval set after a retrieval tweak pays for the questions whose contexts or answers moved.
+    Failed scores (NaN) are never stored.
+    """
+
+    def __init__(self, path: str = settings.EVAL_JUDGE_CACHE_PATH, judge_model: str = settings.RAGAS_EVAL_LLM):
+        self.path = path
+        self.judge_model = judge_model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judge_scores ("
+            " key TEXT PRIMARY KEY,"
+            " metric TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, metric: str, samples: List[Dict[str, Any]]) -> Dict[int, float]:
+        """Returns cached scores keyed by position in `samples`."""
+        keys = [sample_key(self.judge_model, metric, sample) for sample in samples]
+        found: Dict[str, float] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, score FROM judge_scores WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+        scores = {i: found[key] for i, key in enumerate(keys) if key in found}
+        self.hits += len(scores)
+        self.misses += len(keys) - len(scores)
+        return scores
+
+    def put_many(self, metric: str, samples: List[Dict[str, Any]], scores: List[float]):
+        now = time.time()
+        rows = [(sample_key(self.judge_model, metric, sample), metric, float(score), now)
+                for sample, score in zip(samples, scores)
+                if score is not None and not math.isnan(score)]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO judge_scores (key, metric, score, created_at) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM judge_scores").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
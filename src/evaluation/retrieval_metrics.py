@@ -0,0 +1,88 @@
+"""
+LLM-free retrieval metrics (recall@k, precision@k, hit rate, MRR, nDCG@k) against labeled
+relevant chunk or source ids.
+
+Ids are mapped to integers once, then every metric for every question and cutoff comes
+out of one (questions x ranks) hit matrix, so scoring thousands of questions takes
+milliseconds. Relevance is binary.
+"""
+import os
+from typing import List, Dict, Any, Iterable, Sequence
+import numpy as np
+
+LEVELS = ("chunk", "source")
+
+
+def doc_key(doc: Dict[str, Any], level: str = "source") -> str:
+    """The id a retrieved chunk is judged by: its chunk_id, or the file name of its source."""
+    metadata = doc.get("metadata", {})
+    if level == "chunk":
+        return str(metadata.get("chunk_id", ""))
+    return normalize_label(metadata.get("source", ""), level)
+
+
+def normalize_label(label: str, level: str = "source") -> str:
+    """Sources are compared by file name, so labels don't depend on where the data directory lives."""
+    return os.path.basename(str(label)) if level == "source" else str(label)
+
+
+def hit_matrix(retrieved: Sequence[Sequence[str]], relevant: Sequence[Iterable[str]]):
+    """
+    Returns (hits, relevant_counts): hits[q, r] is True when the r-th distinct id retrieved
+    for question q is relevant to it. Repeated ids (several chunks of one source) only count
+    at their first rank, so source-level scores aren't inflated.
+    """
+    retrieved = [list(dict.fromkeys(ids)) for ids in retrieved]
+    relevant = [set(ids) for ids in relevant]
+    vocabulary: Dict[str, int] = {}
+    depth = max((len(ids) for ids in retrieved), default=0)
+    width = max((len(ids) for ids in relevant), default=0)
+    retrieved_codes = np.full((len(retrieved), max(depth, 1)), -1, dtype=np.int64)
+    relevant_codes = np.full((len(relevant), max(width, 1)), -2, dtype=np.int64)
+    for q, ids in enumerate(retrieved):
+        retrieved_codes[q, :len(ids)] = [vocabulary.setdefault(i, len(vocabulary)) for i in ids]
+    for q, ids in enumerate(relevant):
+        relevant_codes[q, :len(ids)] = [vocabulary.setdefault(i, len(vocabulary)) for i in ids]
+    hits = (retrieved_codes[:, :, None] == relevant_codes[:, None, :]).any(axis=2)
+    return hits[:, :depth], np.array([len(ids) for ids in relevant], dtype=np.int64)
+
+
+def retrieval_metrics(retrieved: Sequence[Sequence[str]],
+                      relevant: Sequence[Iterable[str]],
+                      ks: Sequence[int] = (1, 3, 5, 10)) -> Dict[str, np.ndarray]:
+    """
+    Per-question metrics for each cutoff in ks, e.g. {"recall@5": array([...]), "mrr": ...}.
+    `retrieved` holds ranked ids per question, `relevant` the labeled ids. Questions without
+    labels score NaN, so they drop out of nan-aware means instead of counting as misses.
+    """
+    hits, relevant_counts = hit_matrix(retrieved, relevant)
+    n_questions, depth = hits.shape
+    labeled = relevant_counts > 0
+    denominator = np.where(labeled, relevant_counts, 1)
+    discounts = 1.0 / np.log2(np.arange(2, depth + 2))
+    gains = hits * discounts
+
+    metrics: Dict[str, np.ndarray] = {}
+    for k in ks:
+        top = hits[:, :k]
+        found = top.sum(axis=1)
+        metrics[f"hit_rate@{k}"] = (found > 0).astype(float)
+        metrics[f"recall@{k}"] = found / denominator
+        metrics[f"precision@{k}"] = found / k
+        ideal_discounts = np.concatenate([[0.0], np.cumsum(1.0 / np.log2(np.arange(2, k + 2)))])
+        ideal = ideal_discounts[np.minimum(relevant_counts, k)]
+        metrics[f"ndcg@{k}"] = gains[:, :k].sum(axis=1) / np.where(ideal > 0, ideal, 1.0)
+
+    any_hit = hits.any(axis=1)
+    first_rank = np.argmax(hits, axis=1) + 1 if depth else np.ones(n_questions, dtype=np.int64)
+    metrics["mrr"] = np.where(any_hit, 1.0 / first_rank, 0.0)
+
+    for name in metrics:
+        metrics[name] = np.where(labeled, metrics[name], np.nan)
+    return metrics
+
+
+def summarize(metrics: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Mean of each metric over the labeled questions."""
+    return {name: float(np.nanmean(values)) if np.any(~np.isnan(values)) else float("nan")
+            for name, values in metrics.items()}
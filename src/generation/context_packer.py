@@ -0,0 +1,174 @@
+import math
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import settings
+
+_CHUNK_INDEX_PATTERN = re.compile(r"_chunk_(\d+)$")
+# Characters compared when looking for where the next chunk's overlap starts
+_OVERLAP_PROBE = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text with Gemini's tokenizer)."""
+    return math.ceil(len(text) / 4)
+
+
+def chunk_index(metadata: Dict[str, Any]) -> Optional[int]:
+    """Position of a chunk within its source record, from metadata or, for older chunks, the chunk id."""
+    if metadata.get("chunk_index") is not None:
+        return int(metadata["chunk_index"])
+    match = _CHUNK_INDEX_PATTERN.search(str(metadata.get("chunk_id", "")))
+    return int(match.group(1)) if match else None
+
+
+def strip_overlap(previous: str, following: str, max_overlap: int = None) -> str:
+    """
+    Returns `following` without the prefix it repeats from the end of `previous`.
+    The splitter's overlap is at most CHUNK_OVERLAP characters, so only that tail is searched.
+    """
+    max_overlap = max_overlap or settings.CHUNK_OVERLAP * 2
+    tail = previous[-max_overlap:]
+    probe = following[:_OVERLAP_PROBE]
+    if not probe:
+        return following
+    position = tail.find(probe)
+    while position != -1:
+        # The leftmost match that runs to the end of the tail is the longest overlap
+        overlap = len(tail) - position
+        if following.startswith(tail[position:]):
+            return following[overlap:]
+        position = tail.find(probe, position + 1)
+    return following
+
+
+class PackedContext:
+    """The packed prompt context, plus what went into it."""
+
+    def __init__(self, text: str, spans: List[Dict[str, Any]], tokens: int, dropped: int):
+        self.text = text
+        self.spans = spans # One entry per labelled span: label, source, page, chunk_ids, tokens
+        self.tokens = tokens
+        self.dropped = dropped # Retrieved chunks left out to stay within the budget
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the context block of the prompt.
+
+    Chunks from the same source record with consecutive chunk indices are merged into one
+    span with their overlapping text removed, exact duplicate chunks are dropped, and spans
+    are added in relevance order (the order the retriever returned their best chunk) until
+    the token budget is used up. Each span is labelled with its source so the model can cite it.
+    """
+
+    def __init__(self, token_budget: int = settings.CONTEXT_TOKEN_BUDGET, min_span_tokens: int = 64):
+        self.token_budget = token_budget
+        self.min_span_tokens = min_span_tokens
+
+    def _group(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Groups chunks into runs of adjacent chunks from the same record, keeping each run's best rank."""
+        seen_contents = set()
+        by_record: Dict[Tuple[Any, Any], List[Tuple[int, int, Dict[str, Any]]]] = {}
+        singles = []
+        for rank, doc in enumerate(docs):
+            content = doc["content"].strip()
+            if not content or content in seen_contents:
+                continue
+            seen_contents.add(content)
+            metadata = doc["metadata"]
+            index = chunk_index(metadata)
+            if index is None:
+                singles.append({"rank": rank, "docs": [doc]})
+            else:
+                key = (metadata.get("source"), metadata.get("page"))
+                by_record.setdefault(key, []).append((index, rank, doc))
+
+        runs = singles
+        for members in by_record.values():
+            members.sort(key=lambda member: member[0])
+            run = None
+            for index, rank, doc in members:
+                if run is not None and index == run["last_index"] + 1:
+                    run["docs"].append(doc)
+                    run["rank"] = min(run["rank"], rank)
+                else:
+                    run = {"rank": rank, "docs": [doc]}
+                    runs.append(run)
+                run["last_index"] = index
+        runs.sort(key=lambda run: run["rank"])
+        return runs
+
+    @staticmethod
+    def _merge(docs: List[Dict[str, Any]]) -> str:
+        text = docs[0]["content"].strip()
+        end = docs[0]["metadata"].get("end_offset")
+        for doc in docs[1:]:
+            content = doc["content"].strip()
+            start = doc["metadata"].get("start_offset")
+            if start is not None and end is not None:
+                # Offsets say exactly how much of this chunk the previous one already covered
+                addition = content[max(0, end - start):]
+                gap = start - end
+            else:
+                addition = strip_overlap(text, content)
+                gap = 1 if addition == content else 0
+            end = doc["metadata"].get("end_offset")
+            if not addition.strip():
+                continue
+            if gap <= 0:
+                # The addition starts where the previous chunk ended, so it keeps the original whitespace
+                text += addition
+            else:
+                # The whitespace between the chunks was stripped from both. Chunks end at paragraph or
+                # line breaks where the text has them, and a line break never joins two words
+                text += "\n" * min(gap, 2) + addition
+        return text
+
+    @staticmethod
+    def _label(metadata: Dict[str, Any]) -> str:
+        label = metadata.get("file_name") or metadata.get("source", "Unknown Source")
+        if metadata.get("page") is not None:
+            label += f", page {metadata['page']}"
+        if metadata.get("original_type") == "image":
+            label += ", image description"
+        return label
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int) -> str:
+        """Cuts text to roughly max_tokens, at the last sentence or word boundary."""
+        cut = text[:max_tokens * 4]
+        boundary = max(cut.rfind(". "), cut.rfind("\n"))
+        if boundary < len(cut) // 2:
+            boundary = cut.rfind(" ")
+        return (cut[:boundary + 1] if boundary > 0 else cut).rstrip() + " ..."
+
+    def pack(self, docs: List[Dict[str, Any]]) -> PackedContext:
+        parts, spans = [], []
+        used = dropped = 0
+        for run in self._group(docs):
+            metadata = run["docs"][0]["metadata"]
+            label = f"[{len(spans) + 1}] {self._label(metadata)}"
+            text = self._merge(run["docs"])
+            header_tokens = estimate_tokens(label) + 1
+            tokens = estimate_tokens(text) + header_tokens
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                if remaining - header_tokens < self.min_span_tokens:
+                    dropped += len(run["docs"])
+                    continue
+                text = self._truncate(text, remaining - header_tokens)
+                tokens = estimate_tokens(text) + header_tokens
+            parts.append(f"{label}\n{text}")
+            spans.append({
+                "label": label,
+                "source": metadata.get("source"),
+                "page": metadata.get("page"),
+                "chunk_ids": [doc["metadata"].get("chunk_id") for doc in run["docs"]],
+                "tokens": tokens,
+            })
+            used += tokens
+        return PackedContext("\n\n".join(parts), spans, used, dropped)
+
+
+def pack_context(docs: List[Dict[str, Any]], token_budget: int = settings.CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    return ContextPacker(token_budget).pack(docs)
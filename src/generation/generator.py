@@ -1,30 +1,33 @@
-from typing import List, Dict, Any
-import google.generativeai as genai
+import logging
+import time
+from typing import List, Dict, Any, Iterator, AsyncIterator
 from config.settings import settings
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from src.clients import gemini
+from src.generation.context_packer import ContextPacker
+from src.telemetry import tracing
+from src.telemetry.metrics import API_CALLS, record_usage
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
+GENERATION_ERROR_MESSAGE = "An error occurred while generating the answer."
+
+logger = logging.getLogger(__name__)
 
 class Generator:
     def __init__(self):
-        self.model = genai.GenerativeModel(settings.GEMINI_TEXT_MODEL)
+        self.model_name = settings.GEMINI_TEXT_MODEL
         # Optional: Safety settings for generation
-        self.safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        }
-
+        self.safety_settings = gemini.permissive_safety_settings()
+        self.context_packer = ContextPacker() if settings.CONTEXT_PACKING_ENABLED else None
 
-    def generate_answer(self, query: str, retrieved_context: List[Dict[str, Any]]) -> str:
-        if not retrieved_context:
-            return "I couldn't find relevant information in my knowledge base."
 
-    
+    def _build_prompt(self, query: str, retrieved_context: List[Dict[str, Any]]) -> str:
         # Current implementation, suitable for using image descriptions as text:
-        context_str = "\n\n".join([doc["content"] for doc in retrieved_context])
+        if self.context_packer is not None:
+            with tracing.span("context.pack", chunks=len(retrieved_context)) as pack_span:
+                packed = self.context_packer.pack(retrieved_context)
+                pack_span.set(tokens=packed.tokens, spans=len(packed.spans), chunks_dropped=packed.dropped)
+            context_str = packed.text
+        else:
+            context_str = "\n\n".join([doc["content"] for doc in retrieved_context])
 
         prompt = f"""
         You are an intelligent research assistant. Use the following pieces of information to answer the user's question.
@@ -39,13 +42,121 @@ class Generator:
 
         Your Answer:
         """
+        return prompt
+
+    def generate_answer(self, query: str, retrieved_context: List[Dict[str, Any]]) -> str:
+        if not retrieved_context:
+            return "I couldn't find relevant information in my knowledge base."
+
+        prompt = self._build_prompt(query, retrieved_context)
+        with tracing.span("generate", model=self.model_name, prompt_chars=len(prompt)):
+            try:
+                # For pure text input (which includes the image descriptions), just pass the prompt string
+                response = gemini.generate_content(
+                    self.model_name, prompt,
+                    safety_settings=self.safety_settings
+                )
+                API_CALLS.inc(kind="generate", outcome="ok")
+                record_usage(response, self.model_name)
+                return response.text
+            except Exception as e:
+                API_CALLS.inc(kind="generate", outcome="error")
+                logger.error("Error generating content with Gemini: %s", e)
+                return GENERATION_ERROR_MESSAGE
+
+    def generate_answer_stream(self, query: str, retrieved_context: List[Dict[str, Any]]) -> Iterator[str]:
+        """Like generate_answer, but yields the answer text piece by piece as Gemini produces it."""
+        if not retrieved_context:
+            yield "I couldn't find relevant information in my knowledge base."
+            return
+
+        prompt = self._build_prompt(query, retrieved_context)
+        # Timed with tracing.record rather than a span, since the block yields to the caller
+        start = time.perf_counter()
+        first_token_ms = None
+        outcome = "ok"
+        try:
+            response = gemini.generate_content(
+                self.model_name, prompt,
+                safety_settings=self.safety_settings,
+                stream=True
+            )
+            last_chunk = None
+            for chunk in response:
+                last_chunk = chunk
+                # Chunks without text (e.g. safety or finish metadata only) raise on .text
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                    yield text
+            # Usage metadata is reported on the final chunk
+            record_usage(last_chunk, self.model_name)
+        except Exception as e:
+            outcome = "error"
+            logger.error("Error generating content with Gemini: %s", e)
+            yield GENERATION_ERROR_MESSAGE
+        finally:
+            API_CALLS.inc(kind="generate", outcome=outcome)
+            tracing.record("generate", start, model=self.model_name, stream=True,
+                           first_token_ms=first_token_ms)
+
+    async def agenerate_answer(self, query: str, retrieved_context: List[Dict[str, Any]]) -> str:
+        """Async generate_answer, for serving many requests from one event loop."""
+        if not retrieved_context:
+            return "I couldn't find relevant information in my knowledge base."
+
+        prompt = self._build_prompt(query, retrieved_context)
+        with tracing.span("generate", model=self.model_name, prompt_chars=len(prompt)):
+            try:
+                response = await gemini.generate_content_async(
+                    self.model_name, prompt,
+                    safety_settings=self.safety_settings
+                )
+                API_CALLS.inc(kind="generate", outcome="ok")
+                record_usage(response, self.model_name)
+                return response.text
+            except Exception as e:
+                API_CALLS.inc(kind="generate", outcome="error")
+                logger.error("Error generating content with Gemini: %s", e)
+                return GENERATION_ERROR_MESSAGE
+
+    async def agenerate_answer_stream(self, query: str, retrieved_context: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Async generate_answer_stream."""
+        if not retrieved_context:
+            yield "I couldn't find relevant information in my knowledge base."
+            return
+
+        prompt = self._build_prompt(query, retrieved_context)
+        start = time.perf_counter()
+        first_token_ms = None
+        outcome = "ok"
         try:
-            # For pure text input (which includes the image descriptions), just pass the prompt string
-            response = self.model.generate_content(
-                prompt,
-                safety_settings=self.safety_settings
+            response = await gemini.generate_content_async(
+                self.model_name, prompt,
+                safety_settings=self.safety_settings,
+                stream=True
             )
-            return response.text
+            last_chunk = None
+            async for chunk in response:
+                last_chunk = chunk
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                    yield text
+            record_usage(last_chunk, self.model_name)
         except Exception as e:
-            print(f"Error generating content with Gemini: {e}")
-            return "An error occurred while generating the answer."
\ No newline at end of file
+            outcome = "error"
+            logger.error("Error generating content with Gemini: %s", e)
+            yield GENERATION_ERROR_MESSAGE
+        finally:
+            API_CALLS.inc(kind="generate", outcome=outcome)
+            tracing.record("generate", start, model=self.model_name, stream=True,
+                           first_token_ms=first_token_ms)
@@ -0,0 +1,76 @@
+from typing import List, Dict, Any, Optional, Sequence
+import numpy as np
+from config.settings import settings
+from src.vector_db.numpy_backend import normalize_rows
+
+
+def mmr_select(query_embedding: Sequence[float],
+               candidate_embeddings: Sequence[Sequence[float]],
+               k: int,
+               lambda_mult: float = settings.MMR_LAMBDA,
+               groups: Optional[Sequence[Any]] = None,
+               max_per_group: int = 0) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks up to k candidate indices, each maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, already picked)).
+
+    lambda_mult=1 is plain relevance order, lower values trade relevance for diversity.
+    With groups (e.g. each candidate's source) and max_per_group > 0, no group contributes
+    more than max_per_group picks, so fewer than k indices may come back.
+    Cost is one matrix-vector product per pick, O(n * k * dim) overall.
+    """
+    if k <= 0 or len(candidate_embeddings) == 0:
+        return []
+    candidates = normalize_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    relevance = candidates @ query
+    # Similarity of each candidate to its closest already-selected candidate
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+
+    group_ids, group_counts = None, None
+    if groups is not None and max_per_group > 0:
+        _, group_ids = np.unique(np.asarray([str(group) for group in groups]), return_inverse=True)
+        group_counts = np.zeros(group_ids.max() + 1, dtype=np.int64)
+
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, candidates @ candidates[best], out=redundancy)
+        if group_ids is not None:
+            group = group_ids[best]
+            group_counts[group] += 1
+            if group_counts[group] >= max_per_group:
+                available[group_ids == group] = False
+    return selected
+
+
+def mmr_rerank(query_embedding: Sequence[float],
+               docs: List[Dict[str, Any]],
+               top_k: int,
+               lambda_mult: float = settings.MMR_LAMBDA,
+               max_per_source: int = settings.MMR_MAX_PER_SOURCE) -> List[Dict[str, Any]]:
+    """
+    Re-ranks retrieved chunks that carry an 'embedding' with MMR and returns at most top_k of
+    them, without their embeddings. Chunks without an embedding are appended after the MMR
+    picks in their original order if there is room left.
+    """
+    embedded = [doc for doc in docs if doc.get("embedding") is not None and len(doc["embedding"])]
+    rest = [doc for doc in docs if doc.get("embedding") is None or not len(doc["embedding"])]
+    picks = mmr_select(query_embedding,
+                       [doc["embedding"] for doc in embedded],
+                       top_k,
+                       lambda_mult=lambda_mult,
+                       groups=[doc["metadata"].get("source") for doc in embedded],
+                       max_per_group=max_per_source)
+    reranked = [embedded[i] for i in picks] + rest[:max(0, top_k - len(picks))]
+    results = []
+    for rank, doc in enumerate(reranked):
+        doc = {key: value for key, value in doc.items() if key != "embedding"}
+        doc["mmr_rank"] = rank
+        results.append(doc)
+    return results
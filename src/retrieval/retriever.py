@@ -1,26 +1,116 @@
+import logging
 from typing import List, Dict, Any
 from src.vector_db.vector_store_manager import VectorStoreManager
+from src.vector_db.bm25_index import reciprocal_rank_fusion
+from src.retrieval.mmr import mmr_rerank
 from src.embeddings.embedding_generator import get_gemini_embedding
+from src.telemetry import tracing
 from config.settings import settings
 
+logger = logging.getLogger(__name__)
+
 class Retriever:
-    def __init__(self, vector_store_manager: VectorStoreManager):
+    def __init__(self, vector_store_manager: VectorStoreManager, mode: str = settings.RETRIEVAL_MODE):
         self.vector_store_manager = vector_store_manager
+        self.mode = mode
 
-    def retrieve_relevant_documents(self, query: str, top_k: int = settings.TOP_K_RETRIEVAL) -> List[Dict[str, Any]]:
+    def retrieve_relevant_documents(self,
+                                    query: str,
+                                    top_k: int = settings.TOP_K_RETRIEVAL,
+                                    query_embedding: List[float] = None) -> List[Dict[str, Any]]:
         """
         Retrieves top_k most relevant document chunks based on a user query.
+        Repeated queries reuse their cached embedding instead of calling the API again.
+        Pass query_embedding if the caller has already embedded the query.
         """
-        query_embedding = get_gemini_embedding(query)
-        if not query_embedding:
-            print("Failed to generate embedding for the query.")
-            return []
+        with tracing.span("retrieve", mode=self.mode, top_k=top_k):
+            if query_embedding is None:
+                with tracing.span("retrieve.embed"):
+                    query_embedding = get_gemini_embedding(query)
+            if not query_embedding:
+                logger.warning("Failed to generate embedding for the query.")
+                return []
+
+            if self.mode == "hybrid":
+                return self._retrieve_hybrid(query, query_embedding, top_k)
+            if self.mode == "mmr":
+                return self._retrieve_mmr(query_embedding, top_k)
 
-        # Query the vector store
-        retrieved_chunks = self.vector_store_manager.query_documents(
-            query_embedding=query_embedding,
-            top_k=top_k
+            # Query the vector store
+            retrieved_chunks = self.vector_store_manager.query_documents(
+                query_embedding=query_embedding,
+                top_k=top_k
+            )
+            return retrieved_chunks
+
+    def retrieve_batch(self,
+                       queries: List[str],
+                       query_embeddings: List[List[float]],
+                       top_k: int = settings.TOP_K_RETRIEVAL) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieves for many already-embedded queries with a single vectorized vector-store search.
+        Queries whose embedding is missing get an empty result.
+        """
+        positions = [i for i, embedding in enumerate(query_embeddings) if embedding]
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not positions:
+            return results
+        candidates = top_k
+        if self.mode == "hybrid":
+            candidates = max(top_k, settings.HYBRID_CANDIDATES)
+        elif self.mode == "mmr":
+            candidates = max(top_k, settings.MMR_CANDIDATES)
+        dense_results = self.vector_store_manager.query_documents_batch(
+            [query_embeddings[i] for i in positions], top_k=candidates, include_embeddings=self.mode == "mmr"
         )
-        return retrieved_chunks
+        for i, dense in zip(positions, dense_results):
+            if self.mode == "hybrid":
+                results[i] = self._fuse(queries[i], dense, top_k)
+            elif self.mode == "mmr":
+                results[i] = mmr_rerank(query_embeddings[i], dense, top_k)
+            else:
+                results[i] = dense
+        return results
+
+    def _retrieve_mmr(self, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Over-fetches nearest neighbours with their embeddings and keeps a relevant but diverse
+        top_k, so overlapping chunks of one file don't fill every context slot.
+        """
+        candidates = self.vector_store_manager.query_documents(
+            query_embedding=query_embedding, top_k=max(top_k, settings.MMR_CANDIDATES), include_embeddings=True
+        )
+        with tracing.span("retrieve.mmr", candidates=len(candidates)):
+            return mmr_rerank(query_embedding, candidates, top_k)
+
+    def _retrieve_hybrid(self, query: str, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Fuses the dense ranking with the BM25 ranking using reciprocal rank fusion,
+        so exact identifiers, acronyms and numbers surface even with a small top_k.
+        """
+        candidates = max(top_k, settings.HYBRID_CANDIDATES)
+        dense = self.vector_store_manager.query_documents(query_embedding=query_embedding, top_k=candidates)
+        return self._fuse(query, dense, top_k)
+
+    def _fuse(self, query: str, dense: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        candidates = max(top_k, settings.HYBRID_CANDIDATES)
+        lexical = self.vector_store_manager.lexical_search(query, top_k=candidates)
 
-  
\ No newline at end of file
+        # Keyed by shard as well, so chunks of different shards are never merged into one
+        def key(doc):
+            return doc["metadata"].get("shard"), doc["metadata"]["chunk_id"]
+
+        docs_by_key = {}
+        for doc in lexical + dense:
+            docs_by_key[key(doc)] = {**docs_by_key.get(key(doc), {}), **doc}
+        fused = reciprocal_rank_fusion([
+            [key(doc) for doc in dense],
+            [key(doc) for doc in lexical],
+        ])
+        retrieved_chunks = []
+        for doc_key, score in fused[:top_k]:
+            doc = docs_by_key[doc_key]
+            doc.setdefault("distance", None) # Lexical-only hits have no dense distance
+            doc["rrf_score"] = score
+            retrieved_chunks.append(doc)
+        return retrieved_chunks
@@ -0,0 +1,91 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from config.settings import settings
+from src.telemetry.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def configure_logging(level: str = None):
+    """Sets up root logging for the app and CLIs. Library modules only create loggers."""
+    logging.basicConfig(
+        level=(level or settings.LOG_LEVEL).upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(REGISTRY.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = REGISTRY.prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+def start_metrics_server(port: int = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves /metrics (Prometheus text format) and /metrics.json from a daemon thread.
+    Calling it again returns the running server.
+    """
+    global _metrics_server
+    if _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, port or settings.TELEMETRY_PROMETHEUS_PORT), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info("Serving metrics at http://%s:%d/metrics", host, _metrics_server.server_address[1])
+    return _metrics_server
+
+
+def configure_opentelemetry():
+    """
+    Installs an OpenTelemetry tracer provider with an OTLP exporter, configured through the
+    standard OTEL_EXPORTER_OTLP_* environment variables. Skipped if the SDK is missing.
+    """
+    try:
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning("OpenTelemetry export requested but the SDK is not installed: %s", e)
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": "multimodal-rag"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+    logger.info("OpenTelemetry span export enabled.")
+
+
+def init_telemetry():
+    """Starts the exporters enabled in settings. Safe to call more than once."""
+    global _initialized
+    with _init_lock:
+        if _initialized or not settings.TELEMETRY_ENABLED:
+            return
+        _initialized = True
+        if settings.TELEMETRY_PROMETHEUS_PORT:
+            try:
+                start_metrics_server()
+            except OSError as e:
+                logger.warning("Could not start metrics server on port %d: %s", settings.TELEMETRY_PROMETHEUS_PORT, e)
+        if settings.TELEMETRY_OTEL_ENABLED:
+            configure_opentelemetry()
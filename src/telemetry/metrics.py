@@ -0,0 +1,181 @@
+import threading
+from typing import Dict, Any, Tuple, Iterable
+
+# Upper bounds in seconds; spans range from sub-millisecond searches to multi-second generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter, one value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {_format_labels(key) or "total": value for key, value in self._values.items()}
+
+    def prometheus_lines(self):
+        with self._lock:
+            for key, value in self._values.items():
+                yield f"{self.name}{_format_labels(key)} {value:g}"
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum and count, one series per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                _format_labels(key) or "total": {
+                    "count": series["count"],
+                    "sum": series["sum"],
+                    "mean": series["sum"] / series["count"] if series["count"] else 0.0,
+                }
+                for key, series in self._series.items()
+            }
+
+    def prometheus_lines(self):
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series["counts"]):
+                    yield f"{self.name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {count}"
+                yield f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series['count']}"
+                yield f"{self.name}_sum{_format_labels(key)} {series['sum']:g}"
+                yield f"{self.name}_count{_format_labels(key)} {series['count']}"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """Holds every metric by name; asking for an existing name returns the same instance."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name!r} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def histogram(self, name: str, description: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of every metric as plain dicts, for JSON export."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def prometheus_text(self) -> str:
+        """Renders every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+# Metrics shared across the pipeline. Label conventions:
+#   API_CALLS      kind=embed|generate|vision, outcome=ok|error
+#   API_RETRIES    kind=..., reason=throttle|transient|isolate
+#   API_THROTTLED  model=... (429 responses)
+#   CACHE_LOOKUPS  cache=embedding|caption|response_exact|response_semantic, result=hit|miss
+#   TOKENS         model=..., direction=prompt|output
+#   ITEMS          stage=... (files, chunks, images, queries processed)
+#   STAGE_SECONDS  span=... (observed by every tracing span)
+API_CALLS = REGISTRY.counter("rag_api_calls_total", "Gemini API requests")
+API_RETRIES = REGISTRY.counter("rag_api_retries_total", "Gemini API requests repeated after a failure")
+API_THROTTLED = REGISTRY.counter("rag_api_throttled_total", "Gemini API requests rejected with a rate-limit error")
+CACHE_LOOKUPS = REGISTRY.counter("rag_cache_lookups_total", "Cache lookups by cache and result")
+TOKENS = REGISTRY.counter("rag_tokens_total", "Tokens reported by Gemini usage metadata")
+ITEMS = REGISTRY.counter("rag_items_total", "Items processed by pipeline stage")
+STAGE_SECONDS = REGISTRY.histogram("rag_stage_duration_seconds", "Wall-clock duration of pipeline spans")
+HTTP_REQUESTS = REGISTRY.counter("rag_http_requests_total", "HTTP API requests by route and status")
+HTTP_SECONDS = REGISTRY.histogram("rag_http_request_duration_seconds", "HTTP API request duration by route")
+COALESCED_REQUESTS = REGISTRY.counter("rag_http_coalesced_total", "Queries answered by joining an identical in-flight query")
+
+
+def record_usage(response, model: str):
+    """Adds the token counts from a Gemini response's usage metadata, when present, to TOKENS."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    if prompt_tokens:
+        TOKENS.inc(prompt_tokens, model=model, direction="prompt")
+    if output_tokens:
+        TOKENS.inc(output_tokens, model=model, direction="output")
@@ -0,0 +1,230 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Iterator, Callable
+from config.settings import settings
+from src.telemetry.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    One timed stage. Spans opened while another is active become its children. Only the first
+    TELEMETRY_MAX_SPAN_CHILDREN are kept whole; later ones are folded into per-name counts and
+    durations, so a long-running span (an indexing run) does not grow with the size of its input.
+    """
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.children: List["Span"] = []
+        self.summarized: Dict[str, Dict[str, Any]] = {} # child name -> count, total_ms, max_ms, errors
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_child(self, child: "Span"):
+        # Children can finish on several worker threads at once
+        with _children_lock:
+            if len(self.children) < settings.TELEMETRY_MAX_SPAN_CHILDREN:
+                self.children.append(child)
+                return
+            summary = self.summarized.setdefault(child.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            duration_ms = child.duration * 1000
+            summary["count"] += 1
+            summary["total_ms"] += duration_ms
+            summary["max_ms"] = max(summary["max_ms"], duration_ms)
+            summary["errors"] += child.error is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"name": self.name, "duration_ms": round(self.duration * 1000, 3)}
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        if self.summarized:
+            data["summarized_children"] = [
+                {"name": name, **summary, "total_ms": round(summary["total_ms"], 3), "max_ms": round(summary["max_ms"], 3)}
+                for name, summary in self.summarized.items()
+            ]
+        return data
+
+
+class Trace:
+    """Collects the spans of one logical operation (a query, an indexing run) as a tree."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.root: Optional[Span] = None
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Flattens the span tree into rows of depth, name, milliseconds and share of the total."""
+        rows = []
+        if self.root is None:
+            return rows
+        total = self.root.duration or 1e-9
+
+        def walk(span: Span, depth: int):
+            rows.append({
+                "depth": depth,
+                "name": span.name,
+                "ms": span.duration * 1000,
+                "share": span.duration / total,
+                "attributes": span.attributes,
+            })
+            for child in span.children:
+                walk(child, depth + 1)
+            for name, summary in span.summarized.items():
+                rows.append({
+                    "depth": depth + 1,
+                    "name": f"{name} (x{summary['count']} more)",
+                    "ms": summary["total_ms"],
+                    "share": summary["total_ms"] / 1000 / total,
+                    "attributes": {"max_ms": round(summary["max_ms"], 3), "errors": summary["errors"]},
+                })
+
+        walk(self.root, 0)
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.root.to_dict() if self.root is not None else {"name": self.name}
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("rag_current_span", default=None)
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("rag_current_trace", default=None)
+_json_log_lock = threading.Lock()
+_children_lock = threading.Lock()
+
+
+def _otel_tracer():
+    """Returns an OpenTelemetry tracer when the optional exporter is enabled and installed."""
+    if not settings.TELEMETRY_OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        return None
+    return otel_trace.get_tracer("multimodal-rag")
+
+
+def _write_json_log(span: Span):
+    path = settings.TELEMETRY_JSON_LOG_PATH
+    if not path:
+        return
+    record = {"timestamp": time.time(), **span.to_dict()}
+    try:
+        with _json_log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        logger.warning("Could not write trace to %s: %s", path, e)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Times the enclosed block as a span named `name` and records its duration in STAGE_SECONDS.
+    Nested spans form a tree; finished top-level spans are appended to the JSON trace log.
+    """
+    current = Span(name, attributes)
+    if not settings.TELEMETRY_ENABLED:
+        yield current
+        return
+    parent = _current_span.get()
+    token = _current_span.set(current)
+    tracer = _otel_tracer()
+    otel_span = tracer.start_as_current_span(name, attributes=attributes) if tracer else None
+    otel_active = otel_span.__enter__() if otel_span else None
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        if otel_span:
+            for key, value in current.attributes.items():
+                if isinstance(value, (str, bool, int, float)):
+                    otel_active.set_attribute(key, value)
+            otel_span.__exit__(None, None, None)
+        STAGE_SECONDS.observe(current.duration, span=name)
+        if parent is not None:
+            parent.add_child(current)
+        else:
+            trace_ = _current_trace.get()
+            if trace_ is not None and trace_.root is None:
+                trace_.root = current
+            _write_json_log(current)
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Trace]:
+    """
+    Starts a trace whose root span is `name`. The Trace is usable after the block exits,
+    e.g. to render a timing breakdown of one query.
+    """
+    collected = Trace(name)
+    token = _current_trace.set(collected)
+    # Detach from any enclosing span so this trace gets its own root
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attributes):
+            yield collected
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(token)
+
+
+def record(name: str, start: float, **attributes) -> Span:
+    """
+    Records an already-finished span that began at `start` (a time.perf_counter() value).
+    Used where a context manager does not fit, e.g. around a generator that yields to its caller.
+    """
+    finished = Span(name, attributes)
+    finished.start, finished.end = start, time.perf_counter()
+    if not settings.TELEMETRY_ENABLED:
+        return finished
+    STAGE_SECONDS.observe(finished.duration, span=name)
+    parent = _current_span.get()
+    if parent is not None:
+        parent.add_child(finished)
+    else:
+        _write_json_log(finished)
+    return finished
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wraps fn so that, when it runs on a worker thread, its spans nest under the span
+    that was active where bind() was called. Context variables do not cross into
+    thread pools on their own.
+    """
+    parent = _current_span.get()
+    trace_ = _current_trace.get()
+
+    def run(*args, **kwargs):
+        span_token = _current_span.set(parent)
+        trace_token = _current_trace.set(trace_)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+    return run
@@ -0,0 +1,56 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Iterator, Tuple
+import numpy as np
+
+
+class VectorStoreBackend(ABC):
+    """
+    Storage and search interface behind VectorStoreManager.
+
+    Retrieved chunks are dicts with 'content', 'metadata' and 'distance' (lower is closer),
+    plus 'embedding' when requested. Implementations must keep ids unique: upserting an
+    existing id replaces it.
+    """
+
+    name: str = "backend"
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replaces the metadata of stored chunks; ids that don't exist are ignored."""
+
+    @abstractmethod
+    def ids_for_source(self, source: str) -> List[str]:
+        """Returns the ids of every stored chunk whose metadata 'source' equals `source`."""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              include_embeddings: bool = False) -> List[List[Dict[str, Any]]]:
+        """Searches with several query embeddings at once; returns one ranked result list per query."""
+
+    @abstractmethod
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Fetches stored chunks by id, in the order given; missing ids are skipped."""
+
+    @abstractmethod
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], List[str]]]:
+        """Yields (ids, documents) batches covering the whole store."""
+
+    @abstractmethod
+    def export_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+        """Yields (ids, float32 embedding matrix, documents, metadatas) batches covering the whole store."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def reset(self):
+        """Removes everything from the store."""
@@ -0,0 +1,199 @@
+import logging
+import math
+import os
+import pickle
+import re
+from array import array
+from typing import List, Dict, Tuple
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers, acronyms and numbers such as "gpt-4", "v1.2" or "3.14" as single tokens
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index with BM25 scoring, kept in sync with the vector store.
+
+    Each document gets an integer slot. Postings are compact `array` columns of slots and
+    term frequencies that are appended to as documents arrive; deletions leave tombstones
+    that are compacted away once they make up a quarter of the slots. Scoring reads the
+    postings as NumPy views and accumulates scores in one vectorized pass per query term.
+    """
+
+    def __init__(self, path: str = settings.BM25_INDEX_PATH, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.dirty = False # In-memory changes not yet saved
+        self._reset_state()
+        self._load()
+
+    def _reset_state(self):
+        self.slot_ids: List[str] = []            # slot -> chunk id (None once deleted)
+        self.id_to_slot: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.postings: Dict[str, Tuple[array, array]] = {}  # term -> (slots, term frequencies)
+        self.total_length = 0
+        self.deleted = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            self.slot_ids = state["slot_ids"]
+            self.doc_lengths = state["doc_lengths"]
+            self.postings = state["postings"]
+            self.total_length = state["total_length"]
+            self.deleted = state["deleted"]
+            self.id_to_slot = {chunk_id: slot for slot, chunk_id in enumerate(self.slot_ids) if chunk_id is not None}
+        except Exception as e:
+            logger.warning("Could not read BM25 index %s, starting fresh: %s", self.path, e)
+            self._reset_state()
+
+    def _mark_dirty(self):
+        """
+        Called on the first change after a save. The saved file no longer matches, so it is
+        removed: if the process dies before the next save, the index is rebuilt from the
+        vector store on startup instead of being loaded stale.
+        """
+        if not self.dirty:
+            self.dirty = True
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def flush(self):
+        """Saves the index if it changed since it was last saved."""
+        if self.dirty:
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "slot_ids": self.slot_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+                "total_length": self.total_length,
+                "deleted": self.deleted,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.id_to_slot)
+
+    def add(self, chunk_ids: List[str], texts: List[str]):
+        """Adds or replaces documents."""
+        if chunk_ids:
+            self._mark_dirty()
+        self.delete([chunk_id for chunk_id in chunk_ids if chunk_id in self.id_to_slot])
+        for chunk_id, text in zip(chunk_ids, texts):
+            tokens = tokenize(text)
+            slot = len(self.slot_ids)
+            self.slot_ids.append(chunk_id)
+            self.id_to_slot[chunk_id] = slot
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("I"), array("I"))
+                postings[0].append(slot)
+                postings[1].append(tf)
+
+    def delete(self, chunk_ids: List[str]):
+        """Tombstones documents; postings are cleaned up on compaction."""
+        for chunk_id in chunk_ids:
+            slot = self.id_to_slot.pop(chunk_id, None)
+            if slot is None:
+                continue
+            self._mark_dirty()
+            self.slot_ids[slot] = None
+            self.total_length -= self.doc_lengths[slot]
+            self.doc_lengths[slot] = 0
+            self.deleted += 1
+        if self.slot_ids and self.deleted * 4 > len(self.slot_ids):
+            self._compact()
+
+    def _compact(self):
+        """Renumbers live slots densely and drops postings of deleted documents."""
+        remap = np.full(len(self.slot_ids), -1, dtype=np.int64)
+        live = [slot for slot, chunk_id in enumerate(self.slot_ids) if chunk_id is not None]
+        remap[live] = np.arange(len(live))
+        postings = {}
+        for term, (slots, tfs) in self.postings.items():
+            slot_view = np.frombuffer(slots, dtype=np.uint32) if len(slots) else np.empty(0, dtype=np.uint32)
+            tf_view = np.frombuffer(tfs, dtype=np.uint32) if len(tfs) else np.empty(0, dtype=np.uint32)
+            new_slots = remap[slot_view]
+            keep = new_slots >= 0
+            if keep.any():
+                postings[term] = (array("I", new_slots[keep].astype(np.uint32).tobytes()),
+                                  array("I", tf_view[keep].tobytes()))
+        self.postings = postings
+        self.slot_ids = [self.slot_ids[slot] for slot in live]
+        self.doc_lengths = array("I", [self.doc_lengths[slot] for slot in live])
+        self.id_to_slot = {chunk_id: slot for slot, chunk_id in enumerate(self.slot_ids)}
+        self.deleted = 0
+
+    def clear(self):
+        self._reset_state()
+        self.dirty = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def search(self, query: str, top_k: int = settings.TOP_K_RETRIEVAL) -> List[Tuple[str, float]]:
+        """Returns up to top_k (chunk_id, bm25_score) pairs, best first."""
+        live_docs = len(self.id_to_slot)
+        if not live_docs:
+            return []
+        scores = np.zeros(len(self.slot_ids), dtype=np.float32)
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = self.total_length / live_docs or 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / avg_length)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if postings is None or not len(postings[0]):
+                continue
+            slots = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+            # Tombstoned slots still sit in postings until compaction; mask them out via doc_lengths == 0
+            live = doc_lengths[slots] > 0
+            slots, tfs = slots[live], tfs[live]
+            doc_freq = len(slots)
+            if not doc_freq:
+                continue
+            idf = math.log(1 + (live_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[slots])
+
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.slot_ids[slot], float(scores[slot])) for slot in candidates]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = settings.RRF_K) -> List[Tuple[str, float]]:
+    """Fuses several ranked id lists into one, scoring each id by sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,128 @@
+import logging
+import chromadb
+import numpy as np
+from chromadb.utils import embedding_functions
+from typing import List, Dict, Any, Iterator, Tuple
+from config.settings import settings
+from src.vector_db.base_backend import VectorStoreBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ChromaBackend(VectorStoreBackend):
+    """Backend storing chunks in a persistent ChromaDB collection."""
+
+    name = "chroma"
+
+    def __init__(self, collection_name: str = "research_assistant_collection", path: str = settings.VECTOR_DB_PATH):
+        self.client = chromadb.PersistentClient(path=path)
+        # Using Gemini embedding function directly. Ensure this aligns with your embedding model.
+        # For 'models/embedding-001' it's usually `text-embedding-004` from the genai client.
+        # Chromadb has a built-in GoogleGenerativeAiEmbeddingFunction, but let's integrate ours for control.
+        self.embedding_function = self._get_gemini_embedding_function()
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=self.embedding_function # Pass the embedding function
+        )
+        logger.info("ChromaDB initialized at: %s", path)
+
+    def _get_gemini_embedding_function(self):
+        """Helper to get a custom embedding function for ChromaDB using Gemini."""
+        from src.embeddings.embedding_engine import get_embedding_engine
+
+        class GeminiEmbeddingFunction(embedding_functions.EmbeddingFunction):
+            def __call__(self, texts: embedding_functions.Documents) -> embedding_functions.Embeddings:
+                result = get_embedding_engine().embed_texts(list(texts))
+                if result.failures:
+                    # Chroma needs one embedding per text, so partial results cannot be returned
+                    raise RuntimeError(f"Embedding failed for {len(result.failures)} of {len(texts)} texts: "
+                                       f"{next(iter(result.failures.values()))}")
+                return result.embeddings
+        return GeminiEmbeddingFunction()
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        # ChromaDB expects `documents` for the text content and `embeddings` for the vectors.
+        # It rejects requests larger than its max batch size, so bulk loads are split up.
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.upsert(
+                embeddings=embeddings[start:start + batch_size],
+                documents=documents[start:start + batch_size],
+                metadatas=metadatas[start:start + batch_size],
+                ids=ids[start:start + batch_size]
+            )
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        existing = set(self.collection.get(ids=ids, include=[])['ids']) if ids else set()
+        pairs = [(chunk_id, metadata) for chunk_id, metadata in zip(ids, metadatas) if chunk_id in existing]
+        if pairs:
+            self.collection.update(ids=[chunk_id for chunk_id, _ in pairs], metadatas=[metadata for _, metadata in pairs])
+
+    def ids_for_source(self, source: str) -> List[str]:
+        return self.collection.get(where={"source": source}, include=[])['ids']
+
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              include_embeddings: bool = False) -> List[List[Dict[str, Any]]]:
+        include = ['documents', 'metadatas', 'distances'] # Include content, metadata, and distance
+        if include_embeddings:
+            include.append('embeddings')
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            include=include
+        )
+        # Reformat results for easier consumption
+        all_docs = []
+        for q in range(len(query_embeddings)):
+            retrieved_docs = []
+            if results and results['documents'] and results['metadatas']:
+                for i in range(len(results['documents'][q])):
+                    doc = {
+                        "content": results['documents'][q][i],
+                        "metadata": results['metadatas'][q][i],
+                        "distance": results['distances'][q][i]
+                    }
+                    if include_embeddings:
+                        doc["embedding"] = results['embeddings'][q][i]
+                    retrieved_docs.append(doc)
+            all_docs.append(retrieved_docs)
+        return all_docs
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        include = ['documents', 'metadatas'] + (['embeddings'] if include_embeddings else [])
+        results = self.collection.get(ids=ids, include=include)
+        by_id = {}
+        for i, chunk_id in enumerate(results['ids']):
+            doc = {"content": results['documents'][i], "metadata": results['metadatas'][i]}
+            if include_embeddings:
+                doc["embedding"] = results['embeddings'][i]
+            by_id[chunk_id] = doc
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], List[str]]]:
+        count = self.collection.count()
+        for offset in range(0, count, batch_size):
+            stored = self.collection.get(include=['documents'], limit=batch_size, offset=offset)
+            yield stored['ids'], stored['documents']
+
+    def export_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+        count = self.collection.count()
+        for offset in range(0, count, batch_size):
+            stored = self.collection.get(include=['embeddings', 'documents', 'metadatas'], limit=batch_size, offset=offset)
+            yield stored['ids'], np.asarray(stored['embeddings'], dtype=np.float32), stored['documents'], stored['metadatas']
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(name=self.collection.name)
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection.name,
+            embedding_function=self.embedding_function
+        )
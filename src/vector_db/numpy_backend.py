@@ -0,0 +1,610 @@
+import json
+import logging
+import os
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+import numpy as np
+from config.settings import settings
+from src.vector_db.base_backend import VectorStoreBackend
+from src.vector_db.quantization import create_quantizer, load_quantizer
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 2
+_MANIFEST = "index.json"
+_STRING_COLUMNS = ("ids", "documents", "metadata", "sources")
+# Every data file is named "<logical name>.<n>[.ext]"; the manifest records the current n of each
+_FILES = ("vectors", "deleted", "assignments", "centroids", "codes", "quantizer") + _STRING_COLUMNS
+_LEGACY_FILES = ("store.json", "vectors.npy", "ivf.npz", "quantizer.npz")
+# Deleted and superseded rows are compacted away once they make up this fraction of all rows
+_COMPACT_FRACTION = 0.25
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def train_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(vectors, dtype=np.float32)
+    centroids = data[rng.choice(len(data), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = data[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays useful
+                centroids[c] = data[rng.integers(len(data))]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+def _open_memmap(path: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+    """Read-only memory map of the first `shape` entries of a raw file; np.memmap refuses empty maps."""
+    if 0 in shape:
+        return np.empty(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _append_bytes(path: str, committed: int, data: bytes):
+    """Appends to a file, first dropping anything past `committed` bytes (rows of a write that never committed)."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        if f.seek(0, os.SEEK_END) != committed:
+            f.truncate(committed)
+            f.seek(committed)
+        f.write(data)
+
+
+class _ArrayLog:
+    """Append-only array of fixed-size rows in a raw file, memory-mapped up to `rows`."""
+
+    def __init__(self, path: str, dtype, width: Optional[int] = None, rows: int = 0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.open(rows)
+
+    def open(self, rows: int):
+        self.rows = rows
+        self.data = _open_memmap(self.path, self.dtype, (rows,) if self.width is None else (rows, self.width))
+
+    def append(self, values: np.ndarray):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        _append_bytes(self.path, self.data.nbytes, values.tobytes())
+        self.open(self.rows + len(values))
+
+
+class _StringLog:
+    """
+    Append-only string column: one UTF-8 blob plus the end offset of every row, both
+    memory-mapped, so opening it reads nothing and a slice decodes only its own bytes.
+    """
+
+    def __init__(self, path: str, rows: int = 0):
+        self.ends = _ArrayLog(f"{path}.ends", np.int64, rows=rows)
+        self.blob = _ArrayLog(f"{path}.utf8", np.uint8, rows=int(self.ends.data[-1]) if rows else 0)
+
+    def __len__(self) -> int:
+        return self.ends.rows
+
+    def __getitem__(self, row: int) -> str:
+        start = int(self.ends.data[row - 1]) if row else 0
+        return self.blob.data[start:int(self.ends.data[row])].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        base = int(self.ends.data[start - 1]) if start else 0
+        offsets = [0] + (np.asarray(self.ends.data[start:stop]) - base).tolist()
+        data = self.blob.data[base:base + offsets[-1]].tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(stop - start)]
+
+    def append(self, values: List[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        size = self.blob.rows
+        self.blob.append(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.ends.append(size + np.cumsum([len(value) for value in encoded], dtype=np.int64))
+
+
+class NumpyBackend(VectorStoreBackend):
+    """
+    Local vector index: memory-mapped, append-only columns of unit-normalized float32/float16
+    vectors, ids, documents and metadata.
+
+    Search is an exact, vectorized brute-force matrix multiply over all rows, for any
+    number of queries at once. With `ivf_lists` > 0 a coarse quantizer (spherical k-means)
+    partitions the rows and each query only scans its `ivf_nprobe` nearest lists.
+    With `quantization` set to "int8" or "pq", compressed codes are searched first; the best
+    `top_k * rerank_factor` candidates are then re-ranked against the full-precision vectors.
+    Distances are cosine distances (1 - cosine similarity).
+
+    Layout of the index directory:
+      index.json                         format version, dtype, dimension, committed row and tombstone counts, current file names
+      vectors.<n>                        raw (rows, dim) matrix, one row per written chunk
+      ids.<n>, documents.<n>, sources.<n>     string columns (.utf8 blob + .ends offsets)
+      metadata.<n>                       string column of one JSON object per row
+      deleted.<n>                        int64 rows that were deleted or superseded by a later upsert
+      centroids.<n>.npy, assignments.<n>     IVF centroids and the list of every row
+      quantizer.<n>.npz, codes.<n>           quantizer parameters and the compressed code of every row
+
+    Writes only ever append rows (an upsert of an existing id appends it again and tombstones
+    the old row), then atomically replace index.json. Data past the committed counts is
+    ignored and overwritten, so a write interrupted at any point leaves the previous state
+    readable. Tombstoned rows are compacted away into new files once they make up a quarter
+    of the rows, and retraining writes new IVF/quantizer files; files the manifest no longer
+    names are removed after it is replaced.
+    """
+
+    name = "numpy"
+
+    def __init__(self,
+                 path: str = settings.NUMPY_INDEX_PATH,
+                 dtype: str = settings.NUMPY_VECTOR_DTYPE,
+                 ivf_lists: int = settings.NUMPY_IVF_LISTS,
+                 ivf_nprobe: int = settings.NUMPY_IVF_NPROBE,
+                 quantization: str = settings.NUMPY_QUANTIZATION,
+                 pq_subvectors: int = settings.NUMPY_PQ_SUBVECTORS,
+                 rerank_factor: int = settings.NUMPY_RERANK_FACTOR):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = max(1, ivf_nprobe)
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.rerank_factor = max(1, rerank_factor)
+        self._clear_state()
+        self._load()
+        logger.info("NumPy vector index initialized at: %s (%d vectors)", path, self.count())
+
+    # ---- persistence -------------------------------------------------------------------
+
+    def _clear_state(self):
+        self.files: Dict[str, str] = {} # logical file -> current file name
+        self._seq = 0
+        self._obsolete = False # Files were replaced; the old ones are removed after the next commit
+        self.dim: Optional[int] = None
+        self.rows = 0 # Rows written, including deleted and superseded ones
+        self.live = np.zeros(0, dtype=bool)
+        self.id_to_row: Dict[str, int] = {}
+        self._rows_by_source: Optional[Dict[str, set]] = None # Built on first use
+        self._vectors: Optional[_ArrayLog] = None
+        self._ids, self._documents, self._metadata, self._sources = (_StringLog(self._new_file(name)) for name in _STRING_COLUMNS)
+        self._deleted = _ArrayLog(self._new_file("deleted"), np.int64)
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[_ArrayLog] = None
+        self.trained_size = 0
+        self.quantizer = None
+        self._codes: Optional[_ArrayLog] = None
+        self.quantizer_trained_size = 0
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        """Memory map of every written row; rows whose `live` flag is off were deleted or superseded."""
+        return self._vectors.data if self._vectors is not None else None
+
+    @property
+    def assignments(self) -> Optional[np.ndarray]:
+        return self._assignments.data if self._assignments is not None else None
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        return self._codes.data if self._codes is not None else None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _new_file(self, logical: str) -> str:
+        """Allocates a fresh file name for `logical`; the one it replaces becomes obsolete."""
+        self._seq += 1
+        if logical in self.files:
+            self._obsolete = True
+        self.files[logical] = f"{logical}.{self._seq}"
+        return self._file(self.files[logical])
+
+    def _drop(self, *logical: str):
+        for name in logical:
+            if self.files.pop(name, None) is not None:
+                self._obsolete = True
+
+    def _load(self):
+        if not os.path.exists(self._file(_MANIFEST)):
+            if os.path.exists(self._file("store.json")):
+                self._migrate_v1()
+            return
+        with open(self._file(_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.files = manifest["files"]
+        self._seq = manifest["seq"]
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self.rows = manifest["rows"]
+        self._remove_unreferenced()
+        self._ids, self._documents, self._metadata, self._sources = (
+            _StringLog(self._file(self.files[name]), self.rows) for name in _STRING_COLUMNS)
+        self._deleted = _ArrayLog(self._file(self.files["deleted"]), np.int64, rows=manifest["deleted"])
+        if self.dim is not None:
+            self._vectors = _ArrayLog(self._file(self.files["vectors"]), self.dtype, self.dim, self.rows)
+        self.live = np.ones(self.rows, dtype=bool)
+        self.live[np.asarray(self._deleted.data)] = False
+        self._index_ids()
+        if "centroids" in self.files:
+            if self.ivf_lists > 0:
+                self.centroids = np.load(self._file(self.files["centroids"]) + ".npy")
+                self._assignments = _ArrayLog(self._file(self.files["assignments"]), np.int32, rows=self.rows)
+                self.trained_size = manifest["ivf_trained_size"]
+            else:
+                self._drop("centroids", "assignments")
+        if "quantizer" in self.files:
+            if manifest["quantization"] == self.quantization:
+                stored = np.load(self._file(self.files["quantizer"]) + ".npz")
+                self.quantizer = load_quantizer(self.quantization, stored)
+                self._codes = _ArrayLog(self._file(self.files["codes"]), np.uint8,
+                                        self.quantizer.bytes_per_vector(self.dim), self.rows)
+                self.quantizer_trained_size = manifest["quantizer_trained_size"]
+            else:
+                self._drop("quantizer", "codes")
+        if self.quantization != "none" and self.quantizer is None and self.count():
+            self._update_quantizer(None)
+
+    def _index_ids(self):
+        """Maps every live id to its row; only the id column is read, documents and metadata stay on disk."""
+        self.id_to_row = {}
+        for start in range(0, self.rows, 65536):
+            block = self.live[start:start + 65536]
+            for offset, chunk_id in enumerate(self._ids.slice(start, start + 65536)):
+                if block[offset]:
+                    self.id_to_row[chunk_id] = start + offset
+
+    def _migrate_v1(self):
+        """Rewrites an index saved in the old single-file format (store.json + vectors.npy) in the current layout."""
+        logger.info("Converting NumPy index at %s to the append-only format...", self.path)
+        with open(self._file("store.json"), "r", encoding="utf-8") as f:
+            store = json.load(f)
+        ids, documents, metadata = store["ids"], store["documents"], store["metadata"]
+        if ids:
+            vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+            self.dtype = vectors.dtype
+            for start in range(0, len(ids), 65536):
+                rows = range(start, min(start + 65536, len(ids)))
+                self._append(ids[start:start + 65536], np.asarray(vectors[start:start + 65536]),
+                             documents[start:start + 65536],
+                             [{key: column[row] for key, column in metadata.items() if column[row] is not None}
+                              for row in rows])
+        else:
+            self._commit()
+        for name in _LEGACY_FILES:
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+
+    def _commit(self):
+        """Atomically records the current row counts and file names; until then, appended rows are invisible on disk."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(_MANIFEST + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": _FORMAT_VERSION,
+                "dtype": self.dtype.name,
+                "dim": self.dim,
+                "rows": self.rows,
+                "deleted": self._deleted.rows,
+                "seq": self._seq,
+                "files": self.files,
+                "ivf_trained_size": self.trained_size,
+                "quantization": self.quantization if self.quantizer is not None else "none",
+                "quantizer_trained_size": self.quantizer_trained_size,
+            }, f)
+        os.replace(self._file(_MANIFEST + ".tmp"), self._file(_MANIFEST))
+        if self._obsolete:
+            self._remove_unreferenced()
+            self._obsolete = False
+        if self._deleted.rows > _COMPACT_FRACTION * self.rows:
+            self._compact()
+
+    def _remove_unreferenced(self):
+        """Removes index files the manifest does not name: replaced ones, and leftovers of interrupted rewrites."""
+        if not os.path.isdir(self.path):
+            return
+        referenced = set(self.files.values())
+        prefixes = set(_FILES) | {os.path.splitext(name)[0] for name in _LEGACY_FILES} | {_MANIFEST.split(".")[0]}
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if name != _MANIFEST and parts[0] in prefixes and ".".join(parts[:2]) not in referenced:
+                os.remove(self._file(name))
+
+    def _compact(self):
+        """Rewrites the index without deleted and superseded rows, under new file names."""
+        logger.info("Compacting NumPy index at %s (%d of %d rows deleted)...", self.path, self._deleted.rows, self.rows)
+        old_vectors, old_strings = self.vectors, [self._ids, self._documents, self._metadata, self._sources]
+        old_assignments, old_codes = self.assignments, self.codes
+        self._vectors = _ArrayLog(self._new_file("vectors"), self.dtype, self.dim)
+        strings = [_StringLog(self._new_file(name)) for name in _STRING_COLUMNS]
+        if old_assignments is not None:
+            self._assignments = _ArrayLog(self._new_file("assignments"), np.int32)
+        if old_codes is not None:
+            self._codes = _ArrayLog(self._new_file("codes"), np.uint8, old_codes.shape[1])
+        for start in range(0, self.rows, 65536):
+            stop = min(start + 65536, self.rows)
+            kept = np.flatnonzero(self.live[start:stop])
+            self._vectors.append(old_vectors[start:stop][kept])
+            for old, new in zip(old_strings, strings):
+                values = old.slice(start, stop)
+                new.append([values[i] for i in kept])
+            if old_assignments is not None:
+                self._assignments.append(old_assignments[start:stop][kept])
+            if old_codes is not None:
+                self._codes.append(old_codes[start:stop][kept])
+        self._ids, self._documents, self._metadata, self._sources = strings
+        self._deleted = _ArrayLog(self._new_file("deleted"), np.int64)
+        self.rows = self._vectors.rows
+        self.live = np.ones(self.rows, dtype=bool)
+        self._rows_by_source = None
+        self._index_ids()
+        self._commit()
+
+    # ---- mutation ----------------------------------------------------------------------
+
+    def _row_metadata(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._metadata[row])
+
+    def _append(self, ids: List[str], vectors: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Writes chunks as new rows, tombstones the rows they replace and commits."""
+        # An id repeated within the batch: the later occurrence wins
+        latest = sorted({chunk_id: i for i, chunk_id in enumerate(ids)}.values())
+        ids = [ids[i] for i in latest]
+        vectors = np.asarray(vectors, dtype=self.dtype)[latest]
+        documents = [documents[i] for i in latest]
+        metadatas = [metadatas[i] for i in latest]
+        os.makedirs(self.path, exist_ok=True)
+        if self._vectors is None:
+            self.dim = vectors.shape[1]
+            self._vectors = _ArrayLog(self._new_file("vectors"), self.dtype, self.dim)
+        start = self.rows
+        self._vectors.append(vectors)
+        self._ids.append(ids)
+        self._documents.append(documents)
+        self._metadata.append([json.dumps(metadata) for metadata in metadatas])
+        self._sources.append([str(metadata.get("source", "")) for metadata in metadatas])
+        self.rows += len(ids)
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        self._tombstone([self.id_to_row[chunk_id] for chunk_id in ids if chunk_id in self.id_to_row])
+        for row, (chunk_id, metadata) in enumerate(zip(ids, metadatas), start):
+            self.id_to_row[chunk_id] = row
+            if self._rows_by_source is not None:
+                self._rows_by_source.setdefault(str(metadata.get("source", "")), set()).add(row)
+        self._update_ivf(vectors)
+        self._update_quantizer(vectors)
+        self._commit()
+
+    def _tombstone(self, rows: List[int]):
+        if not rows:
+            return
+        self._deleted.append(np.asarray(rows, dtype=np.int64))
+        self.live[rows] = False
+        if self._rows_by_source is not None:
+            for row in rows:
+                self._rows_by_source.get(self._sources[row], set()).discard(row)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32)).astype(self.dtype)
+        self._append(list(ids), vectors, list(documents), list(metadatas))
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        found = [(chunk_id, self.id_to_row[chunk_id], metadata)
+                 for chunk_id, metadata in zip(ids, metadatas) if chunk_id in self.id_to_row]
+        if not found:
+            return
+        # Rows are never rewritten in place, so the chunks are appended again with their new metadata
+        rows = [row for _, row, _ in found]
+        self._append([chunk_id for chunk_id, _, _ in found], np.asarray(self.vectors[rows]),
+                     [self._documents[row] for row in rows], [metadata for _, _, metadata in found])
+
+    def delete(self, ids: List[str]):
+        rows = [self.id_to_row.pop(chunk_id) for chunk_id in dict.fromkeys(ids) if chunk_id in self.id_to_row]
+        if not rows:
+            return
+        self._tombstone(rows)
+        self._commit()
+
+    def reset(self):
+        if os.path.exists(self._file(_MANIFEST)):
+            os.remove(self._file(_MANIFEST))
+        self.files = {}
+        self._remove_unreferenced()
+        self._clear_state()
+
+    # ---- coarse quantizer --------------------------------------------------------------
+
+    def _training_sample(self, size: int = 100_000) -> np.ndarray:
+        """
+        Float32 copy of at most `size` random live rows. Centroids and codebooks are trained on
+        this; their quality saturates long before the full corpus is used, and the full matrix
+        never has to be held in memory at full precision.
+        """
+        live_rows = np.flatnonzero(self.live)
+        sample_rows = np.random.default_rng(0).choice(live_rows, size=min(len(live_rows), size), replace=False)
+        return np.asarray(self.vectors[np.sort(sample_rows)], dtype=np.float32)
+
+    def _update_ivf(self, new_vectors: np.ndarray):
+        """
+        (Re)trains the coarse quantizer when the index has doubled since the last training;
+        otherwise only assigns the rows that were just written to their nearest list.
+        """
+        if self.ivf_lists <= 0 or self.vectors is None:
+            return
+        total = self.count()
+        # Roughly 40 points per list are needed for k-means to give meaningful partitions
+        if total < self.ivf_lists * 40:
+            self.centroids = self._assignments = None
+            self._drop("centroids", "assignments")
+            return
+        if self.centroids is None or total > 2 * self.trained_size:
+            logger.info("Training IVF coarse quantizer with %d lists on %d vectors...", self.ivf_lists, total)
+            self.centroids = train_kmeans(self._training_sample(), self.ivf_lists)
+            self.trained_size = total
+            np.save(self._new_file("centroids") + ".npy", self.centroids)
+            self._assignments = _ArrayLog(self._new_file("assignments"), np.int32)
+            for start in range(0, self.rows, 65536):
+                self._assignments.append(self._assign(self.vectors[start:start + 65536]))
+        else:
+            self._assignments.append(self._assign(new_vectors))
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            block = np.asarray(vectors[start:start + 65536], dtype=np.float32)
+            assignments[start:start + 65536] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    # ---- compressed codes --------------------------------------------------------------
+
+    def _update_quantizer(self, new_vectors: Optional[np.ndarray]):
+        """(Re)trains the quantizer when the index has doubled since training; otherwise encodes the written rows."""
+        if self.quantization == "none" or self.vectors is None:
+            return
+        total = self.count()
+        if self.quantizer is None or total > 2 * self.quantizer_trained_size:
+            logger.info("Training %s quantizer on %d vectors...", self.quantization, total)
+            self.quantizer = create_quantizer(self.quantization, self.pq_subvectors).train(self._training_sample())
+            self.quantizer_trained_size = total
+            with open(self._new_file("quantizer") + ".npz", "wb") as f:
+                np.savez(f, kind=self.quantization, **self.quantizer.to_arrays())
+            self._codes = _ArrayLog(self._new_file("codes"), np.uint8, self.quantizer.bytes_per_vector(self.dim))
+            for start in range(0, self.rows, 65536):
+                self._codes.append(self.quantizer.encode(np.asarray(self.vectors[start:start + 65536], dtype=np.float32)))
+        else:
+            self._codes.append(self.quantizer.encode(np.asarray(new_vectors, dtype=np.float32)))
+
+    # ---- search ------------------------------------------------------------------------
+
+    def _similarities(self, rows: Optional[np.ndarray], queries: np.ndarray) -> np.ndarray:
+        """Cosine similarities of (a subset of) stored rows against the unit query matrix, computed in blocks."""
+        source = self.vectors if rows is None else self.vectors[rows]
+        scores = np.empty((len(source), len(queries)), dtype=np.float32)
+        for start in range(0, len(source), 65536):
+            block = np.asarray(source[start:start + 65536], dtype=np.float32)
+            scores[start:start + 65536] = block @ queries.T
+        return scores
+
+    def _top_k(self, scores: np.ndarray, top_k: int) -> np.ndarray:
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        return best[np.argsort(-scores[best])]
+
+    def _result(self, row: int, score: float, include_embeddings: bool) -> Dict[str, Any]:
+        doc = {
+            "content": self._documents[row],
+            "metadata": self._row_metadata(row),
+            "distance": float(1.0 - score),
+        }
+        if include_embeddings:
+            doc["embedding"] = np.asarray(self.vectors[row], dtype=np.float32).tolist()
+        return doc
+
+    def _rerank(self, rows: np.ndarray, approx_scores: np.ndarray, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Shortlists rows by approximate score, then re-scores the shortlist against full-precision vectors."""
+        shortlist = self._top_k(approx_scores, top_k * self.rerank_factor)
+        # Sorted fancy indexing on the memory map only pages in the shortlisted rows
+        candidate_rows = np.sort(rows[shortlist])
+        candidate_rows = candidate_rows[self.live[candidate_rows]]
+        exact = np.asarray(self.vectors[candidate_rows], dtype=np.float32) @ query
+        best = self._top_k(exact, top_k)
+        return candidate_rows[best], exact[best]
+
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              include_embeddings: bool = False) -> List[List[Dict[str, Any]]]:
+        if self.vectors is None or not self.id_to_row:
+            return [[] for _ in query_embeddings]
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        quantized = self.quantizer is not None and self.codes is not None
+
+        if self.centroids is not None and self.assignments is not None:
+            results = []
+            coarse = queries @ self.centroids.T
+            nprobe = min(self.ivf_nprobe, len(self.centroids))
+            for q in range(len(queries)):
+                lists = np.argpartition(-coarse[q], nprobe - 1)[:nprobe]
+                rows = np.flatnonzero(np.isin(self.assignments, lists) & self.live)
+                if quantized:
+                    approx = self.quantizer.inner_products(self.codes[rows], queries[q:q + 1])[:, 0]
+                    best_rows, best_scores = self._rerank(rows, approx, queries[q], top_k)
+                else:
+                    scores = self._similarities(rows, queries[q:q + 1])[:, 0]
+                    best = self._top_k(scores, top_k)
+                    best_rows, best_scores = rows[best], scores[best]
+                results.append([self._result(int(row), score, include_embeddings)
+                                for row, score in zip(best_rows, best_scores)])
+            return results
+
+        if quantized:
+            all_rows = np.arange(self.rows)
+            approx = self.quantizer.inner_products(self.codes, queries)
+            approx[~self.live] = -np.inf
+            results = []
+            for q in range(len(queries)):
+                best_rows, best_scores = self._rerank(all_rows, approx[:, q], queries[q], top_k)
+                results.append([self._result(int(row), score, include_embeddings)
+                                for row, score in zip(best_rows, best_scores)])
+            return results
+
+        scores = self._similarities(None, queries)
+        scores[~self.live] = -np.inf
+        top_k = min(top_k, self.count())
+        return [
+            [self._result(int(i), scores[i, q], include_embeddings) for i in self._top_k(scores[:, q], top_k)]
+            for q in range(len(queries))
+        ]
+
+    # ---- lookups -----------------------------------------------------------------------
+
+    def ids_for_source(self, source: str) -> List[str]:
+        if self._rows_by_source is None:
+            self._rows_by_source = {}
+            for start in range(0, self.rows, 65536):
+                block = self.live[start:start + 65536]
+                for offset, value in enumerate(self._sources.slice(start, start + 65536)):
+                    if block[offset]:
+                        self._rows_by_source.setdefault(value, set()).add(start + offset)
+        return [self._ids[row] for row in sorted(self._rows_by_source.get(source, ()))]
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        docs = []
+        for chunk_id in ids:
+            row = self.id_to_row.get(chunk_id)
+            if row is not None:
+                doc = {"content": self._documents[row], "metadata": self._row_metadata(row)}
+                if include_embeddings:
+                    doc["embedding"] = np.asarray(self.vectors[row], dtype=np.float32).tolist()
+                docs.append(doc)
+        return docs
+
+    def _live_blocks(self, batch_size: int) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """Yields (start, stop, offsets of the live rows in start:stop) for every block that has any."""
+        for start in range(0, self.rows, batch_size):
+            stop = min(start + batch_size, self.rows)
+            kept = np.flatnonzero(self.live[start:stop])
+            if len(kept):
+                yield start, stop, kept
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], List[str]]]:
+        for start, stop, kept in self._live_blocks(batch_size):
+            ids, documents = self._ids.slice(start, stop), self._documents.slice(start, stop)
+            yield [ids[i] for i in kept], [documents[i] for i in kept]
+
+    def export_batches(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+        for start, stop, kept in self._live_blocks(batch_size):
+            ids, documents = self._ids.slice(start, stop), self._documents.slice(start, stop)
+            metadatas = self._metadata.slice(start, stop)
+            yield ([ids[i] for i in kept],
+                   np.asarray(self.vectors[start:stop][kept], dtype=np.float32),
+                   [documents[i] for i in kept],
+                   [json.loads(metadatas[i]) for i in kept])
+
+    def count(self) -> int:
+        return len(self.id_to_row)
@@ -0,0 +1,227 @@
+import argparse
+import time
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+
+def kmeans(data: np.ndarray, n_clusters: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """Plain Euclidean k-means; returns (n_clusters, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), size=n_clusters, replace=False)].copy()
+    data_norms = (data ** 2).sum(axis=1, keepdims=True)
+    for _ in range(iterations):
+        distances = data_norms - 2 * data @ centroids.T + (centroids ** 2).sum(axis=1)
+        assignments = np.argmin(distances, axis=1)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.integers(len(data), size=len(empty))]
+    return centroids
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension 8-bit scalar quantizer: x ~= offset + scale * code, code in 0..255.
+    Inner products against the codes are computed asymmetrically (full-precision query).
+    """
+
+    kind = "int8"
+
+    def __init__(self, offset: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.offset = offset
+        self.scale = scale
+
+    def train(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-12) / 255.0
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return np.clip(np.rint((vectors - self.offset) / self.scale), 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + codes.astype(np.float32) * self.scale
+
+    def inner_products(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """(n, b) approximate inner products between coded rows and unit queries."""
+        scaled = queries * self.scale
+        bias = queries @ self.offset
+        scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+        for start in range(0, len(codes), 65536):
+            scores[start:start + 65536] = codes[start:start + 65536].astype(np.float32) @ scaled.T + bias
+        return scores
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ScalarQuantizer":
+        return cls(arrays["offset"], arrays["scale"])
+
+
+class ProductQuantizer:
+    """
+    Product quantizer: vectors are split into `n_subvectors` slices and each slice is
+    replaced by the index of its nearest centroid in a trained 256-entry codebook.
+    Search uses per-query lookup tables (asymmetric distance computation).
+    """
+
+    kind = "pq"
+
+    def __init__(self, n_subvectors: int = 96, codebooks: Optional[np.ndarray] = None):
+        self.n_subvectors = n_subvectors
+        self.codebooks = codebooks # (n_subvectors, n_centroids, sub_dim)
+
+    @staticmethod
+    def fit_subvectors(dim: int, requested: int) -> int:
+        """Largest divisor of dim that does not exceed the requested number of subvectors."""
+        for m in range(min(requested, dim), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    def train(self, vectors: np.ndarray, iterations: int = 15) -> "ProductQuantizer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.n_subvectors = self.fit_subvectors(vectors.shape[1], self.n_subvectors)
+        sub_dim = vectors.shape[1] // self.n_subvectors
+        n_centroids = min(256, len(vectors))
+        self.codebooks = np.stack([
+            kmeans(vectors[:, j * sub_dim:(j + 1) * sub_dim], n_centroids, iterations, seed=j)
+            for j in range(self.n_subvectors)
+        ])
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.n_subvectors), dtype=np.uint8)
+        for j in range(self.n_subvectors):
+            sub = vectors[:, j * sub_dim:(j + 1) * sub_dim]
+            book = self.codebooks[j]
+            distances = (sub ** 2).sum(axis=1, keepdims=True) - 2 * sub @ book.T + (book ** 2).sum(axis=1)
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.n_subvectors)], axis=1)
+
+    def inner_products(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        sub_dim = self.codebooks.shape[2]
+        scores = np.zeros((len(codes), len(queries)), dtype=np.float32)
+        for j in range(self.n_subvectors):
+            # (b, n_centroids) table of query-slice x centroid inner products
+            table = queries[:, j * sub_dim:(j + 1) * sub_dim] @ self.codebooks[j].T
+            scores += table[:, codes[:, j]].T
+        return scores
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.n_subvectors
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ProductQuantizer":
+        codebooks = arrays["codebooks"]
+        return cls(codebooks.shape[0], codebooks)
+
+
+def create_quantizer(kind: str, n_subvectors: int = 96):
+    if kind == "int8":
+        return ScalarQuantizer()
+    if kind == "pq":
+        return ProductQuantizer(n_subvectors)
+    raise ValueError(f"Unknown quantization mode: {kind!r} (expected 'none', 'int8' or 'pq')")
+
+
+def load_quantizer(kind: str, arrays):
+    return ScalarQuantizer.from_arrays(arrays) if kind == "int8" else ProductQuantizer.from_arrays(arrays)
+
+
+def recall_memory_report(vectors: np.ndarray,
+                         queries: np.ndarray,
+                         top_k: int = 10,
+                         rerank_factors: List[int] = (1, 4, 10),
+                         pq_subvectors: List[int] = (16, 32, 96)) -> List[Dict[str, Any]]:
+    """
+    Measures recall@k against exact float32 search, and memory, for each quantization setting.
+    `vectors` and `queries` should be unit-normalized. Queries must not be rows of `vectors`:
+    an indexed query is its own nearest neighbour with a near-perfect approximate score, which
+    inflates recall.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    dim = vectors.shape[1]
+    exact_scores = vectors @ queries.T
+    exact = [set(np.argsort(-exact_scores[:, q])[:top_k]) for q in range(len(queries))]
+
+    rows = [{"mode": "float32", "rerank_factor": None, "bytes_per_vector": dim * 4,
+             "index_bytes": vectors.shape[0] * dim * 4, "recall": 1.0, "query_ms": None}]
+    quantizers = [ScalarQuantizer()] + [ProductQuantizer(m) for m in pq_subvectors]
+    for quantizer in quantizers:
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+        for factor in rerank_factors:
+            start = time.perf_counter()
+            approx = quantizer.inner_products(codes, queries)
+            hits = 0
+            for q in range(len(queries)):
+                shortlist = min(len(vectors), top_k * factor)
+                candidates = np.argpartition(-approx[:, q], shortlist - 1)[:shortlist]
+                reranked = candidates[np.argsort(-(vectors[candidates] @ queries[q]))][:top_k]
+                hits += len(exact[q] & set(reranked))
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+            label = quantizer.kind if quantizer.kind == "int8" else f"pq{quantizer.n_subvectors}"
+            rows.append({
+                "mode": label,
+                "rerank_factor": factor,
+                "bytes_per_vector": quantizer.bytes_per_vector(dim),
+                "index_bytes": codes.nbytes,
+                "recall": hits / (len(queries) * top_k),
+                "query_ms": elapsed,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. memory report for quantized vector storage.")
+    parser.add_argument("--index", default=None, help="NumPy backend directory (defaults to NUMPY_INDEX_PATH)")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors held out of the index and used as queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from config.settings import settings
+    from src.vector_db.numpy_backend import NumpyBackend
+    # Opened without IVF or quantization; the index on disk is only read, never rewritten
+    backend = NumpyBackend(path=args.index or settings.NUMPY_INDEX_PATH, ivf_lists=0, quantization="none")
+    if not backend.count():
+        parser.error(f"No vectors in the NumPy index at {backend.path}")
+    rows = np.flatnonzero(backend.live)
+    held_out = np.zeros(len(rows), dtype=bool)
+    held_out[np.random.default_rng(0).choice(len(rows), size=min(args.queries, len(rows) // 2), replace=False)] = True
+    queries = np.asarray(backend.vectors[rows[held_out]], dtype=np.float32)
+    vectors = np.asarray(backend.vectors[rows[~held_out]], dtype=np.float32)
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.top_k}")
+    print(f"{'mode':<8} {'rerank':>6} {'B/vec':>6} {'index MB':>9} {'recall':>7} {'ms/query':>9}")
+    for row in recall_memory_report(vectors, queries, args.top_k):
+        rerank = row["rerank_factor"] or "-"
+        query_ms = f"{row['query_ms']:.2f}" if row["query_ms"] is not None else "-"
+        print(f"{row['mode']:<8} {rerank:>6} {row['bytes_per_vector']:>6} {row['index_bytes'] / 1e6:>9.2f} "
+              f"{row['recall']:>7.3f} {query_ms:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Callable, Tuple
+from config.settings import settings
+from src.vector_db.bm25_index import BM25Index
+from src.vector_db.vector_store_manager import VectorStoreManager, create_backend
+from src.telemetry import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "default"
+_SHARD_NAME_PATTERN = re.compile(r"[^A-Za-z0-9_-]+")
+
+# Shards the current query is restricted to (None = all); see shard_scope()
+_scope: contextvars.ContextVar = contextvars.ContextVar("shard_scope", default=None)
+
+
+@contextlib.contextmanager
+def shard_scope(shards: Optional[Iterable[str]]):
+    """
+    Restricts searches made inside the block (by this thread) to the given shards,
+    e.g. one tenant's documents. None or an empty list searches every shard.
+    """
+    token = _scope.set(tuple(sorted(shards)) if shards else None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def shard_name(raw: str) -> str:
+    """Makes a routing key safe to use in collection names and file paths."""
+    return _SHARD_NAME_PATTERN.sub("_", raw).strip("_")[:48] or DEFAULT_SHARD
+
+
+class ShardRouter:
+    """
+    Decides which shard a chunk belongs to, from its metadata. Every chunk of a file lands
+    in the same shard, so per-file deletes and re-indexing stay within one shard.
+
+    - "tenant": the first folder of the file's path under DATA_DIR (files directly in
+      DATA_DIR go to "default"); a 'tenant' metadata value takes precedence.
+    - "directory": the file's folder relative to DATA_DIR.
+    - "hash": crc32 of the source path modulo num_shards, for even spreading.
+    """
+
+    STRATEGIES = ("tenant", "directory", "hash")
+
+    def __init__(self, strategy: str = settings.VECTOR_DB_SHARDING,
+                 num_shards: int = settings.VECTOR_DB_NUM_SHARDS,
+                 data_dir: str = settings.DATA_DIR):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown sharding strategy: {strategy!r} (expected one of {', '.join(self.STRATEGIES)})")
+        self.strategy = strategy
+        self.num_shards = max(1, num_shards)
+        self.data_dir = data_dir
+
+    def _relative_dir(self, source: str) -> str:
+        relative = os.path.relpath(os.path.abspath(source), os.path.abspath(self.data_dir))
+        if relative.startswith(".."):
+            # Outside DATA_DIR: fall back to the absolute folder
+            return os.path.dirname(os.path.abspath(source))
+        return os.path.dirname(relative)
+
+    def shard_for(self, metadata: Dict[str, Any]) -> str:
+        source = str(metadata.get("source", ""))
+        if self.strategy == "hash":
+            return f"shard_{zlib.crc32(source.encode('utf-8')) % self.num_shards:02d}"
+        if self.strategy == "tenant" and metadata.get("tenant"):
+            return shard_name(str(metadata["tenant"]))
+        folder = self._relative_dir(source)
+        if self.strategy == "tenant":
+            folder = folder.replace("\\", "/").split("/")[0]
+        return shard_name(folder) if folder else DEFAULT_SHARD
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"strategy": self.strategy, "num_shards": self.num_shards}
+
+
+class ShardedVectorStoreManager:
+    """
+    VectorStoreManager over several independent shards (one collection or NumPy index,
+    plus BM25 index, per shard).
+
+    Writes are routed by ShardRouter. Searches go to the shards selected by shard_scope(),
+    or fan out to all shards on a thread pool, and the per-shard rankings (each already
+    sorted) are merged with a heap. Shards found on disk are listed in SHARD_MANIFEST_PATH.
+
+    BM25 statistics are per shard, so merged lexical scores are only approximately
+    comparable across shards; dense distances are exact.
+    """
+
+    def __init__(self, collection_name: str = "research_assistant_collection",
+                 router: ShardRouter = None,
+                 manifest_path: str = settings.SHARD_MANIFEST_PATH,
+                 max_workers: int = settings.SHARD_FANOUT_WORKERS):
+        self.collection_name = collection_name
+        self.manifest_path = manifest_path
+        self.max_workers = max(1, max_workers)
+        self.shards: Dict[str, VectorStoreManager] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Bumped on every write and rebalance; never derived from the shards, which can be dropped
+        self._version = 0
+
+        stored = self._load_manifest()
+        self.router = router or ShardRouter()
+        if stored.get("router") and stored["router"] != self.router.to_dict():
+            logger.warning("Shards were built with routing %s but %s is configured; run rebalance() to move chunks.",
+                           stored["router"], self.router.to_dict())
+        for name in stored.get("shards", []):
+            self._open_shard(name)
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read shard manifest %s: %s", self.manifest_path, e)
+            return {}
+
+    def _save_manifest(self):
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "router": self.router.to_dict(), "shards": sorted(self.shards)}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _open_shard(self, name: str) -> VectorStoreManager:
+        with self._lock:
+            shard = self.shards.get(name)
+            if shard is None:
+                root, extension = os.path.splitext(settings.BM25_INDEX_PATH)
+                shard = VectorStoreManager(
+                    backend=create_backend(collection_name=self.collection_name, shard=name),
+                    lexical_index=BM25Index(f"{root}.{name}{extension}"),
+                )
+                self.shards[name] = shard
+                self._stats[name] = {"queries": 0, "query_seconds": 0.0}
+            return shard
+
+    def _shard_for_write(self, name: str) -> VectorStoreManager:
+        if name in self.shards:
+            return self.shards[name]
+        shard = self._open_shard(name)
+        self._save_manifest()
+        logger.info("Created shard %r.", name)
+        return shard
+
+    # --- Searching -------------------------------------------------------------------
+
+    def _targets(self, shards: Optional[Iterable[str]]) -> List[str]:
+        selected = shards if shards is not None else _scope.get()
+        if not selected:
+            return sorted(self.shards)
+        return [name for name in selected if name in self.shards]
+
+    def _fan_out(self, targets: List[str], fn: Callable[[VectorStoreManager], Any]) -> List[Any]:
+        """Runs fn on each target shard, in parallel when there is more than one; results in target order."""
+        def timed(name):
+            start = time.perf_counter()
+            result = fn(self.shards[name])
+            with self._lock:
+                self._stats[name]["queries"] += 1
+                self._stats[name]["query_seconds"] += time.perf_counter() - start
+            return result
+
+        if len(targets) <= 1 or self.max_workers == 1:
+            return [timed(name) for name in targets]
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard-search")
+        return list(self._executor.map(tracing.bind(timed), targets))
+
+    @staticmethod
+    def _merge(rankings: List[List[Dict[str, Any]]], top_k: int, key: Callable[[Dict[str, Any]], float]) -> List[Dict[str, Any]]:
+        """k-way merge of per-shard rankings that are each sorted by key."""
+        return list(itertools.islice(heapq.merge(*rankings, key=key), top_k))
+
+    def query_documents(self, query_embedding: List[float], top_k: int = settings.TOP_K_RETRIEVAL,
+                        include_embeddings: bool = False, shards: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        return self.query_documents_batch([query_embedding], top_k, include_embeddings, shards)[0]
+
+    def query_documents_batch(self, query_embeddings: List[List[float]], top_k: int = settings.TOP_K_RETRIEVAL,
+                              include_embeddings: bool = False,
+                              shards: Optional[Iterable[str]] = None) -> List[List[Dict[str, Any]]]:
+        if not query_embeddings:
+            return []
+        targets = self._targets(shards)
+        with tracing.span("shards.query", shards=len(targets), top_k=top_k, queries=len(query_embeddings)):
+            per_shard = self._fan_out(targets, lambda shard: shard.query_documents_batch(
+                query_embeddings, top_k, include_embeddings=include_embeddings))
+            return [self._merge([results[q] for results in per_shard], top_k, key=lambda doc: doc["distance"])
+                    for q in range(len(query_embeddings))]
+
+    def lexical_search(self, query: str, top_k: int = settings.TOP_K_RETRIEVAL,
+                       shards: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        targets = self._targets(shards)
+        per_shard = self._fan_out(targets, lambda shard: shard.lexical_search(query, top_k))
+        return self._merge(per_shard, top_k, key=lambda doc: -doc["bm25_score"])
+
+    def get_documents(self, ids: List[str]) -> List[Dict[str, Any]]:
+        found = {}
+        for docs in self._fan_out(sorted(self.shards), lambda shard: shard.get_documents(ids)):
+            for doc in docs:
+                found[doc["metadata"]["chunk_id"]] = doc
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    # --- Writing -------------------------------------------------------------------------
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """Routes each chunk to its shard (recorded in its 'shard' metadata) and adds them shard by shard."""
+        by_shard: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in documents:
+            name = self.router.shard_for(doc["metadata"])
+            doc["metadata"]["shard"] = name
+            by_shard.setdefault(name, []).append(doc)
+        for name, docs in by_shard.items():
+            self._shard_for_write(name).add_documents(docs)
+        self._bump_version()
+
+    def bulk_load(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Routes pre-embedded chunks (`embeddings` is an (n, dim) array) to their shards and bulk-loads each shard once."""
+        rows_by_shard: Dict[str, List[int]] = {}
+        for row, metadata in enumerate(metadatas):
+            name = self.router.shard_for(metadata)
+            metadata["shard"] = name
+            rows_by_shard.setdefault(name, []).append(row)
+        for name, rows in rows_by_shard.items():
+            self._shard_for_write(name).bulk_load([ids[row] for row in rows], embeddings[rows],
+                                                  [documents[row] for row in rows], [metadatas[row] for row in rows])
+        self._bump_version()
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Updates each chunk in the shard named by its 'shard' metadata, or in every shard if that is unknown."""
+        by_shard: Dict[Optional[str], Tuple[List[str], List[Dict[str, Any]]]] = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            name = metadata.get("shard") if metadata.get("shard") in self.shards else None
+            target_ids, target_metadatas = by_shard.setdefault(name, ([], []))
+            target_ids.append(chunk_id)
+            target_metadatas.append(metadata)
+        for name, (target_ids, target_metadatas) in by_shard.items():
+            for shard in ([self.shards[name]] if name is not None else list(self.shards.values())):
+                shard.update_metadata(target_ids, target_metadatas)
+        self._bump_version()
+
+    def partition_for(self, metadata: Dict[str, Any]) -> str:
+        """The shard a chunk is written to; near-duplicate detection never matches across shards."""
+        return self.router.shard_for(metadata)
+
+    def delete_documents_by_source(self, source: str, chunk_ids: List[str] = None):
+        """
+        Deletes the source's chunks from every shard, in case routing changed since they were written.
+        Recorded chunk ids are only deleted where the stored chunk belongs to `source`, so an id
+        shared with another tenant's chunk never removes that chunk.
+        """
+        for shard in self.shards.values():
+            owned = [doc["metadata"]["chunk_id"] for doc in shard.get_documents(chunk_ids or [])
+                     if doc["metadata"].get("source") == source]
+            shard.delete_documents_by_source(source, owned)
+        self._bump_version()
+
+    def flush(self):
+        """Persists every shard's BM25 index (see VectorStoreManager.flush)."""
+        for shard in list(self.shards.values()):
+            shard.flush()
+
+    def reset_collection(self):
+        for shard in self.shards.values():
+            shard.reset_collection()
+        self._bump_version()
+
+    # --- Introspection and maintenance ----------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _bump_version(self):
+        with self._lock:
+            self._version += 1
+
+    @property
+    def cache_scope(self):
+        """The active shard_scope(); caches key results by it so one scope's answer is never served to another."""
+        return _scope.get()
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def sample_embedding(self) -> Optional[List[float]]:
+        for shard in self.shards.values():
+            embedding = shard.sample_embedding()
+            if embedding is not None:
+                return embedding
+        return None
+
+    def shard_names(self) -> List[str]:
+        return sorted(self.shards)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-shard chunk counts and search load."""
+        rows = []
+        with self._lock:
+            for name in sorted(self.shards):
+                queries = self._stats[name]["queries"]
+                rows.append({
+                    "shard": name,
+                    "chunks": self.shards[name].count(),
+                    "queries": queries,
+                    "avg_query_ms": self._stats[name]["query_seconds"] / queries * 1000 if queries else 0.0,
+                })
+        return rows
+
+    def rebalance(self, router: ShardRouter = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Moves every chunk to the shard `router` (default: the configured one) assigns it,
+        e.g. after changing the strategy or VECTOR_DB_NUM_SHARDS. Embeddings are copied,
+        never recomputed. Shards left empty are dropped from the manifest.
+        """
+        if router is not None:
+            self.router = router
+        moved = scanned = 0
+        with tracing.span("shards.rebalance") as rebalance_span:
+            for name in list(self.shards):
+                shard = self.shards[name]
+                with shard.lock.read():
+                    ids = [chunk_id for batch_ids, _ in shard.backend.iter_batches() for chunk_id in batch_ids]
+                scanned += len(ids)
+                for start in range(0, len(ids), batch_size):
+                    with shard.lock.read():
+                        docs = shard.backend.get(ids[start:start + batch_size], include_embeddings=True)
+                    moving: Dict[str, List[Dict[str, Any]]] = {}
+                    for doc in docs:
+                        target = self.router.shard_for(doc["metadata"])
+                        if target != name:
+                            moving.setdefault(target, []).append(doc)
+                    for target, target_docs in moving.items():
+                        for doc in target_docs:
+                            doc["metadata"]["shard"] = target
+                            doc["embedding"] = list(doc["embedding"])
+                        self._shard_for_write(target).add_documents(target_docs)
+                        moved_ids = [doc["metadata"]["chunk_id"] for doc in target_docs]
+                        with shard.lock.write():
+                            shard.backend.delete(moved_ids)
+                            shard.lexical_index.delete(moved_ids)
+                        moved += len(moved_ids)
+                shard.version += 1
+            self.flush()
+            with self._lock:
+                for name in [name for name, shard in self.shards.items() if shard.count() == 0]:
+                    del self.shards[name]
+                    del self._stats[name]
+                self._version += 1
+                self._save_manifest()
+            rebalance_span.set(scanned=scanned, moved=moved, shards=len(self.shards))
+        logger.info("Rebalanced %d chunks: %d moved, %d shards.", scanned, moved, len(self.shards))
+        return {"scanned": scanned, "moved": moved, "shards": len(self.shards)}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
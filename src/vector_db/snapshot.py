@@ -0,0 +1,303 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from src.data_ingestion.ingest_manifest import IngestManifest, compute_file_hash
+from src.vector_db.sharding import ShardedVectorStoreManager
+from src.telemetry import tracing
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+_MANIFEST = "snapshot.json"
+_INGEST_MANIFEST = "ingest_manifest.json"
+_UNSHARDED_PART = "collection"
+
+
+class StringColumn:
+    """
+    Read-only column of strings stored as one UTF-8 blob plus an (n + 1)-entry offsets array,
+    both memory-mapped: opening it reads nothing, and a slice decodes only its own bytes.
+    """
+
+    def __init__(self, offsets_path: str, blob_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        # np.memmap refuses empty files
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.empty(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        stop = min(stop, len(self))
+        offsets = np.asarray(self.offsets[start:stop + 1]) - self.offsets[start]
+        data = self.blob[self.offsets[start]:self.offsets[stop]].tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(stop - start)]
+
+
+class _StringColumnWriter:
+    def __init__(self, offsets_path: str, blob_path: str):
+        self.offsets_path = offsets_path
+        self.offsets = [0]
+        self._blob = open(blob_path, "wb")
+
+    def extend(self, values: List[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        for value in encoded:
+            self.offsets.append(self.offsets[-1] + len(value))
+        self._blob.write(b"".join(encoded))
+
+    def close(self):
+        self._blob.close()
+        np.save(self.offsets_path, np.asarray(self.offsets, dtype=np.int64))
+
+
+class Snapshot:
+    """
+    A vector store snapshot on disk, opened read-only.
+
+    Layout (one directory per shard under `parts/`):
+      snapshot.json                  format version, embedding model, dimension, counts, sha256 of every file
+      ingest_manifest.json           the indexed-files record of the node that exported it (optional)
+      parts/<shard>/vectors.npy      float16 embeddings, one row per chunk
+      parts/<shard>/ids.offsets.npy, ids.utf8
+      parts/<shard>/documents.offsets.npy, documents.utf8
+      parts/<shard>/metadata.json    metadata as columns (one value per row, null if absent)
+
+    Vectors, ids and documents are memory-mapped, so opening a snapshot is instant and only
+    the rows that are read are paged in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest_path = os.path.join(path, _MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No snapshot found at {path} (missing {_MANIFEST})")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        version = self.manifest.get("format_version")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Snapshot {path} has format version {version}; this build reads version {SNAPSHOT_FORMAT_VERSION}")
+
+    @property
+    def parts(self) -> List[str]:
+        return [part["name"] for part in self.manifest["parts"]]
+
+    @property
+    def embedding_model(self) -> str:
+        return self.manifest["embedding_model"]["name"]
+
+    def __len__(self) -> int:
+        return sum(part["count"] for part in self.manifest["parts"])
+
+    def _file(self, part: str, name: str) -> str:
+        return os.path.join(self.path, "parts", part, name)
+
+    def vectors(self, part: str) -> np.ndarray:
+        return np.load(self._file(part, "vectors.npy"), mmap_mode="r")
+
+    def column(self, part: str, name: str) -> StringColumn:
+        return StringColumn(self._file(part, f"{name}.offsets.npy"), self._file(part, f"{name}.utf8"))
+
+    def metadata(self, part: str) -> List[Dict[str, Any]]:
+        with open(self._file(part, "metadata.json"), "r", encoding="utf-8") as f:
+            columns = json.load(f)
+        count = next((part_info["count"] for part_info in self.manifest["parts"] if part_info["name"] == part), 0)
+        return [{key: column[row] for key, column in columns.items() if column[row] is not None} for row in range(count)]
+
+    def ingest_manifest(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.path, _INGEST_MANIFEST)
+        if _INGEST_MANIFEST not in self.manifest["files"]:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_part(self, part: str) -> Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]:
+        """Returns (ids, float16 vectors as a memory map, documents, metadatas) of one part."""
+        ids = self.column(part, "ids")
+        documents = self.column(part, "documents")
+        return ids.slice(0, len(ids)), self.vectors(part), documents.slice(0, len(documents)), self.metadata(part)
+
+    def verify(self):
+        """Checks every file against its recorded size and sha256; raises ValueError on the first mismatch."""
+        for name, info in self.manifest["files"].items():
+            path = os.path.join(self.path, name)
+            if not os.path.exists(path):
+                raise ValueError(f"Snapshot file {name} is missing")
+            if os.path.getsize(path) != info["bytes"] or compute_file_hash(path) != info["sha256"]:
+                raise ValueError(f"Snapshot file {name} is corrupt (checksum mismatch)")
+
+
+def _parts_of(vector_store_manager) -> Dict[str, Any]:
+    if isinstance(vector_store_manager, ShardedVectorStoreManager):
+        return dict(vector_store_manager.shards)
+    return {_UNSHARDED_PART: vector_store_manager}
+
+
+def _export_part(store, directory: str, batch_size: int) -> Tuple[int, int]:
+    """Streams one store's chunks into the part files; returns (rows, dimension)."""
+    os.makedirs(directory, exist_ok=True)
+    ids = _StringColumnWriter(os.path.join(directory, "ids.offsets.npy"), os.path.join(directory, "ids.utf8"))
+    documents = _StringColumnWriter(os.path.join(directory, "documents.offsets.npy"), os.path.join(directory, "documents.utf8"))
+    metadata: Dict[str, List[Any]] = {}
+    # Writes to this store wait until its part is exported
+    with store.lock.read():
+        expected = store.backend.count()
+        vectors = None
+        rows = 0
+        for batch_ids, embeddings, batch_documents, metadatas in store.backend.export_batches(batch_size):
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+",
+                                                    dtype=np.float16, shape=(expected, embeddings.shape[1]))
+            if rows + len(batch_ids) > expected:
+                raise RuntimeError("The vector store changed while it was being exported")
+            halves = embeddings.astype(np.float16)
+            if not np.isfinite(halves).all():
+                raise ValueError("Embedding values exceed the float16 range; they cannot be snapshotted")
+            vectors[rows:rows + len(batch_ids)] = halves
+            ids.extend(batch_ids)
+            documents.extend(batch_documents)
+            for offset, row_metadata in enumerate(metadatas):
+                for key in row_metadata:
+                    if key not in metadata:
+                        metadata[key] = [None] * (rows + offset)
+                for key, column in metadata.items():
+                    column.append(row_metadata.get(key))
+            rows += len(batch_ids)
+    if rows != expected:
+        raise RuntimeError("The vector store changed while it was being exported")
+    ids.close()
+    documents.close()
+    dimension = 0 if vectors is None else vectors.shape[1]
+    if vectors is None:
+        np.save(os.path.join(directory, "vectors.npy"), np.empty((0, 0), dtype=np.float16))
+    else:
+        vectors.flush()
+        del vectors
+    with open(os.path.join(directory, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    return rows, dimension
+
+
+def export_snapshot(vector_store_manager, path: str = settings.SNAPSHOT_PATH,
+                    ingest_manifest: IngestManifest = None,
+                    batch_size: int = 5000) -> Dict[str, Any]:
+    """
+    Writes every chunk of the store (each shard of a sharded one) to a snapshot at `path`
+    and returns its manifest. The snapshot is assembled next to `path` and moved into place
+    once complete, so readers never see a half-written one.
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    start = time.perf_counter()
+    with tracing.span("snapshot.export") as export_span:
+        parts = []
+        dimension = 0
+        for name, store in sorted(_parts_of(vector_store_manager).items()):
+            rows, part_dimension = _export_part(store, os.path.join(tmp_path, "parts", name), batch_size)
+            if dimension and part_dimension and part_dimension != dimension:
+                raise ValueError(f"Shard {name!r} has {part_dimension}-dimensional embeddings, others have {dimension}")
+            dimension = dimension or part_dimension
+            parts.append({"name": name, "count": rows})
+        if ingest_manifest is not None:
+            with open(os.path.join(tmp_path, _INGEST_MANIFEST), "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": ingest_manifest.entries}, f)
+
+        files = {}
+        for root, _, names in os.walk(tmp_path):
+            for file_name in sorted(names):
+                file_path = os.path.join(root, file_name)
+                relative = os.path.relpath(file_path, tmp_path).replace(os.sep, "/")
+                files[relative] = {"bytes": os.path.getsize(file_path), "sha256": compute_file_hash(file_path)}
+        router = getattr(vector_store_manager, "router", None)
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": time.time(),
+            "embedding_model": {"name": settings.GEMINI_EMBEDDING_MODEL, "dimension": dimension},
+            "vector_dtype": "float16",
+            "backend": settings.VECTOR_DB_BACKEND,
+            "sharding": router.to_dict() if router is not None else None,
+            "parts": parts,
+            "files": files,
+        }
+        with open(os.path.join(tmp_path, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        total = sum(part["count"] for part in parts)
+        export_span.set(chunks=total, parts=len(parts), bytes=sum(info["bytes"] for info in files.values()))
+    logger.info("Exported %d chunks in %d part(s) to %s in %.2fs.", total, len(parts), path, time.perf_counter() - start)
+    return manifest
+
+
+def restore_snapshot(vector_store_manager, path: str = settings.SNAPSHOT_PATH,
+                     ingest_manifest: IngestManifest = None,
+                     verify: bool = True) -> Dict[str, Any]:
+    """
+    Replaces the store's contents with a snapshot. No embedding calls are made: vectors are
+    loaded as stored and the BM25 index is rebuilt from the documents. Chunks are routed by
+    the store's current sharding, whatever sharding the snapshot was exported with.
+
+    Refuses snapshots with a bad checksum (when `verify`) or made with a different embedding
+    model, whose vectors would not be comparable to this node's query embeddings.
+    """
+    snapshot = Snapshot(path)
+    if snapshot.embedding_model != settings.GEMINI_EMBEDDING_MODEL:
+        raise ValueError(f"Snapshot {path} was built with {snapshot.embedding_model}, "
+                         f"but GEMINI_EMBEDDING_MODEL is {settings.GEMINI_EMBEDDING_MODEL}")
+    start = time.perf_counter()
+    with tracing.span("snapshot.restore", chunks=len(snapshot), parts=len(snapshot.parts)):
+        if verify:
+            with tracing.span("snapshot.verify"):
+                snapshot.verify()
+        vector_store_manager.reset_collection()
+        for part in snapshot.parts:
+            ids, vectors, documents, metadatas = snapshot.read_part(part)
+            if ids:
+                vector_store_manager.bulk_load(ids, vectors, documents, metadatas)
+        if ingest_manifest is not None:
+            stored = snapshot.ingest_manifest()
+            ingest_manifest.load_entries(stored["files"] if stored else {})
+            ingest_manifest.save()
+    logger.info("Restored %d chunks from %s in %.2fs.", len(snapshot), path, time.perf_counter() - start)
+    return snapshot.manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, restore or verify a vector store snapshot.")
+    parser.add_argument("command", choices=["export", "restore", "verify"])
+    parser.add_argument("path", nargs="?", default=settings.SNAPSHOT_PATH)
+    parser.add_argument("--no-verify", action="store_true", help="(restore) skip checksum verification")
+    args = parser.parse_args()
+
+    from src.telemetry.exporters import configure_logging
+    configure_logging()
+    if args.command == "verify":
+        snapshot = Snapshot(args.path)
+        snapshot.verify()
+        print(f"{args.path}: {len(snapshot)} chunks in {len(snapshot.parts)} part(s), "
+              f"{snapshot.embedding_model}, checksums OK")
+        return
+
+    from src.core.rag_pipeline import RAGPipeline
+    pipeline = RAGPipeline()
+    if args.command == "export":
+        manifest = pipeline.export_snapshot(args.path)
+    else:
+        manifest = pipeline.restore_snapshot(args.path, verify=not args.no_verify)
+    verb = "Exported" if args.command == "export" else "Restored"
+    print(f"{verb} {sum(part['count'] for part in manifest['parts'])} chunks ({args.path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,119 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Any
+import contextlib
+import logging
+import os
+import threading
+from typing import List, Dict, Any, Optional
 from config.settings import settings
+from src.vector_db.base_backend import VectorStoreBackend
+from src.vector_db.bm25_index import BM25Index
+from src.telemetry import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def create_backend(backend_name: str = settings.VECTOR_DB_BACKEND,
+                   collection_name: str = "research_assistant_collection",
+                   shard: Optional[str] = None) -> VectorStoreBackend:
+    """
+    Instantiates the configured storage backend; heavy backends are only imported when selected.
+    A shard gets its own Chroma collection or NumPy index directory.
+    """
+    if backend_name == "chroma":
+        from src.vector_db.chroma_backend import ChromaBackend
+        return ChromaBackend(collection_name if shard is None else f"{collection_name}__{shard}")
+    if backend_name == "numpy":
+        from src.vector_db.numpy_backend import NumpyBackend
+        if shard is None:
+            return NumpyBackend()
+        return NumpyBackend(path=os.path.join(f"{settings.NUMPY_INDEX_PATH}_shards", shard))
+    raise ValueError(f"Unknown vector store backend: {backend_name!r} (expected 'chroma' or 'numpy')")
+
+
+def create_vector_store_manager(collection_name: str = "research_assistant_collection"):
+    """Returns a plain VectorStoreManager, or a ShardedVectorStoreManager when VECTOR_DB_SHARDING is set."""
+    if settings.VECTOR_DB_SHARDING != "none":
+        from src.vector_db.sharding import ShardedVectorStoreManager
+        return ShardedVectorStoreManager(collection_name)
+    return VectorStoreManager(collection_name)
+
+
+class ReadWriteLock:
+    """
+    Lets any number of readers in at once, or one writer. A waiting writer holds off new readers,
+    so a steady stream of queries cannot starve an indexing run. Not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 
 class VectorStoreManager:
-    def __init__(self, collection_name: str = "research_assistant_collection"):
-        self.client = chromadb.PersistentClient(path=settings.VECTOR_DB_PATH)
-        # Using Gemini embedding function directly. Ensure this aligns with your embedding model.
-        # For 'models/embedding-001' it's usually `text-embedding-004` from the genai client.
-        # Chromadb has a built-in GoogleGenerativeAiEmbeddingFunction, but let's integrate ours for control.
-        self.embedding_function = self._get_gemini_embedding_function()
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_function # Pass the embedding function
-        )
-        print(f"ChromaDB initialized at: {settings.VECTOR_DB_PATH}")
-
-    def _get_gemini_embedding_function(self):
-        """Helper to get a custom embedding function for ChromaDB using Gemini."""
-        class GeminiEmbeddingFunction(embedding_functions.EmbeddingFunction):
-            def __call__(self, texts: embedding_functions.Documents) -> embedding_functions.Embeddings:
-                embeddings = [
-                    genai.embed_content(model=settings.GEMINI_EMBEDDING_MODEL, content=text)['embedding']
-                    for text in texts
-                ]
-                return embeddings
-        import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        return GeminiEmbeddingFunction()
+    """
+    Keeps a storage backend and its BM25 index in sync. Searches may run while an indexing job
+    writes: both go through `lock`, so a search never sees a half-applied write.
+    """
+
+    def __init__(self, collection_name: str = "research_assistant_collection", backend: VectorStoreBackend = None,
+                 lexical_index: BM25Index = None):
+        self.backend = backend or create_backend(collection_name=collection_name)
+        # Bumped on every mutation so caches built on query results can tell when they are stale
+        self.version = 0
+        # Lexical index kept in sync with the collection for hybrid retrieval
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        self.lock = ReadWriteLock()
+        self._bootstrap_lexical_index()
+
+    def _bootstrap_lexical_index(self):
+        """Builds the BM25 index from the collection when it is missing, e.g. for collections indexed before it existed."""
+        count = self.backend.count()
+        if count == len(self.lexical_index):
+            return
+        logger.info("Rebuilding BM25 index from %d stored chunks...", count)
+        self.lexical_index.clear()
+        for ids, documents in self.backend.iter_batches():
+            self.lexical_index.add(ids, documents)
+        self.lexical_index.save()
 
     def add_documents(self, documents: List[Dict[str, Any]]):
-        """Adds documents (chunks with embeddings) to the ChromaDB collection."""
+        """
+        Adds documents (chunks with embeddings) to the vector store.
+        Uses upsert so re-indexing a file with the same chunk ids replaces its chunks instead of colliding.
+        """
         ids = []
         metadatas = []
-        documents_to_add = [] # This will hold the actual text content for Chroma
+        documents_to_add = [] # This will hold the actual text content
         embeddings_to_add = []
 
         for doc in documents:
@@ -43,46 +123,116 @@ class VectorStoreManager:
                 documents_to_add.append(doc["content"])
                 embeddings_to_add.append(doc["embedding"])
             else:
-                print(f"Skipping document due to missing embedding or content: {doc['metadata'].get('chunk_id', 'N/A')}")
+                logger.warning("Skipping document due to missing embedding or content: %s", doc['metadata'].get('chunk_id', 'N/A'))
 
         if ids:
-            # ChromaDB expects `documents` for the text content and `embeddings` for the vectors
-            self.collection.add(
-                embeddings=embeddings_to_add,
-                documents=documents_to_add,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"Added {len(ids)} documents to ChromaDB.")
+            with self.lock.write():
+                with tracing.span("vector_store.upsert", backend=self.backend.name, documents=len(ids)):
+                    self.backend.upsert(ids, embeddings_to_add, documents_to_add, metadatas)
+                with tracing.span("lexical_index.add", documents=len(ids)):
+                    self.lexical_index.add(ids, documents_to_add)
+                self.version += 1
+            logger.info("Added %d documents to the %s vector store.", len(ids), self.backend.name)
         else:
-            print("No documents with embeddings to add.")
-
-    def query_documents(self, query_embedding: List[float], top_k: int = settings.TOP_K_RETRIEVAL) -> List[Dict[str, Any]]:
-        """Queries the ChromaDB collection with an embedding and returns top_k results."""
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            include=['documents', 'metadatas', 'distances'] # Include content, metadata, and distance
-        )
-        # Reformat results for easier consumption
-        retrieved_docs = []
-        if results and results['documents'] and results['metadatas']:
-            for i in range(len(results['documents'][0])):
-                retrieved_docs.append({
-                    "content": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i],
-                    "distance": results['distances'][0][i]
-                })
-        return retrieved_docs
+            logger.info("No documents with embeddings to add.")
+
+    def bulk_load(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        Upserts chunks whose embeddings are already known (e.g. from a snapshot) in one backend
+        write and one BM25 save. `embeddings` may be an (n, dim) array rather than a list of lists.
+        """
+        if not ids:
+            return
+        with self.lock.write(), tracing.span("vector_store.bulk_load", backend=self.backend.name, documents=len(ids)):
+            self.backend.upsert(ids, embeddings, documents, metadatas)
+            self.lexical_index.add(ids, documents)
+            self.lexical_index.save()
+            self.version += 1
+        logger.info("Loaded %d documents into the %s vector store.", len(ids), self.backend.name)
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replaces the metadata of stored chunks (content and embeddings are untouched)."""
+        with self.lock.write(), tracing.span("vector_store.update_metadata", backend=self.backend.name, documents=len(ids)):
+            self.backend.update_metadata(ids, metadatas)
+            self.version += 1
+
+    def flush(self):
+        """
+        Persists the BM25 index. Adds and deletes only update it in memory, so writers call this
+        once at the end of a run rather than re-pickling the whole index for every micro-batch.
+        """
+        with self.lock.write(), tracing.span("lexical_index.save", documents=len(self.lexical_index)):
+            self.lexical_index.flush()
+
+    @property
+    def cache_scope(self):
+        """Part of the key of cached query results; a single collection has one scope."""
+        return None
+
+    def partition_for(self, metadata: Dict[str, Any]) -> str:
+        """Chunks in different partitions never share storage (see ShardedVectorStoreManager); here there is one."""
+        return ""
+
+    def delete_documents_by_source(self, source: str, chunk_ids: List[str] = None):
+        """Removes every chunk that was produced from the given source file."""
+        with self.lock.write():
+            # Also look ids up by metadata in case the recorded ones are stale or incomplete
+            ids = list(set(chunk_ids or []) | set(self.backend.ids_for_source(source)))
+            if ids:
+                self.backend.delete(ids)
+                self.lexical_index.delete(ids)
+            self.version += 1
+        logger.info("Removed chunks of %s from the %s vector store.", source, self.backend.name)
+
+    def query_documents(self, query_embedding: List[float], top_k: int = settings.TOP_K_RETRIEVAL,
+                        include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Queries the vector store with an embedding and returns top_k results (with their 'embedding' if requested)."""
+        with self.lock.read(), tracing.span("vector_store.query", backend=self.backend.name, top_k=top_k):
+            return self.backend.query([query_embedding], top_k, include_embeddings=include_embeddings)[0]
+
+    def query_documents_batch(self, query_embeddings: List[List[float]], top_k: int = settings.TOP_K_RETRIEVAL,
+                              include_embeddings: bool = False) -> List[List[Dict[str, Any]]]:
+        """Queries the vector store with several embeddings in one call; returns one result list per query."""
+        if not query_embeddings:
+            return []
+        with self.lock.read(), tracing.span("vector_store.query", backend=self.backend.name, top_k=top_k, queries=len(query_embeddings)):
+            return self.backend.query(query_embeddings, top_k, include_embeddings=include_embeddings)
+
+    def get_documents(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetches stored chunks by id, in the order given; ids that no longer exist are skipped."""
+        with self.lock.read():
+            return self.backend.get(ids)
+
+    def lexical_search(self, query: str, top_k: int = settings.TOP_K_RETRIEVAL) -> List[Dict[str, Any]]:
+        """Queries the BM25 index and returns top_k chunks with their lexical scores."""
+        with self.lock.read(), tracing.span("lexical_index.search", top_k=top_k):
+            hits = self.lexical_index.search(query, top_k)
+            scores = dict(hits)
+            docs = self.backend.get([chunk_id for chunk_id, _ in hits])
+        for doc in docs:
+            doc["bm25_score"] = scores[doc["metadata"]["chunk_id"]]
+        return docs
+
+    def count(self) -> int:
+        with self.lock.read():
+            return self.backend.count()
+
+    def sample_embedding(self) -> Optional[List[float]]:
+        """Returns one stored embedding (None when empty); used to warm up the search path."""
+        with self.lock.read():
+            ids = next(self.backend.iter_batches(batch_size=1), ([], []))[0]
+            stored = self.backend.get(ids[:1], include_embeddings=True)
+        if stored and stored[0].get("embedding") is not None:
+            return list(stored[0]["embedding"])
+        return None
 
     def reset_collection(self):
         """Deletes and recreates the collection, effectively clearing it."""
         try:
-            self.client.delete_collection(name=self.collection.name)
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection.name,
-                embedding_function=self.embedding_function
-            )
-            print(f"Collection '{self.collection.name}' reset.")
+            with self.lock.write():
+                self.backend.reset()
+                self.lexical_index.clear()
+                self.version += 1
+            logger.info("Vector store (%s) reset.", self.backend.name)
         except Exception as e:
-            print(f"Error resetting collection: {e}")
\ No newline at end of file
+            logger.error("Error resetting collection: %s", e)
\ No newline at end of file
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from benchmarks import run_benchmarks
+from config.settings import settings
+
+
+@pytest.fixture
+def restore_settings():
+    # The harness points every path setting at its scratch directory
+    saved = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    yield
+    for name, value in saved.items():
+        setattr(settings, name, value)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_main_smoke(tmp_path, capsys, restore_settings, backend):
+    output = tmp_path / "results.json"
+    run_benchmarks.main([
+        "--docs", "3", "--words-per-doc", "200", "--queries", "2", "--search-sizes", "20,40",
+        "--backend", backend, "--embed-latency", "0", "--generate-latency", "0", "--output", str(output),
+    ])
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    results = report["results"]
+    assert results["index"]["docs"] == 3 and results["index"]["chunks"] > 0
+    assert results["query"]["queries"] == 2
+    assert set(results["search"]) == {"20", "40"}
+    assert results["fake_api_calls"]
+    stdout = capsys.readouterr().out
+    assert "search n=40" in stdout and f"Wrote {output}" in stdout